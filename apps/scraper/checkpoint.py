@@ -0,0 +1,283 @@
+"""Periodic checkpoints of a crawl, to resume it after a failure."""
+
+import logging
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
+
+from scrapy.core.scheduler import Scheduler
+from scrapy.http import Request
+from scrapy.utils.log import failure_to_exc_info
+from twisted.internet import defer, task
+from twisted.python.failure import Failure
+from twisted.internet.threads import deferToThread
+
+from scraper.dependencies import get_sync_session_factory
+from scraper.serialization import decode_request, dumps, encode_request, loads
+from db.repositories import CheckpointsRepository
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """Crawl state saved every ``CHECKPOINT_INTERVAL`` seconds.
+
+    Crawls started with the same ``CHECKPOINT_ID``, e.g. the Airflow run ID
+    shared by the attempts of a task, resume from the last state saved by
+    the previous one. The checkpoint is deleted once a crawl finishes;
+    crawls closed for another reason save their state one last time.
+
+    Components contribute to the state through ``register``, which also
+    hands them what they saved in the checkpoint being resumed. The state
+    is stored as JSON; it is taken in the reactor's thread and written to
+    the database in its thread pool. Resuming is at least once: requests
+    in progress at the last checkpoint, and items not written yet, are
+    handled again.
+
+    The checkpoint is shared by the components of a crawler that ask for it
+    through ``for_crawler``.
+    """
+
+    _checkpoints: "WeakKeyDictionary[object, Checkpoint]" = WeakKeyDictionary()
+
+    def __init__(self, checkpoint_id: str, interval: float = 60.0, stats=None):
+        """Initialize the checkpoint of a crawl.
+
+        Args:
+            checkpoint_id: Identifier shared by the attempts of a crawl
+            interval: Seconds between checkpoints
+            stats: Crawler stats collector
+        """
+        self.checkpoint_id = checkpoint_id
+        self.interval = interval
+        self.stats = stats
+        self.key: str | None = None
+        self.session_factory = None
+        self.sources: dict[str, Callable[[], Any]] = {}
+        self.restored: dict[str, Any] = {}
+        self.loop: task.LoopingCall | None = None
+        # Serializes loading, and the writes of successive saves
+        self.opening = defer.DeferredLock()
+        self.writes = defer.DeferredLock()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> "Checkpoint | None":
+        """Get the checkpoint of a crawler, or None without ``CHECKPOINT_ID``."""
+        checkpoint_id = crawler.settings.get("CHECKPOINT_ID")
+        if not checkpoint_id:
+            return None
+
+        checkpoint = cls._checkpoints.get(crawler)
+        if checkpoint is None:
+            checkpoint = cls._checkpoints[crawler] = cls(
+                checkpoint_id,
+                interval=crawler.settings.getfloat("CHECKPOINT_INTERVAL", 60.0),
+                stats=crawler.stats,
+            )
+        return checkpoint
+
+    @property
+    def resumed(self) -> bool:
+        """Whether the crawl resumes from a saved checkpoint."""
+        return bool(self.restored)
+
+    def open(self, spider) -> defer.Deferred:
+        """Load the checkpoint of a spider; later calls wait for the same load.
+
+        Shards of a crawl, see ``QuotesSpider``, have a checkpoint each.
+
+        Returns:
+            A Deferred fired once the checkpoint is loaded
+        """
+        return self.opening.run(self._open, spider)
+
+    def _open(self, spider) -> defer.Deferred | None:
+        if self.key is not None:
+            return None
+
+        parts = [self.checkpoint_id, spider.name]
+        if getattr(spider, "shards", 1) > 1:
+            parts.append(f"{spider.shard}-of-{spider.shards}")
+        self.key = ":".join(parts)
+
+        self.session_factory = get_sync_session_factory()
+        return deferToThread(self._load).addCallback(self._restore)
+
+    def _load(self) -> bytes | None:
+        with self.session_factory() as session:
+            return CheckpointsRepository(session).get(self.key)
+
+    def _restore(self, state: bytes | None):
+        if state is None:
+            return
+        try:
+            self.restored = loads(state)
+        except ValueError:
+            # Checkpoints saved before they were stored as JSON
+            logger.warning(f"Ignoring unreadable checkpoint {self.key}")
+            return
+        self.stats.set_value("checkpoint/resumed", 1)
+        logger.info(f"Resuming the crawl from checkpoint {self.key}")
+
+    def register(self, name: str, snapshot: Callable[[], Any]) -> Any:
+        """Add a component's state to the checkpoint.
+
+        Args:
+            name: Name of the component's state
+            snapshot: Returns the state of the component, encodable with
+                ``scraper.serialization.dumps``
+
+        Returns:
+            The state the component saved in the resumed checkpoint, or None
+        """
+        self.sources[name] = snapshot
+        return self.restored.get(name)
+
+    def start(self):
+        """Save the state every ``interval`` seconds."""
+        self.loop = task.LoopingCall(self.save)
+        self.loop.start(self.interval, now=False)
+
+    def save(self) -> defer.Deferred:
+        """Save the current state of all components.
+
+        Returns:
+            A Deferred fired once the state is written, which the
+            ``LoopingCall`` waits for before scheduling the next save
+        """
+        try:
+            state = dumps({name: snapshot() for name, snapshot in self.sources.items()})
+        except Exception:
+            self._failed(Failure())
+            return defer.succeed(None)
+        d = self.writes.run(deferToThread, self._write, state)
+        d.addCallbacks(lambda _: self._saved(state), self._failed)
+        return d
+
+    def close(self, reason: str) -> defer.Deferred:
+        """Delete the checkpoint of a finished crawl, or save it a last time."""
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        if reason != "finished":
+            return self.save()
+        return self.writes.run(deferToThread, self._delete)
+
+    def _write(self, state: bytes):
+        with self.session_factory() as session:
+            CheckpointsRepository(session).save(self.key, state)
+
+    def _delete(self):
+        with self.session_factory() as session:
+            CheckpointsRepository(session).delete(self.key)
+
+    def _saved(self, state: bytes):
+        self.stats.inc_value("checkpoint/saved")
+        self.stats.set_value("checkpoint/bytes", len(state))
+
+    def _failed(self, failure: Failure):
+        # A failed checkpoint must not stop the crawl, or later ones
+        logger.error(f"Failed to save checkpoint {self.key}",
+                     exc_info=failure_to_exc_info(failure))
+        self.stats.inc_value("checkpoint/failed")
+
+
+class CheckpointScheduler(Scheduler):
+    """Scheduler saving its pending requests and seen fingerprints.
+
+    Without ``CHECKPOINT_ID`` this is the default Scrapy scheduler. Pending
+    requests are the ones in the queue and the ones handed to the engine
+    but not done yet; they must be serializable with
+    ``scraper.serialization.encode_request``.
+    Not meant to be combined with ``JOBDIR``, which has disk queues.
+    """
+
+    checkpoint: Checkpoint | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super().from_crawler(crawler)
+        scheduler.checkpoint = Checkpoint.for_crawler(crawler)
+        # Requests in the queue, by identity
+        scheduler.queued = {}
+        # Fingerprints of all requests scheduled by this crawl and the ones
+        # it resumes
+        scheduler.seen = set()
+        return scheduler
+
+    def open(self, spider):
+        result = super().open(spider)
+        if self.checkpoint is None:
+            return result
+
+        d = self.checkpoint.open(spider)
+        d.addCallback(lambda _: self._resume(spider))
+        return d
+
+    def close(self, reason: str):
+        if self.checkpoint is None:
+            return super().close(reason)
+        d = self.checkpoint.close(reason)
+        d.addCallback(lambda _: super(CheckpointScheduler, self).close(reason))
+        return d
+
+    def enqueue_request(self, request: Request) -> bool:
+        if self.checkpoint is None:
+            return super().enqueue_request(request)
+
+        fingerprint = None
+        if not request.dont_filter:
+            fingerprint = self.crawler.request_fingerprinter.fingerprint(request)
+            # The dupefilter only knows this crawl's requests
+            if fingerprint in self.seen:
+                self.df.log(request, self.spider)
+                return False
+
+        if not self._enqueue(request):
+            return False
+        if fingerprint is not None:
+            self.seen.add(fingerprint)
+        return True
+
+    def next_request(self) -> Request | None:
+        request = super().next_request()
+        if request is not None and self.checkpoint is not None:
+            self.queued.pop(id(request), None)
+        return request
+
+    def snapshot(self) -> dict[str, Any]:
+        """Pending requests and seen fingerprints, for the checkpoint."""
+        requests = []
+        for request in [*self.queued.values(), *self._in_progress()]:
+            try:
+                data = encode_request(request, self.spider)
+                # One request with e.g. an object in its meta must not
+                # fail the whole checkpoint
+                dumps(data)
+            except (TypeError, ValueError):
+                self.stats.inc_value("checkpoint/unserializable")
+                continue
+            requests.append(data)
+        return {"requests": requests, "seen": [fingerprint.hex() for fingerprint in self.seen]}
+
+    def _resume(self, spider):
+        state = self.checkpoint.register("scheduler", self.snapshot)
+        if state is not None:
+            for data in state["requests"]:
+                self._enqueue(decode_request(data, spider))
+            self.seen.update(bytes.fromhex(fingerprint) for fingerprint in state["seen"])
+            self.stats.set_value("checkpoint/restored_requests", len(state["requests"]))
+        self.checkpoint.start()
+
+    def _in_progress(self) -> set[Request]:
+        # Requests handed to the engine are downloading, or their response
+        # is being parsed
+        engine = self.crawler.engine
+        in_progress = set(engine.downloader.active)
+        if engine.scraper.slot is not None:
+            in_progress.update(engine.scraper.slot.active)
+        return in_progress
+
+    def _enqueue(self, request: Request) -> bool:
+        if not super().enqueue_request(request):
+            return False
+        self.queued[id(request)] = request
+        return True
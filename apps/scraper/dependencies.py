@@ -1,60 +1,40 @@
-"""Dependency injection for the scraper application."""
+"""Dependency injection for the scraper application.
 
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+Engines and pools are owned by the ``sessionmanager`` of the db library,
+shared with the Airflow DAG utilities; see ``db.database`` and the
+``DATABASE_POOL_*`` environment variables.
+"""
 
-from scraper.settings import (
-    DATABASE_HOST,
-    DATABASE_PORT,
-    DATABASE_NAME,
-    DATABASE_USER,
-    DATABASE_PASSWORD,
-)
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 
-
-def get_database_url() -> str:
-    """Get the database URL from settings."""
-    return f"postgresql+asyncpg://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}:{DATABASE_PORT}/{DATABASE_NAME}"
+from db.config import database_url
+from db.database import sessionmanager
 
 
-def create_database_engine():
-    """Create the database engine."""
-    database_url = get_database_url()
-    return create_async_engine(
-        database_url,
-        echo=False,  # Set to True for SQL debugging
-        pool_pre_ping=True,  # Verify connections before use
-    )
+def get_database_url(driver: str = "asyncpg") -> str:
+    """Get the database URL from settings."""
+    return database_url(driver)
 
 
-def create_session_factory(engine):
-    """Create a session factory."""
-    return async_sessionmaker(
-        engine,
-        class_=AsyncSession,
-        expire_on_commit=False,
-    )
+def get_engine() -> AsyncEngine:
+    """Get the shared database engine."""
+    return sessionmanager.engine
 
 
-# Global engine and session factory
-_engine = None
-_session_factory = None
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    """Get the shared session factory."""
+    return sessionmanager.session_factory
 
 
-def get_engine():
-    """Get or create the database engine."""
-    global _engine
-    if _engine is None:
-        _engine = create_database_engine()
-    return _engine
+def get_sync_session_factory() -> sessionmaker[Session]:
+    """Get the shared blocking session factory, for code such as the scheduler."""
+    return sessionmanager.sync_session_factory
 
 
-def get_session_factory():
-    """Get or create the session factory."""
-    global _session_factory
-    if _session_factory is None:
-        engine = get_engine()
-        _session_factory = create_session_factory(engine)
-    return _session_factory
+def get_pool_metrics() -> dict:
+    """Get the checkout counters and usage of the shared connection pools."""
+    return sessionmanager.pool_metrics()
 
 
 async def get_database_session() -> AsyncSession:
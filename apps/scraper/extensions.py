@@ -0,0 +1,180 @@
+"""Scrapy extensions of the scraper."""
+
+import json
+from pathlib import Path
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from scraper.dependencies import get_pool_metrics
+from scraper.profiling import Profiler
+from scraper.stage_metrics import MetricsServer, StageMetrics
+
+
+class StatsExport:
+    """Write the final crawl stats as JSON to ``STATS_EXPORT_PATH``.
+
+    Lets whoever started the crawl, e.g. an Airflow task, collect its
+    stats. The file is written once the engine has stopped, so it includes
+    ``finish_time`` and ``finish_reason``; datetimes are written in ISO
+    format.
+    """
+
+    def __init__(self, stats, path: str):
+        """Initialize the extension.
+
+        Args:
+            stats: Crawler stats collector
+            path: File the stats are written to
+        """
+        self.stats = stats
+        self.path = Path(path)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("STATS_EXPORT_PATH")
+        if not path:
+            raise NotConfigured("STATS_EXPORT_PATH is not set")
+
+        extension = cls(crawler.stats, path)
+        crawler.signals.connect(extension.engine_stopped, signal=signals.engine_stopped)
+        return extension
+
+    def engine_stopped(self):
+        stats = {
+            key: value.isoformat() if hasattr(value, "isoformat") else value
+            for key, value in self.stats.get_stats().items()
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(stats, sort_keys=True))
+
+
+class DatabasePoolStats:
+    """Add the counters of the shared database pools to the crawl stats.
+
+    When the spider closes, every counter of ``db.database.PoolMetrics`` of
+    each pool used by the crawl is stored as ``db/pool/<counter>/<engine>``,
+    e.g. ``db/pool/max_wait_seconds/async``.
+    """
+
+    def __init__(self, stats):
+        """Initialize the extension.
+
+        Args:
+            stats: Crawler stats collector
+        """
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_closed(self, spider):
+        for engine, metrics in get_pool_metrics().items():
+            for name, value in metrics.items():
+                # Connections in use or idle right now say nothing once closed
+                if name not in ("in_use", "idle"):
+                    self.stats.set_value(f"db/pool/{name}/{engine}", value)
+
+
+class StageMetricsExport:
+    """Publish the per-stage metrics of a crawl, see ``StageMetrics``.
+
+    With ``STAGE_METRICS_PORT`` set, the metrics are served in the
+    Prometheus text format on ``STAGE_METRICS_HOST`` while the crawl runs.
+    When the spider closes, the summary of every stage is added to the
+    crawl stats as ``stages/<stage>/<value>``, so it is part of the stats
+    export the Airflow DAG merges, and written as JSON to
+    ``STAGE_METRICS_SUMMARY_PATH`` if set.
+    """
+
+    def __init__(
+        self,
+        metrics: StageMetrics,
+        stats,
+        host: str = "127.0.0.1",
+        port: int | None = None,
+        summary_path: str | None = None,
+    ):
+        """Initialize the extension.
+
+        Args:
+            metrics: Stage metrics of the crawl
+            stats: Crawler stats collector
+            host: Address the metrics endpoint listens on
+            port: Port of the metrics endpoint, 0 for any free port, or None
+                for no endpoint
+            summary_path: File the summary is written to, or None
+        """
+        self.metrics = metrics
+        self.stats = stats
+        self.server = MetricsServer(metrics, host, port) if port is not None else None
+        self.summary_path = Path(summary_path) if summary_path else None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics = StageMetrics.for_crawler(crawler)
+        if metrics is None:
+            raise NotConfigured("STAGE_METRICS_ENABLED is not set")
+
+        settings = crawler.settings
+        port = settings.get("STAGE_METRICS_PORT")
+        extension = cls(
+            metrics,
+            crawler.stats,
+            host=settings.get("STAGE_METRICS_HOST", "127.0.0.1"),
+            port=int(port) if port not in (None, "") else None,
+            summary_path=settings.get("STAGE_METRICS_SUMMARY_PATH"),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_opened(self, spider):
+        self.metrics.start()
+        if self.server is not None:
+            self.server.start()
+            spider.logger.info(
+                f"Serving stage metrics on http://{self.server.host}:{self.server.port}/metrics")
+
+    def spider_closed(self, spider):
+        if self.server is not None:
+            self.server.stop()
+
+        summary = self.metrics.summary()
+        for stage, values in summary["stages"].items():
+            for name, value in values.items():
+                self.stats.set_value(f"stages/{stage}/{name}", value)
+            spider.logger.info(
+                f"Stage {stage}: {values['items']} items, "
+                f"{values['items_per_sec']:.1f} items/s, p50 {values['p50_ms']:.1f} ms, "
+                f"p95 {values['p95_ms']:.1f} ms, p99 {values['p99_ms']:.1f} ms"
+            )
+
+        if self.summary_path is not None:
+            self.summary_path.parent.mkdir(parents=True, exist_ok=True)
+            self.summary_path.write_text(json.dumps(summary, indent=2, sort_keys=True))
+
+
+class Profiling:
+    """Profile crawls run with ``PROFILING_ENABLED``, see ``Profiler``.
+
+    Creates the profiler of the crawl even when no pipeline asks for it.
+    """
+
+    def __init__(self, profiler: Profiler):
+        """Initialize the extension.
+
+        Args:
+            profiler: Profiler of the crawl
+        """
+        self.profiler = profiler
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        profiler = Profiler.for_crawler(crawler)
+        if profiler is None:
+            raise NotConfigured("PROFILING_ENABLED is not set")
+        return cls(profiler)
@@ -0,0 +1,384 @@
+"""Crawl frontier shared by several workers through PostgreSQL."""
+
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from weakref import WeakKeyDictionary
+
+from scrapy.http import Request
+from twisted.internet import defer
+from twisted.internet.threads import deferToThread
+
+from scraper.checkpoint import CheckpointScheduler
+from scraper.dependencies import get_sync_session_factory
+from scraper.serialization import decode_request, dumps, encode_request, loads
+from db.repositories import FrontierRepository
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Exchange:
+    """Outcome of one round trip to the frontier table."""
+
+    claimed: list[tuple[str, bytes]] = field(default_factory=list)
+    # Whether the crawl has pending or claimed requests; only checked when
+    # nothing could be claimed
+    unfinished: bool = True
+    counts: Counter = field(default_factory=Counter)
+
+
+class Frontier:
+    """Pending requests and seen fingerprints of a crawl, kept in Postgres.
+
+    Every worker started with the same ``FRONTIER_CRAWL_ID`` shares one
+    queue and one dupefilter. Workers claim up to ``FRONTIER_BATCH_SIZE``
+    requests at a time with ``FOR UPDATE SKIP LOCKED``; a claim is a lease of
+    ``FRONTIER_LEASE_SECONDS`` that the worker renews while it is alive, so
+    requests held by a worker that died return to the queue.
+
+    New requests and done marks are buffered and written every
+    ``FRONTIER_FLUSH_INTERVAL`` seconds, new requests first: a request is
+    only marked done once the requests it led to are stored.
+
+    Buffers are only touched from the reactor thread. Database round trips
+    go through ``exchange`` and ``close``, which block and are run in a
+    thread pool by ``FrontierScheduler``, one at a time.
+
+    The frontier is shared by the components of a crawler that ask for it
+    through ``for_crawler``.
+    """
+
+    _frontiers: "WeakKeyDictionary[object, Frontier]" = WeakKeyDictionary()
+
+    def __init__(
+        self,
+        crawl_id: str,
+        batch_size: int = 50,
+        lease_seconds: float = 300.0,
+        flush_interval: float = 1.0,
+        stats=None,
+    ):
+        """Initialize the frontier of a crawl.
+
+        Args:
+            crawl_id: Identifier shared by all workers of the crawl
+            batch_size: Requests claimed, and new requests buffered, at once
+            lease_seconds: Time a claim is held without being renewed
+            flush_interval: Maximum seconds buffered writes are delayed
+            stats: Crawler stats collector
+        """
+        self.crawl_id = crawl_id
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.flush_interval = flush_interval
+        self.stats = stats
+        self.worker = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.session_factory = None
+        # Fingerprints this worker knows to be in the frontier, to skip
+        # duplicates without a round trip
+        self.seen: set[str] = set()
+        self.outbox: list[dict] = []
+        self.done: set[str] = set()
+        self.last_flush = time.monotonic()
+        self.last_renewal = time.monotonic()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> "Frontier | None":
+        """Get the frontier of a crawler, or None without ``FRONTIER_CRAWL_ID``."""
+        crawl_id = crawler.settings.get("FRONTIER_CRAWL_ID")
+        if not crawl_id:
+            return None
+
+        frontier = cls._frontiers.get(crawler)
+        if frontier is None:
+            settings = crawler.settings
+            frontier = cls._frontiers[crawler] = cls(
+                crawl_id,
+                batch_size=settings.getint("FRONTIER_BATCH_SIZE", 50),
+                lease_seconds=settings.getfloat("FRONTIER_LEASE_SECONDS", 300.0),
+                flush_interval=settings.getfloat("FRONTIER_FLUSH_INTERVAL", 1.0),
+                stats=crawler.stats,
+            )
+        return frontier
+
+    def open(self):
+        """Connect to the database."""
+        self.session_factory = get_sync_session_factory()
+
+    def add(self, fingerprint: str, priority: int, request: bytes) -> bool:
+        """Buffer a request unless this worker has seen its fingerprint.
+
+        Requests added by other workers in the meantime are only detected
+        when the buffer is written.
+
+        Returns:
+            False if the request is a known duplicate
+        """
+        if fingerprint in self.seen:
+            return False
+        self.seen.add(fingerprint)
+        self.outbox.append(
+            {"fingerprint": fingerprint, "priority": priority, "request": request})
+        return True
+
+    def mark_done(self, fingerprint: str):
+        """Mark a claimed request as done once buffered writes are written."""
+        self.done.add(fingerprint)
+
+    def due(self) -> bool:
+        """Check whether buffered writes or lease renewals are due."""
+        now = time.monotonic()
+        return (
+            len(self.outbox) >= self.batch_size
+            or (bool(self.outbox or self.done) and now - self.last_flush >= self.flush_interval)
+            or now - self.last_renewal >= self.lease_seconds / 3
+        )
+
+    def take(self) -> tuple[list[dict], list[str]]:
+        """Take the buffered new requests and done marks, to be written."""
+        self.last_flush = time.monotonic()
+        outbox, self.outbox = self.outbox, []
+        done, self.done = list(self.done), set()
+        return outbox, done
+
+    def exchange(
+        self, outbox: list[dict], done: list[str], claim: bool = False, finish: bool = False
+    ) -> Exchange:
+        """Write buffered changes, renew leases and claim requests.
+
+        Blocks on the database; stats are left to the caller, in the
+        returned counts.
+
+        Args:
+            outbox: New requests, from ``take``
+            done: Fingerprints of done requests, from ``take``
+            claim: Whether to claim the next batch of requests; when nothing
+                is pending, expired leases are recovered first
+            finish: Whether to mark every request this worker holds as done
+                first, when the worker is idle: everything it claimed has been
+                downloaded and parsed, and what is left failed to download
+
+        Returns:
+            The claimed ``(fingerprint, request)`` pairs, whether the crawl
+            is unfinished if nothing could be claimed, and counts
+        """
+        result = Exchange()
+        counts = result.counts
+        with self.session_factory() as session:
+            repository = FrontierRepository(session)
+            if outbox:
+                added = repository.add_many(self.crawl_id, outbox)
+                counts["frontier/added"] += len(added)
+                counts["frontier/duplicates"] += len(outbox) - len(added)
+            if done:
+                counts["frontier/done"] += repository.mark_done(self.crawl_id, done)
+            if time.monotonic() - self.last_renewal >= self.lease_seconds / 3:
+                repository.renew(self.crawl_id, self.worker, self.lease_seconds)
+                self.last_renewal = time.monotonic()
+            if finish:
+                counts["frontier/failed"] += repository.finish_claimed(
+                    self.crawl_id, self.worker)
+            if claim or finish:
+                result.claimed = repository.claim(
+                    self.crawl_id, self.worker, self.batch_size, self.lease_seconds)
+                if not result.claimed:
+                    recovered = repository.release_expired(self.crawl_id)
+                    counts["frontier/recovered"] += recovered
+                    if recovered:
+                        result.claimed = repository.claim(
+                            self.crawl_id, self.worker, self.batch_size, self.lease_seconds)
+                counts["frontier/claimed"] += len(result.claimed)
+                if not result.claimed:
+                    result.unfinished = repository.has_unfinished(self.crawl_id)
+        return result
+
+    def close(self, outbox: list[dict], done: list[str]) -> Counter:
+        """Write buffered changes and give back the requests still held.
+
+        Blocks on the database.
+
+        Returns:
+            Counts for the crawl stats
+        """
+        counts = self.exchange(outbox, done).counts
+        with self.session_factory() as session:
+            counts["frontier/released"] += FrontierRepository(session).release(
+                self.crawl_id, self.worker)
+        return counts
+
+    def record(self, counts: Counter):
+        """Add the counts of an exchange to the crawl stats."""
+        if self.stats is None:
+            return
+        for key, count in counts.items():
+            if count:
+                self.stats.inc_value(key, count)
+
+
+class FrontierScheduler(CheckpointScheduler):
+    """Scheduler keeping its queue and dupefilter in a shared ``Frontier``.
+
+    Enabled in settings only for crawls with a ``FRONTIER_CRAWL_ID``;
+    without one this is a ``CheckpointScheduler``. Requests with
+    ``dont_filter`` (start requests, retries) and requests that cannot be
+    serialized stay in this worker's memory queue.
+
+    Database round trips run in the reactor's thread pool, one at a time,
+    and never block the crawl: requests claimed in the background are
+    handed to the engine through ``ExecutionEngine.crawl``, which wakes it.
+    An idle worker polls the frontier every ``FRONTIER_FLUSH_INTERVAL``
+    seconds while other workers may still add requests. ``FrontierMiddleware``
+    must be enabled to mark requests done as soon as their response is
+    parsed.
+    """
+
+    frontier: Frontier | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        scheduler = super().from_crawler(crawler)
+        scheduler.frontier = Frontier.for_crawler(crawler)
+        # Claimed requests handed to the engine, waiting to be downloaded
+        scheduler.claimed = deque()
+        scheduler.next_claim = 0.0
+        scheduler.exchanges = defer.DeferredLock()
+        # Set when the last idle check found nothing left in the crawl
+        scheduler.exhausted = False
+        scheduler.closing = False
+        # Set when the engine found the worker idle during an exchange
+        scheduler.idle = False
+        scheduler.poll = None
+        return scheduler
+
+    def open(self, spider):
+        result = super().open(spider)
+        if self.frontier is not None:
+            self.frontier.open()
+        return result
+
+    def close(self, reason: str):
+        if self.frontier is None:
+            return super().close(reason)
+
+        self.closing = True
+        if self.poll is not None and self.poll.active():
+            self.poll.cancel()
+        # Unhandled claims go back to the queue with the rest
+        self.claimed.clear()
+        d = self.exchanges.run(deferToThread, self.frontier.close, *self.frontier.take())
+        d.addCallback(self.frontier.record)
+        d.addCallback(lambda _: super(FrontierScheduler, self).close(reason))
+        return d
+
+    def enqueue_request(self, request: Request) -> bool:
+        if self.frontier is None:
+            return super().enqueue_request(request)
+        if request.meta.pop("frontier_claimed", False):
+            self.claimed.append(request)
+            return True
+        if request.dont_filter:
+            return super().enqueue_request(request)
+
+        try:
+            payload = dumps(encode_request(request, self.spider))
+        except (ValueError, TypeError):
+            self.stats.inc_value("frontier/unserializable")
+            return super().enqueue_request(request)
+
+        fingerprint = self.crawler.request_fingerprinter.fingerprint(request).hex()
+        if not self.frontier.add(fingerprint, request.priority, payload):
+            self.df.log(request, self.spider)
+            return False
+
+        self.exhausted = False
+        self.stats.inc_value("scheduler/enqueued/frontier")
+        self.stats.inc_value("scheduler/enqueued")
+        if self.frontier.due():
+            self._exchange()
+        return True
+
+    def next_request(self) -> Request | None:
+        request = super().next_request()
+        if request is not None or self.frontier is None:
+            return request
+
+        if self.claimed:
+            request = self.claimed.popleft()
+            self.stats.inc_value("scheduler/dequeued/frontier")
+            self.stats.inc_value("scheduler/dequeued")
+            return request
+
+        # Requests this worker just found are written before claiming, or
+        # it would sit idle until the next flush.
+        claim = bool(self.frontier.outbox) or (
+            not self.exhausted and time.monotonic() >= self.next_claim)
+        if claim or self.frontier.due():
+            self._exchange(claim=claim)
+        return None
+
+    def has_pending_requests(self) -> bool:
+        if self.frontier is None:
+            return super().has_pending_requests()
+        if len(self) or self.claimed:
+            return True
+        if self.exhausted:
+            return False
+        if self.exchanges.locked:
+            self.idle = True
+            return True
+
+        # The engine only asks when it is otherwise idle: every request
+        # handed out has finished.
+        self._exchange(finish=True, idle=True)
+        return True
+
+    def _exchange(self, claim: bool = False, finish: bool = False, idle: bool = False):
+        """Start a round trip to the frontier unless one is in progress.
+
+        ``idle`` exchanges keep polling the frontier while it is empty but
+        other workers may still add requests.
+        """
+        if self.exchanges.locked or self.closing:
+            return
+        outbox, done = self.frontier.take()
+        d = self.exchanges.run(
+            deferToThread, self.frontier.exchange, outbox, done, claim, finish)
+        d.addCallback(self._exchanged, idle)
+        d.addErrback(
+            lambda failure: logger.error(
+                "Frontier exchange failed", exc_info=(failure.type, failure.value, failure.tb)))
+
+    def _exchanged(self, result: Exchange, idle: bool):
+        self.frontier.record(result.counts)
+        idle, self.idle = idle or self.idle, False
+        if self.closing:
+            return
+
+        if not result.claimed:
+            # Poll an empty frontier at most once per flush interval
+            self.next_claim = time.monotonic() + self.frontier.flush_interval
+            if self.frontier.outbox:
+                # Found while this exchange was in progress
+                self._exchange(claim=True, idle=idle)
+            elif not result.unfinished:
+                self.exhausted = True
+            elif idle and (self.poll is None or not self.poll.active()):
+                from twisted.internet import reactor
+
+                # Other workers may still add requests
+                self.poll = reactor.callLater(
+                    self.frontier.flush_interval, self._exchange, claim=True, idle=True)
+            return
+
+        self.exhausted = False
+        self.frontier.seen.update(fingerprint for fingerprint, _ in result.claimed)
+        for fingerprint, payload in result.claimed:
+            request = decode_request(loads(payload), spider=self.spider)
+            request.meta["frontier_fingerprint"] = fingerprint
+            request.meta["frontier_claimed"] = True
+            self.crawler.engine.crawl(request)
@@ -1,11 +1,42 @@
 # Define here the models for your scraped items
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
+from typing import Any, Sequence
+
 import scrapy
+from itemadapter import ItemAdapter
+from itemloaders.processors import TakeFirst
 
 
-@dataclass
 class Quote(scrapy.Item):
-    text: str | None = field(default=None)
-    author: str | None = field(default=None)
-    tags: list[str] | None = field(default=None)
+    text = scrapy.Field(output_processor=TakeFirst())
+    author = scrapy.Field(output_processor=TakeFirst())
+    tags = scrapy.Field()
+
+
+@dataclass(slots=True)
+class CompactQuote:
+    """A quote item with slots instead of the field dict of ``Quote``.
+
+    Yielded by the fast extraction path with ``QUOTES_COMPACT_ITEMS_ENABLED``.
+    Fields without a value are None, as ``Quote`` leaves them unset; tags are
+    a tuple. Code reading items goes through ``quote_fields``, which reads
+    the attributes directly instead of wrapping the item in an
+    ``ItemAdapter``.
+    """
+
+    text: str | None = None
+    author: str | None = None
+    tags: tuple[str, ...] | None = None
+
+
+def quote_fields(item: Any) -> tuple[str | None, str | None, Sequence[str] | None]:
+    """Read the text, author and tags of a quote item of any type.
+
+    Returns:
+        The fields, None where the item has no value
+    """
+    if type(item) is CompactQuote:
+        return item.text, item.author, item.tags
+    adapter = ItemAdapter(item)
+    return adapter.get("text"), adapter.get("author"), adapter.get("tags")
@@ -3,10 +3,21 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+import time
+from dataclasses import dataclass, field
 
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
+from scrapy import Request, signals
+from scrapy.exceptions import NotConfigured
+
+from scraper.checkpoint import Checkpoint
+from scraper.dependencies import get_session_factory
+from scraper.frontier import Frontier
+from scraper.items import quote_fields
+from scraper.page_store import PageStore
+from scraper.spiders.quotes_spider import PAGE_URL_PATTERN
+from scraper.stage_metrics import StageMetrics
+from db.hashing import hash_text
+from db.repositories import QuotesRepository
 
 
 class TutorialSpiderMiddleware:
@@ -98,3 +109,479 @@ class TutorialDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class ConditionalRequestMiddleware:
+    """Revalidate previously downloaded pages with conditional requests.
+
+    The ETag and Last-Modified validators of every page are remembered in
+    the ``PageStore``. When a page is requested again they are sent as
+    If-None-Match and If-Modified-Since; a 304 answer reaches the spider with
+    ``response.meta["page_unchanged"]`` set, so it can skip the page.
+
+    Stats: ``conditional/requests`` revalidated, ``conditional/not_modified``
+    answers, ``conditional/hit_rate``, and the estimated
+    ``conditional/bytes_saved`` and ``conditional/time_saved`` (seconds).
+    """
+
+    def __init__(self, store: PageStore, stats):
+        self.store = store
+        self.stats = stats
+        self.full_downloads = 0
+        self.full_download_time = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("CONDITIONAL_REQUESTS_ENABLED"):
+            raise NotConfigured
+        s = cls(PageStore.for_crawler(crawler), crawler.stats)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def process_request(self, request, spider):
+        if request.meta.get("dont_revalidate"):
+            return None
+
+        page = self.store.get(request.url)
+        if page is None or not (page.etag or page.last_modified):
+            return None
+
+        if page.etag:
+            request.headers.setdefault("If-None-Match", page.etag)
+        if page.last_modified:
+            request.headers.setdefault("If-Modified-Since", page.last_modified)
+        # Let the 304 through HttpErrorMiddleware to the spider.
+        request.meta["handle_httpstatus_list"] = [
+            *request.meta.get("handle_httpstatus_list", []), 304]
+        request.meta["revalidated"] = True
+        self.stats.inc_value("conditional/requests")
+        return None
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get("download_latency", 0.0)
+
+        if response.status == 304 and request.meta.get("revalidated"):
+            request.meta["page_unchanged"] = True
+            self.stats.inc_value("conditional/not_modified")
+
+            page = self.store.get(request.url)
+            if page.content_length:
+                self.stats.inc_value("conditional/bytes_saved", page.content_length)
+            if self.full_downloads:
+                average = self.full_download_time / self.full_downloads
+                self.stats.inc_value(
+                    "conditional/time_saved", max(0.0, average - latency))
+            return response
+
+        if response.status == 200:
+            self.full_downloads += 1
+            self.full_download_time += latency
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if etag or last_modified:
+                self.store.update(
+                    request.url,
+                    etag=etag.decode("latin-1") if etag else None,
+                    last_modified=last_modified.decode("latin-1") if last_modified else None,
+                    content_length=self._wire_size(response),
+                )
+
+        return response
+
+    @staticmethod
+    def _wire_size(response) -> int:
+        """Size of the body as downloaded.
+
+        The body has been decompressed by ``HttpCompressionMiddleware`` at
+        this point, so the Content-Length header is preferred.
+        """
+        try:
+            return int(response.headers.get("Content-Length"))
+        except (TypeError, ValueError):
+            return len(response.body)
+
+    def spider_closed(self, spider):
+        requests = self.stats.get_value("conditional/requests", 0)
+        if requests:
+            hits = self.stats.get_value("conditional/not_modified", 0)
+            self.stats.set_value("conditional/hit_rate", hits / requests)
+
+
+class FrontierMiddleware:
+    """Mark frontier requests done once everything their response led to is out.
+
+    Spider middleware for ``FrontierScheduler``: when the callback output of
+    a response claimed from the shared frontier is exhausted, the requests it
+    yielded have been enqueued, so the request is marked done. Requests that
+    fail before reaching the spider are marked done by the scheduler when
+    the worker goes idle.
+    """
+
+    def __init__(self, frontier: Frontier):
+        self.frontier = frontier
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        frontier = Frontier.for_crawler(crawler)
+        if frontier is None:
+            raise NotConfigured
+        return cls(frontier)
+
+    def process_spider_output(self, response, result, spider):
+        yield from result
+        self._mark_done(response)
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            yield item_or_request
+        self._mark_done(response)
+
+    def process_spider_exception(self, response, exception, spider):
+        self._mark_done(response)
+
+    def _mark_done(self, response):
+        fingerprint = response.meta.get("frontier_fingerprint")
+        if fingerprint is not None:
+            self.frontier.mark_done(fingerprint)
+
+
+class StageMetricsSpiderMiddleware:
+    """Record the time spider callbacks take as the ``parse`` stage.
+
+    Spider middleware closest to the spider: only the time spent producing
+    the callback output is counted, not the time later middlewares and the
+    engine take to handle it. Items of a response are counted as it is done.
+    """
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics = StageMetrics.for_crawler(crawler)
+        if metrics is None:
+            raise NotConfigured
+        return cls(metrics)
+
+    def process_spider_output(self, response, result, spider):
+        busy, items = 0.0, 0
+        iterator = iter(result)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item_or_request = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    busy += time.perf_counter() - started
+                if not isinstance(item_or_request, Request):
+                    items += 1
+                yield item_or_request
+        finally:
+            self.metrics.record("parse", busy, items)
+
+    async def process_spider_output_async(self, response, result, spider):
+        busy, items = 0.0, 0
+        iterator = aiter(result)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item_or_request = await anext(iterator)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    busy += time.perf_counter() - started
+                if not isinstance(item_or_request, Request):
+                    items += 1
+                yield item_or_request
+        finally:
+            self.metrics.record("parse", busy, items)
+
+
+class StageMetricsDownloaderMiddleware:
+    """Record the download latency of every response as the ``download`` stage.
+
+    Uses the ``download_latency`` measured by Scrapy, so responses not
+    downloaded, e.g. served from a cache, are not counted.
+    """
+
+    def __init__(self, metrics: StageMetrics):
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics = StageMetrics.for_crawler(crawler)
+        if metrics is None:
+            raise NotConfigured
+        return cls(metrics)
+
+    def process_response(self, request, response, spider):
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.metrics.record("download", latency)
+        return response
+
+
+class CheckpointMiddleware:
+    """Skip the start requests of a crawl resumed from a checkpoint.
+
+    Spider middleware for ``CheckpointScheduler``: the requests the start
+    requests led to are pending in the checkpoint, so a resumed crawl only
+    sends start requests the interrupted crawl had not sent yet.
+    """
+
+    def __init__(self, checkpoint: Checkpoint, stats):
+        self.checkpoint = checkpoint
+        self.stats = stats
+        self.start_sent = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        checkpoint = Checkpoint.for_crawler(crawler)
+        if checkpoint is None:
+            raise NotConfigured
+        return cls(checkpoint, crawler.stats)
+
+    async def process_start(self, start):
+        # Iterated once the scheduler has opened the checkpoint
+        skip = self.checkpoint.register("start", lambda: self.start_sent) or 0
+        async for item_or_request in start:
+            if skip:
+                skip -= 1
+                self.start_sent += 1
+                self.stats.inc_value("checkpoint/start_skipped")
+                continue
+            yield item_or_request
+            self.start_sent += 1
+
+
+class IncrementalCrawlMiddleware:
+    """Stop following pagination once it only leads to quotes already stored.
+
+    The quotes of every paginated page are looked up in the database with
+    one query per page. A page is known when all its quotes are stored with
+    the same tags, or when it is unchanged since the last crawl. Once the
+    last ``INCREMENTAL_STOP_AFTER_PAGES`` pages of the spider, up to some
+    page, are known, requests for the pages after it are dropped: new quotes
+    appear on the first pages. Pages of a sharded spider, see
+    ``QuotesSpider``, are consecutive within the shard.
+
+    Requests yielded for a page are held back until its lookup is done;
+    items are passed on right away.
+    """
+
+    def __init__(self, stop_after: int, stats):
+        self.stop_after = stop_after
+        self.stats = stats
+        self.known_pages: set[int] = set()
+        # Pages after this one are not followed
+        self.stop_page: int | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("INCREMENTAL_CRAWL_ENABLED"):
+            raise NotConfigured
+        return cls(crawler.settings.getint("INCREMENTAL_STOP_AFTER_PAGES", 2), crawler.stats)
+
+    async def process_spider_output(self, response, result, spider):
+        requests = []
+        quotes = []
+        async for item_or_request in result:
+            if isinstance(item_or_request, Request):
+                requests.append(item_or_request)
+                continue
+            quotes.append(item_or_request)
+            yield item_or_request
+
+        page = _page_number(response.url)
+        if page is not None:
+            if response.meta.get("page_unchanged") or (quotes and await self._known(quotes)):
+                self.stats.inc_value("incremental/pages_known")
+                self._page_known(page, getattr(spider, "shards", 1))
+            else:
+                self.stats.inc_value("incremental/pages_new")
+
+        for request in requests:
+            number = _page_number(request.url)
+            if self.stop_page is not None and number is not None and number > self.stop_page:
+                self.stats.inc_value("incremental/requests_dropped")
+                continue
+            yield request
+
+    async def _known(self, quotes) -> bool:
+        """Check whether all quotes of a page are stored with the same tags."""
+        keys = {}
+        for quote in quotes:
+            text, author, tags = quote_fields(quote)
+            if not all([text, author, tags]):
+                return False
+            keys[(author, hash_text(text))] = list(tags)
+
+        async with get_session_factory()() as session:
+            stored = await QuotesRepository(session).get_tags_by_keys(list(keys))
+        return all(stored.get(key) == tags for key, tags in keys.items())
+
+    def _page_known(self, page: int, stride: int):
+        self.known_pages.add(page)
+        if all(page - i * stride in self.known_pages for i in range(self.stop_after)):
+            if self.stop_page is None or page < self.stop_page:
+                self.stop_page = page
+                self.stats.set_value("incremental/stopped_at_page", page)
+
+
+def _page_number(url: str) -> int | None:
+    """Number of a paginated listing page, or None for other URLs."""
+    match = PAGE_URL_PATTERN.match(url)
+    return int(match["number"]) if match is not None else None
+
+
+@dataclass
+class ResponseWindow:
+    """Observations collected for a download slot since its last decision."""
+
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    throttled: int = 0
+    retry_after: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.latencies) + self.errors
+
+
+class AdaptiveConcurrencyMiddleware:
+    """Tune per-domain concurrency and download delay from observed responses.
+
+    Every ``ADAPTIVE_CONCURRENCY_WINDOW`` responses or errors of a download
+    slot, the slot is adjusted:
+
+    - any 429 or 503: halve the concurrency and double the delay, honouring
+      Retry-After (``backoff``); the first one triggers this immediately,
+      later ones wait for a full window
+    - error rate above ``ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE``: halve the
+      concurrency and double the delay (``backoff``)
+    - mean latency above ``ADAPTIVE_CONCURRENCY_TARGET_LATENCY``: lower the
+      concurrency by one (``decrease``)
+    - otherwise halve the delay down to its floor, then raise the
+      concurrency by one (``increase``)
+
+    Concurrency stays within ``ADAPTIVE_CONCURRENCY_MIN`` and
+    ``ADAPTIVE_CONCURRENCY_MAX``, the delay within ``ADAPTIVE_DELAY_MIN``
+    and ``ADAPTIVE_DELAY_MAX``. Decisions are counted in
+    ``adaptive/<decision>`` stats and current values are kept in
+    ``adaptive/concurrency/<slot>`` and ``adaptive/delay/<slot>``.
+    """
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.min_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MIN", 1)
+        self.max_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MAX", 8)
+        self.min_delay = settings.getfloat("ADAPTIVE_DELAY_MIN", 0.0)
+        self.max_delay = settings.getfloat("ADAPTIVE_DELAY_MAX", 30.0)
+        self.target_latency = settings.getfloat("ADAPTIVE_CONCURRENCY_TARGET_LATENCY", 1.0)
+        self.max_error_rate = settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE", 0.1)
+        self.window_size = settings.getint("ADAPTIVE_CONCURRENCY_WINDOW", 10)
+        self.windows: dict[str, ResponseWindow] = {}
+        self.backed_off: set[str] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+        return cls(crawler)
+
+    def process_response(self, request, response, spider):
+        window = self._window(request)
+        if response.status in self.THROTTLE_STATUSES:
+            window.throttled += 1
+            window.errors += 1
+            window.retry_after = max(window.retry_after, _retry_after(response))
+        elif response.status >= 500:
+            window.errors += 1
+        else:
+            window.latencies.append(request.meta.get("download_latency", 0.0))
+
+        self._maybe_adjust(request, window)
+        return response
+
+    def process_exception(self, request, exception, spider):
+        window = self._window(request)
+        window.errors += 1
+        self._maybe_adjust(request, window)
+
+    def _window(self, request) -> ResponseWindow:
+        return self.windows.setdefault(request.meta.get("download_slot"), ResponseWindow())
+
+    def _maybe_adjust(self, request, window: ResponseWindow):
+        key = request.meta.get("download_slot")
+        # Back off on the first throttled response, but not again for the
+        # responses to requests already in flight: they were sent before
+        # the backoff and would compound it.
+        early = window.throttled and key not in self.backed_off
+        if window.size < self.window_size and not early:
+            return
+
+        slot = self.crawler.engine.downloader.slots.get(key)
+        self.windows[key] = ResponseWindow()
+        if slot is None:
+            return
+
+        concurrency, delay, decision = self.decide(slot.concurrency, slot.delay, window)
+        if decision == "backoff":
+            self.backed_off.add(key)
+        else:
+            self.backed_off.discard(key)
+        slot.concurrency, slot.delay = concurrency, delay
+
+        self.stats.inc_value(f"adaptive/{decision}")
+        self.stats.set_value(f"adaptive/concurrency/{key}", concurrency)
+        self.stats.set_value(f"adaptive/delay/{key}", delay)
+        self.crawler.spider.logger.debug(
+            f"Adaptive concurrency for {key}: {decision}, "
+            f"concurrency={concurrency}, delay={delay:.2f}s"
+        )
+
+    def decide(
+        self, concurrency: int, delay: float, window: ResponseWindow
+    ) -> tuple[int, float, str]:
+        """Compute the next concurrency and delay of a slot.
+
+        Returns:
+            The new concurrency, the new delay and the decision taken
+        """
+        error_rate = window.errors / window.size if window.size else 0.0
+        if window.throttled or error_rate > self.max_error_rate:
+            concurrency = concurrency // 2
+            # Start backing off from 100ms when there was no delay yet
+            delay = max(delay * 2, window.retry_after, self.min_delay, 0.1)
+            decision = "backoff"
+        elif window.latencies and sum(window.latencies) / len(window.latencies) > self.target_latency:
+            concurrency -= 1
+            decision = "decrease"
+        elif delay > self.min_delay:
+            # Snap tiny delays to the floor so halving cannot go on forever
+            delay = delay / 2 if delay > 0.1 else self.min_delay
+            decision = "increase"
+        else:
+            concurrency += 1
+            decision = "increase"
+
+        concurrency = min(max(concurrency, self.min_concurrency), self.max_concurrency)
+        delay = min(max(delay, self.min_delay), self.max_delay)
+        return concurrency, delay, decision
+
+
+def _retry_after(response) -> float:
+    """Seconds requested by a Retry-After header, if given in seconds."""
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value else 0.0
+    except ValueError:
+        return 0.0
@@ -0,0 +1,98 @@
+"""Per-URL page state remembered between crawls."""
+
+from dataclasses import asdict, dataclass
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from scrapy.utils.defer import deferred_from_coro
+
+from scraper.dependencies import get_session_factory
+from db.repositories import CrawledPagesRepository
+
+
+@dataclass
+class PageState:
+    """What was learned about a page the last time it was downloaded."""
+
+    etag: str | None = None
+    last_modified: str | None = None
+    content_length: int | None = None
+    links: list[str] | None = None
+    fingerprint: str | None = None
+
+
+class PageStore:
+    """In-memory view of the ``crawled_pages`` table for one crawl.
+
+    The store is shared by every component of a crawler that asks for it
+    through ``for_crawler``. It is loaded when the spider opens, and pages
+    updated during the crawl are written back when the spider closes, but
+    only if the crawl finished and no quote failed to be written
+    (``quotes/db/failed``): a page whose quotes were not stored must not be
+    skipped as unchanged next time.
+    """
+
+    _stores: "WeakKeyDictionary[object, PageStore]" = WeakKeyDictionary()
+
+    def __init__(self):
+        """Initialize an empty store."""
+        self.pages: dict[str, PageState] = {}
+        self.dirty: set[str] = set()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> "PageStore":
+        """Get the store of a crawler, creating it on first use."""
+        store = cls._stores.get(crawler)
+        if store is None:
+            store = cls._stores[crawler] = cls()
+            crawler.signals.connect(store.spider_opened, signal=signals.spider_opened)
+            crawler.signals.connect(store.spider_closed, signal=signals.spider_closed)
+        return store
+
+    def get(self, url: str) -> PageState | None:
+        """Get the state of a page, if it was crawled before."""
+        return self.pages.get(url)
+
+    def update(self, url: str, **fields):
+        """Update the state of a page; it is saved when the crawl finishes."""
+        state = self.pages.setdefault(url, PageState())
+        for name, value in fields.items():
+            setattr(state, name, value)
+        self.dirty.add(url)
+
+    def spider_opened(self, spider):
+        return deferred_from_coro(self.load(spider))
+
+    def spider_closed(self, spider, reason):
+        # Item pipelines are closed, and their writes drained, before this
+        if reason != "finished" or not self.dirty:
+            return None
+        failed = spider.crawler.stats.get_value("quotes/db/failed", 0)
+        if failed:
+            spider.logger.warning(
+                f"Not saving the state of {len(self.dirty)} crawled pages: "
+                f"{failed} quotes failed to be written"
+            )
+            return None
+        return deferred_from_coro(self.save(spider))
+
+    async def load(self, spider):
+        """Load the state of all previously crawled pages."""
+        async with get_session_factory()() as session:
+            async for page in CrawledPagesRepository(session).iter_all():
+                self.pages[page.url] = PageState(
+                    etag=page.etag,
+                    last_modified=page.last_modified,
+                    content_length=page.content_length,
+                    links=page.links,
+                    fingerprint=page.fingerprint,
+                )
+        spider.logger.info(f"Loaded state of {len(self.pages)} crawled pages")
+
+    async def save(self, spider):
+        """Write back the pages updated during the crawl."""
+        rows = [{"url": url, **asdict(self.pages[url])} for url in self.dirty]
+        async with get_session_factory()() as session:
+            await CrawledPagesRepository(session).upsert_many(rows)
+        spider.logger.info(f"Saved state of {len(rows)} crawled pages")
+        self.dirty.clear()
@@ -4,88 +4,440 @@
 # See: https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 
 import asyncio
+import time
+from typing import Any, Sequence
 
-# useful for handling different item types with a single interface
-from itemadapter import ItemAdapter
-from scrapy.exceptions import DropItem
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import deferred_from_coro, maybe_deferred_to_future
 
-from scraper.items import Quote
+from scraper.items import CompactQuote, Quote, quote_fields
 from scraper.spiders.quotes_spider import QuotesSpider
-from scraper.dependencies import get_database_session
-from db.repositories import QuotesRepository
+from scraper.checkpoint import Checkpoint
+from scraper.dependencies import get_session_factory, get_sync_session_factory
+from scraper.profiling import profile_pipeline
+from scraper.seen_set import QuoteSeenSet
+from scraper.stage_metrics import StageMetrics
+from db.hashing import fingerprint, hash_text
+from db.minhash import THRESHOLD, LSHIndex, MinHasher
+from db.near_duplicates import load_index, sign_quotes
+from db.repositories import QuotesRepository, UpsertResult
 
 
 class QuotesValidationPipeline:
+    def __init__(self, metrics: StageMetrics | None = None):
+        """Initialize the pipeline."""
+        self.metrics = metrics
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create the pipeline from the crawler settings."""
+        return profile_pipeline(crawler, cls(metrics=StageMetrics.for_crawler(crawler)))
+
     def process_item(self, item: Quote, spider: QuotesSpider):
-        if item.get("text") is None:
+        if self.metrics is None:
+            return self._validate(item)
+
+        started = time.perf_counter()
+        try:
+            return self._validate(item)
+        finally:
+            self.metrics.record("validation", time.perf_counter() - started)
+
+    def _validate(self, item: Quote | CompactQuote) -> Quote | CompactQuote:
+        text, author, tags = quote_fields(item)
+        if text is None:
             raise DropItem("Missing text in item")
-        if item.get("author") is None:
+        if author is None:
             raise DropItem("Missing author in item")
-        if item.get("tags") is None:
+        if tags is None:
             raise DropItem("Missing tags in item")
         return item
 
 
+class QuotesNearDuplicatesPipeline:
+    """Pipeline to find quotes that nearly duplicate other quotes.
+
+    Enabled by ``QUOTES_NEAR_DUPLICATES_ENABLED``. When the spider opens,
+    the stored quotes without a MinHash signature are signed, unless
+    ``QUOTES_NEAR_DUPLICATES_SIGN`` leaves it to the DAG, and all signatures
+    are loaded into an ``LSHIndex``, see ``db.near_duplicates``; both run in
+    a thread. The quotes of the crawl are added to the index as they pass. An item whose text
+    is at least ``QUOTES_NEAR_DUPLICATES_THRESHOLD`` similar to that of
+    another quote is counted in ``quotes/near_duplicates/found``, and dropped
+    with ``QUOTES_NEAR_DUPLICATES_DROP``. A quote with the same author and
+    text is the same quote, not a near duplicate.
+
+    The index takes ``LSHIndex.entry_bytes`` per quote; if it would exceed
+    ``QUOTES_NEAR_DUPLICATES_MAX_MB`` it is discarded and no item is checked.
+    """
+
+    def __init__(
+        self,
+        threshold: float = THRESHOLD,
+        drop: bool = False,
+        max_mb: float | None = None,
+        sign: bool = True,
+        stats=None,
+    ):
+        """Initialize the pipeline."""
+        self.threshold = threshold
+        self.drop = drop
+        self.max_mb = max_mb
+        self.sign = sign
+        self.stats = stats
+        self.hasher = MinHasher()
+        self.index: LSHIndex | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create the pipeline from the crawler settings."""
+        settings = crawler.settings
+        if not settings.getbool("QUOTES_NEAR_DUPLICATES_ENABLED"):
+            raise NotConfigured
+        return profile_pipeline(crawler, cls(
+            threshold=settings.getfloat("QUOTES_NEAR_DUPLICATES_THRESHOLD", THRESHOLD),
+            drop=settings.getbool("QUOTES_NEAR_DUPLICATES_DROP"),
+            max_mb=settings.getfloat("QUOTES_NEAR_DUPLICATES_MAX_MB") or None,
+            sign=settings.getbool("QUOTES_NEAR_DUPLICATES_SIGN", True),
+            stats=crawler.stats,
+        ))
+
+    def open_spider(self, spider):
+        """Sign the unsigned quotes and load the index, before the crawl starts."""
+        return deferred_from_coro(self._open(spider))
+
+    async def _open(self, spider):
+        max_bytes = None
+        if self.max_mb is not None:
+            max_bytes = int(self.max_mb * 1024 * 1024)
+
+        # Reading every signature takes a while; the reactor keeps running
+        signed, self.index = await asyncio.to_thread(self._load_index, max_bytes)
+
+        if self.index is None:
+            spider.logger.warning(
+                f"Near-duplicate index exceeds QUOTES_NEAR_DUPLICATES_MAX_MB "
+                f"({self.max_mb} MiB); no item will be checked"
+            )
+            return
+
+        spider.logger.info(
+            f"Loaded {len(self.index)} quotes into the near-duplicate index "
+            f"({signed} newly signed): {self.index.nbytes / (1024 * 1024):.1f} MiB"
+        )
+        if self.stats is not None:
+            self.stats.set_value("quotes/near_duplicates/index_size", len(self.index))
+            self.stats.set_value("quotes/near_duplicates/bytes", self.index.nbytes)
+
+    def _load_index(self, max_bytes: int | None) -> tuple[int, LSHIndex | None]:
+        """Sign the unsigned quotes and load the index; blocks on the database."""
+        with get_sync_session_factory()() as session:
+            signed = sign_quotes(session, self.hasher) if self.sign else 0
+            return signed, load_index(session, self.hasher, max_bytes)
+
+    def process_item(self, item: Quote | CompactQuote, spider: QuotesSpider) -> Quote | CompactQuote:
+        """Check a quote item against the index, then add it."""
+        text, author, _ = quote_fields(item)
+        if self.index is None or not text or not author:
+            return item
+
+        signature = self.hasher.signature(text)
+        quote_id = fingerprint(author, hash_text(text))
+        matches = self.index.query(signature, self.threshold)
+        if any(match_id == quote_id for match_id, _ in matches):
+            # Already indexed
+            return item
+
+        if matches:
+            if self.stats is not None:
+                self.stats.inc_value("quotes/near_duplicates/found")
+            _, similarity = matches[0]
+            if self.drop:
+                raise DropItem(
+                    f"Near duplicate ({similarity:.2f}): {text[:50]}... by {author}")
+            spider.logger.info(f"Near duplicate ({similarity:.2f}): {text[:50]}... by {author}")
+
+        self.index.insert(signature, quote_id)
+        return item
+
+
 class QuotesDatabasePipeline:
-    """Pipeline to save quotes to the database."""
+    """Pipeline to save quotes to the database.
+
+    The pipeline is a coroutine pipeline and requires the asyncio reactor:
+    database writes are awaited on the reactor's event loop, so downloading
+    and parsing continue while they are in flight. At most
+    ``QUOTES_DB_MAX_CONCURRENT_WRITES`` writes run at once, each on its own
+    session.
+
+    In buffered mode items are collected in memory and written with a single
+    bulk upsert whenever the buffer reaches ``QUOTES_DB_BUFFER_SIZE`` items or
+    its oldest item is ``QUOTES_DB_BUFFER_MAX_AGE`` seconds old, and once more
+    when the spider closes. Otherwise every item is written on its own.
 
-    def __init__(self):
+    ``QUOTES_DB_WRITER`` selects how buffers are written: ``orm`` merges
+    them into ``quotes`` with multi-row statements that update the tags of
+    stored quotes and insert the others, ``copy`` loads them into an
+    unlogged staging table with ``COPY`` and merges them from there with
+    one set-based statement, which is much faster for large buffers. The
+    ``copy`` writer always buffers.
+
+    With ``QUOTES_SEEN_SET_ENABLED`` the keys of all stored quotes are loaded
+    into a ``QuoteSeenSet`` when the spider opens, and items already stored
+    with the same tags are counted (or dropped, with
+    ``QUOTES_SEEN_SET_DROP_UNCHANGED``) without touching the database.
+
+    With ``CHECKPOINT_ID`` the items not written yet, buffered or in flight,
+    are part of the crawl checkpoint and written first by a resumed crawl.
+
+    With ``STAGE_METRICS_ENABLED`` every write is recorded as one sample of
+    the ``db`` stage, including the wait for a write slot.
+    """
+
+    def __init__(
+        self,
+        buffer_enabled: bool = False,
+        buffer_size: int = 500,
+        buffer_max_age: float = 5.0,
+        writer: str = "orm",
+        max_concurrent_writes: int = 4,
+        seen_set_enabled: bool = False,
+        seen_set_max_mb: float | None = None,
+        drop_unchanged: bool = False,
+        checkpoint: Checkpoint | None = None,
+        metrics: StageMetrics | None = None,
+        stats=None,
+    ):
         """Initialize the pipeline."""
-        self.session = None
-        self.quotes_repo = None
+        if writer not in ("orm", "copy"):
+            raise ValueError(f"Unknown quotes writer: {writer}")
+        self.session_factory = None
+        self.write_slots: asyncio.Semaphore | None = None
+        self.buffer_enabled = buffer_enabled or writer == "copy"
+        self.buffer_size = buffer_size
+        self.buffer_max_age = buffer_max_age
+        self.writer = writer
+        self.max_concurrent_writes = max_concurrent_writes
+        self.seen_set_enabled = seen_set_enabled
+        self.seen_set_max_mb = seen_set_max_mb
+        self.drop_unchanged = drop_unchanged
+        self.seen_set: QuoteSeenSet | None = None
+        self.checkpoint = checkpoint
+        self.metrics = metrics
+        self.stats = stats
+        self.buffer: list[dict[str, Any]] = []
+        # Rows taken out of the buffer whose write has not completed
+        self.writing: dict[int, list[dict[str, Any]]] = {}
+        self.flush_timer: asyncio.TimerHandle | None = None
+        self.pending_flushes: set[asyncio.Task] = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        """Create the pipeline from the crawler settings."""
+        settings = crawler.settings
+        return profile_pipeline(crawler, cls(
+            buffer_enabled=settings.getbool("QUOTES_DB_BUFFER_ENABLED"),
+            buffer_size=settings.getint("QUOTES_DB_BUFFER_SIZE", 500),
+            buffer_max_age=settings.getfloat("QUOTES_DB_BUFFER_MAX_AGE", 5.0),
+            writer=settings.get("QUOTES_DB_WRITER", "orm"),
+            max_concurrent_writes=settings.getint(
+                "QUOTES_DB_MAX_CONCURRENT_WRITES", 4),
+            seen_set_enabled=settings.getbool("QUOTES_SEEN_SET_ENABLED"),
+            seen_set_max_mb=settings.getfloat("QUOTES_SEEN_SET_MAX_MB") or None,
+            drop_unchanged=settings.getbool("QUOTES_SEEN_SET_DROP_UNCHANGED"),
+            checkpoint=Checkpoint.for_crawler(crawler),
+            metrics=StageMetrics.for_crawler(crawler),
+            stats=crawler.stats,
+        ))
 
     def open_spider(self, spider):
         """Called when the spider is opened."""
-        # Create a new event loop for this thread if needed
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
+        self.session_factory = get_session_factory()
+        self.write_slots = asyncio.Semaphore(self.max_concurrent_writes)
+        return deferred_from_coro(self._open(spider))
 
-        # Initialize database session and repository
-        self.session = loop.run_until_complete(get_database_session())
-        self.quotes_repo = QuotesRepository(self.session)
+    async def _open(self, spider):
+        if self.checkpoint is not None:
+            await maybe_deferred_to_future(self.checkpoint.open(spider))
+            restored = self.checkpoint.register("quotes_pipeline", self.unwritten)
+            if restored:
+                self.buffer.extend(restored)
+                self._flush_in_background(spider)
+                if self.stats is not None:
+                    self.stats.set_value("checkpoint/restored_items", len(restored))
+        if self.seen_set_enabled:
+            await self._load_seen_set(spider)
 
     def close_spider(self, spider):
         """Called when the spider is closed."""
-        if self.session:
-            # Close the session
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(self.session.close())
+        return deferred_from_coro(self._drain(spider))
 
-    def process_item(self, item: Quote, spider: QuotesSpider) -> Quote:
+    async def process_item(
+        self, item: Quote | CompactQuote, spider: QuotesSpider
+    ) -> Quote | CompactQuote:
         """Process a quote item and save it to the database."""
-        adapter = ItemAdapter(item)
-
-        # Extract data from the item
-        text = adapter.get("text")
-        author = adapter.get("author")
-        tags = adapter.get("tags")
+        text, author, tags = quote_fields(item)
 
         if not all([text, author, tags]):
             raise DropItem(f"Missing required fields in item: {item}")
 
+        text_hash = hash_text(text)
+
+        if self.seen_set is not None and self.seen_set.contains(author, text_hash, tags):
+            if self.stats is not None:
+                self.stats.inc_value("quotes/seen_set/unchanged")
+            if self.drop_unchanged:
+                raise DropItem(f"Unchanged quote: {text[:50]}... by {author}")
+            return item
+
+        if self.buffer_enabled:
+            await self._buffer_quote(text, text_hash, author, tags, spider)
+            return item
+
         # Check for duplicates and save to database
+        row = [{"text": text, "text_hash": text_hash, "author": author, "tags": tags}]
+        self.writing[id(row)] = row
+        started = time.perf_counter()
         try:
-            loop = asyncio.get_event_loop()
-            loop.run_until_complete(self._save_quote(text, author, tags))
+            async with self.write_slots:
+                await self._save_quote(text, author, tags)
+            if self.metrics is not None:
+                self.metrics.record("db", time.perf_counter() - started)
             spider.logger.info(f"Saved quote: {text[:50]}... by {author}")
         except Exception as e:
             spider.logger.error(f"Failed to save quote: {e}")
+            if self.stats is not None:
+                self.stats.inc_value("quotes/db/failed")
             raise DropItem(f"Database error: {e}")
+        finally:
+            del self.writing[id(row)]
 
         return item
 
-    async def _save_quote(self, text: str, author: str, tags: str):
+    async def _load_seen_set(self, spider: QuotesSpider):
+        """Stream the keys of all stored quotes into the seen-set."""
+        max_bytes = None
+        if self.seen_set_max_mb is not None:
+            max_bytes = int(self.seen_set_max_mb * 1024 * 1024)
+        seen_set = QuoteSeenSet(max_bytes)
+
+        async with self.session_factory() as session:
+            async for author, text_hash, tags in QuotesRepository(session).iter_keys():
+                if not seen_set.add(author, text_hash, tags):
+                    spider.logger.warning(
+                        f"Quote seen-set exceeds QUOTES_SEEN_SET_MAX_MB "
+                        f"({self.seen_set_max_mb} MiB); every item will be written"
+                    )
+                    return
+
+        seen_set.freeze()
+        self.seen_set = seen_set
+
+        mib = seen_set.nbytes / (1024 * 1024)
+        per_million = seen_set.ENTRY_BYTES * 1_000_000 / (1024 * 1024)
+        spider.logger.info(
+            f"Loaded {len(seen_set)} quotes into the seen-set: {mib:.1f} MiB "
+            f"({per_million:.1f} MiB per million quotes)"
+        )
+        if self.stats is not None:
+            self.stats.set_value("quotes/seen_set/size", len(seen_set))
+            self.stats.set_value("quotes/seen_set/bytes", seen_set.nbytes)
+
+    async def _buffer_quote(
+        self,
+        text: str,
+        text_hash: str,
+        author: str,
+        tags: Sequence[str],
+        spider: QuotesSpider,
+    ):
+        """Add a quote to the buffer and flush it once it is full."""
+        if not self.buffer:
+            loop = asyncio.get_running_loop()
+            self.flush_timer = loop.call_later(
+                self.buffer_max_age, self._flush_in_background, spider)
+        self.buffer.append({
+            "text": text,
+            "text_hash": text_hash,
+            "author": author,
+            "tags": tags,
+        })
+
+        if len(self.buffer) >= self.buffer_size:
+            await self._flush(spider)
+
+    def _flush_in_background(self, spider: QuotesSpider):
+        """Flush a buffer that reached its maximum age."""
+        task = asyncio.ensure_future(self._flush(spider))
+        self.pending_flushes.add(task)
+        task.add_done_callback(self.pending_flushes.discard)
+
+    async def _flush(self, spider: QuotesSpider):
+        """Write all buffered quotes with a single bulk upsert."""
+        rows, self.buffer = self.buffer, []
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if not rows:
+            return
+
+        self.writing[id(rows)] = rows
+        started = time.perf_counter()
+        try:
+            async with self.write_slots:
+                result = await self._upsert_quotes(rows)
+        except Exception as e:
+            spider.logger.error(f"Failed to flush {len(rows)} quotes: {e}")
+            if self.stats is not None:
+                self.stats.inc_value("quotes/db/failed", len(rows))
+            return
+        finally:
+            del self.writing[id(rows)]
+
+        if self.metrics is not None:
+            self.metrics.record("db", time.perf_counter() - started, len(rows))
+        spider.logger.info(
+            f"Flushed {len(rows)} quotes: {result.inserted} inserted, "
+            f"{result.updated} updated, {result.unchanged} unchanged"
+        )
+        if self.stats is not None:
+            self.stats.inc_value("quotes/db/flushes")
+            self.stats.inc_value("quotes/db/inserted", result.inserted)
+            self.stats.inc_value("quotes/db/updated", result.updated)
+            self.stats.inc_value("quotes/db/unchanged", result.unchanged)
+
+    async def _drain(self, spider: QuotesSpider):
+        """Flush the buffer and wait for all in-flight writes to finish."""
+        await self._flush(spider)
+        if self.pending_flushes:
+            await asyncio.gather(*self.pending_flushes)
+
+    def unwritten(self) -> list[dict[str, Any]]:
+        """Rows of the quotes not written yet, for the crawl checkpoint."""
+        return [*self.buffer, *(row for rows in self.writing.values() for row in rows)]
+
+    async def _upsert_quotes(self, rows: list[dict[str, Any]]) -> UpsertResult:
+        """Bulk upsert quotes on a dedicated session."""
+        async with self.session_factory() as session:
+            quotes_repo = QuotesRepository(session)
+            if self.writer == "copy":
+                return await quotes_repo.copy_upsert_many(rows)
+            return await quotes_repo.upsert_many(rows)
+
+    async def _save_quote(self, text: str, author: str, tags: Sequence[str]):
         """Save a quote to the database with duplicate checking."""
-        # Check if quote already exists
-        existing_quote = await self.quotes_repo.find_duplicate(text, author)
-
-        if existing_quote:
-            # Update tags if they're different
-            if existing_quote.tags != tags:
-                await self.quotes_repo.update_tags(existing_quote.id, tags)
-        else:
-            # Create new quote
-            await self.quotes_repo.create(text, author, tags)
+        # Stored tags load as a list, which never equals a tuple
+        tags = list(tags)
+        async with self.session_factory() as session:
+            quotes_repo = QuotesRepository(session)
+
+            # Check if quote already exists
+            existing_quote = await quotes_repo.find_duplicate(text, author)
+
+            if existing_quote:
+                # Update tags if they're different
+                if existing_quote.tags != tags:
+                    await quotes_repo.update_tags(existing_quote.id, tags)
+            else:
+                # Create new quote
+                await quotes_repo.create(text, author, tags)
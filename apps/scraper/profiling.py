@@ -0,0 +1,278 @@
+"""Opt-in CPU and memory profiling of crawls."""
+
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import pstats
+import sys
+import time
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Any, Callable
+from weakref import WeakKeyDictionary
+
+from scrapy import signals
+from twisted.internet import task
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """cProfile and tracemalloc for one crawl, enabled with ``PROFILING_ENABLED``.
+
+    Without ``PROFILING_TARGETS`` the CPU profile covers the whole crawl,
+    from the spider opening to it closing. Otherwise only calls of the
+    targets are profiled, one profile per target: spider callbacks by
+    method name (e.g. ``parse``) and item pipelines by class name (e.g.
+    ``QuotesDatabasePipeline``; pipelines opt in with ``profile_pipeline``).
+    Generator callbacks and coroutine ``process_item`` methods are profiled
+    one step at a time, so time spent elsewhere while they are suspended is
+    not counted.
+
+    With ``PROFILING_MEMORY`` a tracemalloc snapshot is taken every
+    ``PROFILING_MEMORY_INTERVAL`` seconds and when the spider closes; with
+    targets the snapshots only keep allocations made in their source files.
+
+    Profiles (``.prof``, for ``pstats`` or snakeviz) and snapshots
+    (``.snapshot``, for ``tracemalloc.Snapshot.load``) are written to
+    ``PROFILING_DIR``, and the top ``PROFILING_TOP_N`` entries of each are
+    logged.
+
+    Shared by the components of a crawler that ask for it through
+    ``for_crawler``, which returns None when profiling is disabled, so
+    disabled profiling costs one setting lookup per component.
+    """
+
+    _profilers: "WeakKeyDictionary[object, Profiler]" = WeakKeyDictionary()
+
+    def __init__(
+        self,
+        directory: str,
+        targets: list[str] | None = None,
+        cpu: bool = True,
+        memory: bool = True,
+        memory_interval: float = 60.0,
+        top_n: int = 20,
+    ):
+        """Initialize the profiler; nothing is profiled before the spider opens.
+
+        Args:
+            directory: Directory the profiles and snapshots are written to
+            targets: Names of the callbacks and pipelines to profile, or
+                None for the whole crawl
+            cpu: Profile CPU time with cProfile
+            memory: Take tracemalloc snapshots
+            memory_interval: Seconds between snapshots
+            top_n: Entries of each profile and snapshot logged
+        """
+        self.directory = Path(directory)
+        self.targets = set(targets or ())
+        self.cpu = cpu
+        self.memory = memory
+        self.memory_interval = memory_interval
+        self.top_n = top_n
+        self.prefix = ""
+        self.profiles: dict[str, cProfile.Profile] = {}
+        self.target_files: set[str] = set()
+        self.snapshots = 0
+        self.previous_snapshot: tracemalloc.Snapshot | None = None
+        self.loop: task.LoopingCall | None = None
+
+    @classmethod
+    def for_crawler(cls, crawler) -> "Profiler | None":
+        """Get the profiler of a crawler, or None without ``PROFILING_ENABLED``."""
+        settings = crawler.settings
+        if not settings.getbool("PROFILING_ENABLED"):
+            return None
+
+        profiler = cls._profilers.get(crawler)
+        if profiler is None:
+            profiler = cls._profilers[crawler] = cls(
+                settings.get("PROFILING_DIR", "profiles"),
+                targets=[
+                    target.strip() for target in settings.getlist("PROFILING_TARGETS")
+                    if target.strip()
+                ],
+                cpu=settings.getbool("PROFILING_CPU", True),
+                memory=settings.getbool("PROFILING_MEMORY", True),
+                memory_interval=settings.getfloat("PROFILING_MEMORY_INTERVAL", 60.0),
+                top_n=settings.getint("PROFILING_TOP_N", 20),
+            )
+            crawler.signals.connect(profiler.spider_opened, signal=signals.spider_opened)
+            crawler.signals.connect(profiler.spider_closed, signal=signals.spider_closed)
+        return profiler
+
+    def wrap(self, target: str, func: Callable) -> Callable:
+        """Profile the calls of ``func`` if ``target`` is one of the targets.
+
+        Args:
+            target: Name ``func`` is targeted by
+            func: Function, generator function or coroutine function
+
+        Returns:
+            ``func`` itself if it is not targeted, otherwise a wrapper of it
+        """
+        if target not in self.targets:
+            return func
+        self.target_files.add(inspect.getfile(func))
+        if not self.cpu:
+            return func
+
+        profile = self.profiles.setdefault(target, cProfile.Profile())
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                return (yield from _profiled_generator(profile, func(*args, **kwargs)))
+        elif inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await _ProfiledCoroutine(profile, func(*args, **kwargs))
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _enabled(profile):
+                    return func(*args, **kwargs)
+        return wrapper
+
+    def spider_opened(self, spider):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        parts = [spider.name]
+        if getattr(spider, "shards", 1) > 1:
+            parts.append(f"{spider.shard}-of-{spider.shards}")
+        parts.append(time.strftime("%Y%m%dT%H%M%S"))
+        self.prefix = "-".join(parts)
+
+        # Callbacks are looked up on the spider when a response arrives
+        for name in self.targets:
+            method = getattr(spider, name, None)
+            if isinstance(method, types.MethodType) and method.__self__ is spider:
+                setattr(spider, name, types.MethodType(self.wrap(name, method.__func__), spider))
+
+        if self.cpu and not self.targets:
+            self.profiles["crawl"] = cProfile.Profile()
+            self.profiles["crawl"].enable()
+        if self.memory:
+            tracemalloc.start()
+            self.loop = task.LoopingCall(self.take_snapshot)
+            self.loop.start(self.memory_interval, now=False)
+
+    def spider_closed(self, spider):
+        if "crawl" in self.profiles:
+            self.profiles["crawl"].disable()
+        for target, profile in self.profiles.items():
+            self._write_profile(target, profile)
+
+        if self.memory:
+            if self.loop is not None and self.loop.running:
+                self.loop.stop()
+            self.take_snapshot()
+            tracemalloc.stop()
+
+    def take_snapshot(self):
+        """Write a tracemalloc snapshot and log its largest allocation sites."""
+        snapshot = tracemalloc.take_snapshot()
+        if self.target_files:
+            snapshot = snapshot.filter_traces(
+                [tracemalloc.Filter(True, filename) for filename in self.target_files])
+        self.snapshots += 1
+        path = self.directory / f"{self.prefix}-memory-{self.snapshots}.snapshot"
+        snapshot.dump(str(path))
+
+        if self.previous_snapshot is None:
+            top = snapshot.statistics("lineno")[:self.top_n]
+        else:
+            top = snapshot.compare_to(self.previous_snapshot, "lineno")[:self.top_n]
+        self.previous_snapshot = snapshot
+        lines = "\n".join(str(stat) for stat in top)
+        logger.info(f"Memory snapshot {self.snapshots} written to {path}, top {len(top)}:\n{lines}")
+
+    def _write_profile(self, target: str, profile: cProfile.Profile):
+        path = self.directory / f"{self.prefix}-cpu-{target}.prof"
+        try:
+            stats = pstats.Stats(profile)
+        except TypeError:
+            # Never called
+            return
+        stats.dump_stats(path)
+
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+        logger.info(f"CPU profile of {target} written to {path}:\n{summary.getvalue()}")
+
+
+def profile_pipeline(crawler, pipeline: Any) -> Any:
+    """Let a pipeline be a ``PROFILING_TARGETS`` target, by class name.
+
+    Call from the pipeline's ``from_crawler``, before Scrapy collects its
+    ``process_item``.
+
+    Returns:
+        The pipeline
+    """
+    profiler = Profiler.for_crawler(crawler)
+    if profiler is not None:
+        pipeline.process_item = profiler.wrap(type(pipeline).__name__, pipeline.process_item)
+    return pipeline
+
+
+class _enabled:
+    """Enable a profile for a block, unless another profiler is running."""
+
+    def __init__(self, profile: cProfile.Profile):
+        self.profile = profile
+        self.active = False
+
+    def __enter__(self):
+        # Targets called by other targets count towards the outer one
+        if sys.getprofile() is None:
+            self.profile.enable()
+            self.active = True
+
+    def __exit__(self, *exc_info):
+        if self.active:
+            self.profile.disable()
+            self.active = False
+
+
+def _profiled_generator(profile: cProfile.Profile, generator):
+    """Run a generator with the profile enabled while it runs."""
+    value = None
+    try:
+        while True:
+            try:
+                with _enabled(profile):
+                    item = generator.send(value)
+            except StopIteration as stop:
+                return stop.value
+            value = yield item
+    finally:
+        generator.close()
+
+
+class _ProfiledCoroutine:
+    """Await a coroutine with the profile enabled while it runs."""
+
+    def __init__(self, profile: cProfile.Profile, coroutine):
+        self.profile = profile
+        self.coroutine = coroutine
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            try:
+                with _enabled(self.profile):
+                    if error is not None:
+                        signal = self.coroutine.throw(error)
+                    else:
+                        signal = self.coroutine.send(value)
+            except StopIteration as stop:
+                return stop.value
+            try:
+                value, error = (yield signal), None
+            except BaseException as exc:
+                value, error = None, exc
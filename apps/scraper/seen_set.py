@@ -0,0 +1,65 @@
+"""Compact in-memory set of quotes already stored in the database."""
+
+from array import array
+from bisect import bisect_left
+from typing import Sequence
+
+from db.hashing import fingerprint, hash_tags
+
+
+class QuoteSeenSet:
+    """Sorted array of 64-bit fingerprints of ``(author, text hash, tags hash)``.
+
+    Every entry costs 8 bytes, about 7.6 MiB per million quotes. A hit means
+    the quote is stored with the same tags, barring a 64-bit fingerprint
+    collision: with ``n`` stored quotes the chance that a given lookup is a
+    false hit is about ``n / 2**64``, under 1e-12 for ten million quotes.
+
+    Fingerprints are appended while loading and sorted once by ``freeze``;
+    lookups are binary searches.
+    """
+
+    ENTRY_BYTES = 8
+
+    def __init__(self, max_bytes: int | None = None):
+        """Initialize an empty seen-set.
+
+        Args:
+            max_bytes: Maximum memory for fingerprints, or None for no limit
+        """
+        self.max_bytes = max_bytes
+        self._fingerprints = array("Q")
+
+    @staticmethod
+    def fingerprint(author: str, text_hash: str, tags: Sequence[str]) -> int:
+        """Compute the 64-bit fingerprint of a quote."""
+        return fingerprint(author, text_hash, hash_tags(tags))
+
+    def add(self, author: str, text_hash: str, tags: Sequence[str]) -> bool:
+        """Add a quote while loading.
+
+        Returns:
+            False if the quote did not fit within ``max_bytes``
+        """
+        if self.max_bytes is not None and self.nbytes + self.ENTRY_BYTES > self.max_bytes:
+            return False
+        self._fingerprints.append(self.fingerprint(author, text_hash, tags))
+        return True
+
+    def freeze(self):
+        """Sort the fingerprints so they can be searched."""
+        self._fingerprints = array("Q", sorted(self._fingerprints))
+
+    def contains(self, author: str, text_hash: str, tags: Sequence[str]) -> bool:
+        """Check whether a quote is stored with exactly these tags."""
+        fingerprint = self.fingerprint(author, text_hash, tags)
+        index = bisect_left(self._fingerprints, fingerprint)
+        return index < len(self._fingerprints) and self._fingerprints[index] == fingerprint
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the fingerprints."""
+        return len(self._fingerprints) * self._fingerprints.itemsize
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
@@ -0,0 +1,58 @@
+"""JSON encoding of requests and crawl state kept in the database."""
+
+import base64
+import json
+from typing import Any
+
+from scrapy.http import Request
+from scrapy.utils.request import request_from_dict
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a value as JSON, with bytes as base64.
+
+    Raises:
+        TypeError: If the value holds anything else JSON cannot encode
+    """
+    return json.dumps(value, default=_encode_bytes, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """Decode a value encoded with ``dumps``.
+
+    Raises:
+        ValueError: If the data is not valid JSON
+    """
+    return json.loads(data, object_hook=_decode_bytes)
+
+
+def encode_request(request: Request, spider) -> dict[str, Any]:
+    """Convert a request to a value ``dumps`` can encode.
+
+    Raises:
+        ValueError: If the callback is not a method of the spider
+    """
+    data = request.to_dict(spider=spider)
+    # Header names are bytes, which JSON objects cannot have as keys
+    data["headers"] = [[name, values] for name, values in data["headers"].items()]
+    return data
+
+
+def decode_request(data: dict[str, Any], spider) -> Request:
+    """Rebuild a request converted with ``encode_request``."""
+    return request_from_dict(
+        {**data, "headers": {name: values for name, values in data["headers"]}},
+        spider=spider,
+    )
+
+
+def _encode_bytes(value: Any) -> dict[str, str]:
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_bytes(value: dict[str, Any]) -> Any:
+    if len(value) == 1 and "__bytes__" in value:
+        return base64.b64decode(value["__bytes__"])
+    return value
@@ -1,10 +1,45 @@
+import hashlib
+import re
 from pathlib import Path
 
 import scrapy
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
 from scrapy.http import Response
 from scrapy.loader import ItemLoader
 
-from tutorial.items import Quote
+from scraper.items import CompactQuote, Quote
+from scraper.page_store import PageStore
+
+
+def _compile(css: str) -> etree.XPath:
+    """Compile a CSS selector to an XPath evaluated the way parsel does."""
+    return etree.XPath(HTMLTranslator().css_to_xpath(css), smart_strings=False)
+
+
+# Compiled once for the fast extraction path, see QuotesSpider.extract_quotes
+QUOTE_XPATH = _compile("div.quote")
+TEXT_XPATH = _compile("span.text::text")
+AUTHOR_XPATH = _compile("small.author::text")
+TAGS_XPATH = _compile("div.tags a.tag::text")
+
+
+# Paginated listing URLs, whose successors can be predicted
+PAGE_URL_PATTERN = re.compile(r"^(?P<prefix>.*/page/)(?P<number>\d+)/$")
+
+
+def _url_shard(url: str, shards: int) -> int:
+    """Shard owning a URL that is not a paginated page, stable across processes."""
+    digest = hashlib.sha1(url.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shards
+
+
+def _take_first(values: list[str]) -> str | None:
+    """First non-empty value, like the TakeFirst output processor."""
+    for value in values:
+        if value is not None and value != "":
+            return value
+    return None
 
 
 class QuotesSpider(scrapy.Spider):
@@ -14,7 +49,220 @@ class QuotesSpider(scrapy.Spider):
         "https://quotes.toscrape.com/page/2/",
     ]
 
+    # Set when conditional requests or page fingerprints are enabled,
+    # see from_crawler
+    page_store: PageStore | None = None
+    fingerprint_pages = False
+    fast_extraction = False
+    # Yield CompactQuote instead of Quote items, extracted the fast way
+    compact_items = False
+    # Number of pages requested ahead of the last parsed one, 0 to disable
+    prefetch_window = 0
+
+    def __init__(self, *args, shard: int | str = 0, shards: int | str = 1, **kwargs):
+        """Initialize the spider.
+
+        Args:
+            shard: Index of the partition of the site this spider crawls,
+                from ``-a shard=N``
+            shards: Number of partitions the site is split into, from
+                ``-a shards=N``; 1 crawls the whole site
+        """
+        super().__init__(*args, **kwargs)
+        self.shard = int(shard)
+        self.shards = int(shards)
+        if not 0 <= self.shard < self.shards:
+            raise ValueError(f"shard must be in [0, {self.shards}), got {self.shard}")
+        # Pagination prefetch state: URLs requested so far, the highest page
+        # requested ahead and the last page known to have quotes.
+        self.requested_urls: set[str] = set()
+        self.prefetched_until = 0
+        self.last_page: int | None = None
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.fingerprint_pages = crawler.settings.getbool("PAGE_FINGERPRINT_ENABLED")
+        spider.fast_extraction = crawler.settings.getbool("QUOTES_FAST_EXTRACTION_ENABLED")
+        spider.compact_items = crawler.settings.getbool("QUOTES_COMPACT_ITEMS_ENABLED")
+        if spider.fingerprint_pages or crawler.settings.getbool("CONDITIONAL_REQUESTS_ENABLED"):
+            spider.page_store = PageStore.for_crawler(crawler)
+        if crawler.settings.getbool("PAGINATION_PREFETCH_ENABLED"):
+            spider.prefetch_window = crawler.settings.getint("PAGINATION_PREFETCH_WINDOW", 5)
+        return spider
+
+    async def start(self):
+        if self.shards == 1:
+            async for request in super().start():
+                yield request
+            return
+
+        for url in self.shard_start_urls():
+            yield scrapy.Request(url, dont_filter=True)
+
+    def owns(self, url: str) -> bool:
+        """Check whether a URL belongs to this spider's shard.
+
+        Paginated page ``n`` belongs to shard ``n % shards``, so every shard
+        gets one page out of ``shards`` however long the site is; other URLs
+        are partitioned by a hash of the URL.
+        """
+        if self.shards == 1:
+            return True
+        match = PAGE_URL_PATTERN.match(url)
+        if match is not None:
+            return int(match["number"]) % self.shards == self.shard
+        return _url_shard(url, self.shards) == self.shard
+
+    def shard_start_urls(self) -> list[str]:
+        """The start URLs of this shard.
+
+        A paginated listing is started once, from the first page of the
+        shard at or after its earliest start URL; the shard walks the rest.
+        """
+        urls = []
+        first_pages = {}
+        for url in self.start_urls:
+            match = PAGE_URL_PATTERN.match(url)
+            if match is None:
+                if self.owns(url) and url not in urls:
+                    urls.append(url)
+                continue
+            number = int(match["number"])
+            number += (self.shard - number) % self.shards
+            prefix = match["prefix"]
+            first_pages[prefix] = min(number, first_pages.get(prefix, number))
+        return [f"{prefix}{number}/" for prefix, number in first_pages.items()] + urls
+
     def parse(self, response: Response):
+        if self.prefetch_window:
+            self.requested_urls.add(response.url)
+            if response.status == 404:
+                self._end_pagination(response.url)
+                return
+
+        if response.meta.get("page_unchanged"):
+            # Not modified since the last crawl: its quotes are already
+            # stored, so only follow the links it had then.
+            page = self.page_store.get(response.url)
+            links = page.links or []
+            if self.shards > 1:
+                links = self.shard_links(response.url, links, has_quotes=True)
+            if self.prefetch_window:
+                yield from self.prefetch_pages(response.url)
+            yield from self.follow_links(response, links)
+            return
+
+        if self.prefetch_window:
+            if QUOTE_XPATH(response.selector.root):
+                yield from self.prefetch_pages(response.url)
+            else:
+                self._end_pagination(response.url)
+
+        state = {}
+        unchanged = False
+        if self.fingerprint_pages:
+            state["fingerprint"] = self.quotes_fingerprint(response.css("div.quote"))
+            page = self.page_store.get(response.url)
+            unchanged = page is not None and page.fingerprint == state["fingerprint"]
+            self.crawler.stats.inc_value(
+                "fingerprint/pages_skipped" if unchanged else "fingerprint/pages_parsed")
+            if unchanged:
+                # Seen by middlewares like a page that was not modified
+                response.meta["page_unchanged"] = True
+
+        if not unchanged:
+            yield from self.extract_quotes(response)
+
+        links = [
+            response.urljoin(href)
+            for href in response.css("ul.pager a::attr(href)").getall()
+        ]
+        if self.page_store is not None:
+            self.page_store.update(response.url, links=links, **state)
+        if self.shards > 1:
+            links = self.shard_links(response.url, links, has_quotes=bool(
+                QUOTE_XPATH(response.selector.root)))
+
+        yield from self.follow_links(response, links)
+
+    def shard_links(self, url: str, links: list[str], has_quotes: bool) -> list[str]:
+        """Keep the links of this shard and add its next paginated page.
+
+        The pager's next page belongs to another shard, so a page with
+        quotes leads to the page ``shards`` further instead.
+        """
+        links = [link for link in links if self.owns(link)]
+        match = PAGE_URL_PATTERN.match(url)
+        if match is not None and has_quotes:
+            successor = f"{match['prefix']}{int(match['number']) + self.shards}/"
+            if successor not in links:
+                links.append(successor)
+        return links
+
+    def follow_links(self, response: Response, urls: list[str]):
+        """Follow pager links, skipping pages already requested by prefetching."""
+        for url in urls:
+            if self.prefetch_window:
+                if url in self.requested_urls:
+                    self.crawler.stats.inc_value("prefetch/pager_deduped")
+                    continue
+                self.requested_urls.add(url)
+            yield response.follow(url, callback=self.parse)
+
+    def prefetch_pages(self, url: str):
+        """Request the ``prefetch_window`` pages following a paginated page.
+
+        Pages past the last one known to have quotes are never requested.
+        Prefetched pages let 404 through to ``parse``, which ends the
+        pagination there.
+        """
+        match = PAGE_URL_PATTERN.match(url)
+        if match is None:
+            return
+
+        number = int(match["number"])
+        until = number + self.prefetch_window * self.shards
+        if self.last_page is not None:
+            until = min(until, self.last_page)
+
+        for ahead in range(max(number, self.prefetched_until) + 1, until + 1):
+            page_url = f"{match['prefix']}{ahead}/"
+            if page_url in self.requested_urls or not self.owns(page_url):
+                continue
+            self.requested_urls.add(page_url)
+            self.crawler.stats.inc_value("prefetch/requests")
+            yield scrapy.Request(
+                page_url, callback=self.parse, meta={"handle_httpstatus_list": [404]})
+        self.prefetched_until = max(self.prefetched_until, until)
+
+    def _end_pagination(self, url: str):
+        """Stop prefetching past a page that was empty or missing."""
+        match = PAGE_URL_PATTERN.match(url)
+        if match is None:
+            return
+
+        self.crawler.stats.inc_value("prefetch/past_end")
+        last_page = int(match["number"]) - 1
+        if self.last_page is None or last_page < self.last_page:
+            self.last_page = last_page
+            self.crawler.stats.set_value("prefetch/last_page", last_page)
+
+    def extract_quotes(self, response: Response):
+        """Extract the quotes of a page as ``Quote`` items.
+
+        The fast path evaluates precompiled XPaths directly on the lxml tree
+        instead of building an ItemLoader per quote; both paths yield
+        identical items. With ``compact_items``, quotes are extracted the
+        fast way as ``CompactQuote`` items with the same fields.
+        """
+        if self.compact_items:
+            yield from self._extract_compact(response)
+            return
+        if self.fast_extraction:
+            yield from self._extract_fast(response)
+            return
+
         for quote in response.css("div.quote"):
             loader = ItemLoader(Quote(), quote)
             loader.add_css("text", "span.text::text")
@@ -22,5 +270,34 @@ class QuotesSpider(scrapy.Spider):
             loader.add_css("tags", "div.tags a.tag::text")
             yield loader.load_item()
 
-        for a in response.css("ul.pager a"):
-            yield response.follow(a, callback=self.parse)
+    @staticmethod
+    def _extract_fast(response: Response):
+        for quote in QUOTE_XPATH(response.selector.root):
+            # Fields without a value are left unset, as ItemLoader does
+            fields = {}
+            text = _take_first(TEXT_XPATH(quote))
+            if text is not None:
+                fields["text"] = text
+            author = _take_first(AUTHOR_XPATH(quote))
+            if author is not None:
+                fields["author"] = author
+            tags = TAGS_XPATH(quote)
+            if tags:
+                fields["tags"] = tags
+            yield Quote(**fields)
+
+    @staticmethod
+    def _extract_compact(response: Response):
+        for quote in QUOTE_XPATH(response.selector.root):
+            tags = TAGS_XPATH(quote)
+            yield CompactQuote(
+                _take_first(TEXT_XPATH(quote)),
+                _take_first(AUTHOR_XPATH(quote)),
+                tuple(tags) if tags else None,
+            )
+
+    @staticmethod
+    def quotes_fingerprint(quotes) -> str:
+        """Hash the quotes region of a page, ignoring whitespace changes."""
+        region = " ".join(" ".join(quotes.getall()).split())
+        return hashlib.sha256(region.encode("utf-8")).hexdigest()
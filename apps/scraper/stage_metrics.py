@@ -0,0 +1,209 @@
+"""Latency and throughput of the stages of a crawl."""
+
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from weakref import WeakKeyDictionary
+
+# Stages in the order a page goes through them
+STAGES = ("download", "parse", "validation", "db")
+
+# Reported latency percentiles
+QUANTILES = (50, 95, 99)
+
+
+class LatencyHistogram:
+    """Latencies counted in logarithmic buckets.
+
+    Buckets are ``GROWTH`` times wider than the previous one, so memory
+    does not grow with the number of samples and a percentile is at most
+    5% above the true value.
+    """
+
+    GROWTH = 1.05
+    # Latencies at or below this many seconds share the first bucket
+    MIN_SECONDS = 1e-6
+
+    def __init__(self):
+        """Initialize an empty histogram."""
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        """Count one latency."""
+        index = 0
+        if seconds > self.MIN_SECONDS:
+            index = math.ceil(math.log(seconds / self.MIN_SECONDS, self.GROWTH))
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the ``pct`` percentile, in seconds."""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.MIN_SECONDS * self.GROWTH ** index, self.max)
+        return self.max
+
+
+class StageMetrics:
+    """Latency histogram and item count of every stage of a crawl.
+
+    Stages record themselves: the download and parse stages through the
+    ``StageMetrics*Middleware`` classes, validation and database writes in
+    the pipelines. A database write is one sample covering all the items it
+    wrote. Throughput is items per second of crawl time, so stages can be
+    compared with each other.
+
+    Shared by the components of a crawler that ask for it through
+    ``for_crawler``, which returns None unless ``STAGE_METRICS_ENABLED``;
+    recording then costs nothing.
+    """
+
+    _metrics: "WeakKeyDictionary[object, StageMetrics]" = WeakKeyDictionary()
+
+    def __init__(self):
+        """Initialize empty metrics; the crawl clock starts with ``start``."""
+        self._lock = threading.Lock()
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.items = dict.fromkeys(STAGES, 0)
+        self.started = time.monotonic()
+
+    @classmethod
+    def for_crawler(cls, crawler) -> "StageMetrics | None":
+        """Get the metrics of a crawler, or None without ``STAGE_METRICS_ENABLED``."""
+        if not crawler.settings.getbool("STAGE_METRICS_ENABLED"):
+            return None
+
+        metrics = cls._metrics.get(crawler)
+        if metrics is None:
+            metrics = cls._metrics[crawler] = cls()
+        return metrics
+
+    def start(self):
+        """Start the crawl clock."""
+        self.started = time.monotonic()
+
+    def record(self, stage: str, seconds: float, items: int = 1):
+        """Record one pass through a stage.
+
+        Args:
+            stage: One of ``STAGES``
+            seconds: Time the pass took
+            items: Items (responses, for downloads) the pass handled
+        """
+        with self._lock:
+            self.histograms[stage].add(seconds)
+            self.items[stage] += items
+
+    def summary(self) -> dict[str, Any]:
+        """Percentiles, totals and throughput of every stage.
+
+        Returns:
+            ``elapsed_seconds`` since the crawl started and, by stage in
+            ``stages``: ``count`` of samples, ``items``, ``items_per_sec``,
+            ``total_seconds``, ``max_ms`` and ``p50_ms``, ``p95_ms`` and
+            ``p99_ms``
+        """
+        elapsed = time.monotonic() - self.started
+        stages = {}
+        with self._lock:
+            for stage, histogram in self.histograms.items():
+                stages[stage] = {
+                    "count": histogram.count,
+                    "items": self.items[stage],
+                    "items_per_sec": self.items[stage] / elapsed if elapsed else 0.0,
+                    "total_seconds": histogram.total,
+                    "max_ms": histogram.max * 1000,
+                    **{
+                        f"p{pct}_ms": histogram.percentile(pct) * 1000
+                        for pct in QUANTILES
+                    },
+                }
+        return {"elapsed_seconds": elapsed, "stages": stages}
+
+    def prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        summary = self.summary()
+        lines = [
+            "# HELP scraper_stage_latency_seconds Latency of one pass through a crawl stage.",
+            "# TYPE scraper_stage_latency_seconds summary",
+        ]
+        for stage, values in summary["stages"].items():
+            for pct in QUANTILES:
+                lines.append(
+                    f'scraper_stage_latency_seconds{{stage="{stage}",quantile="{pct / 100}"}} '
+                    f'{values[f"p{pct}_ms"] / 1000}'
+                )
+            lines.append(f'scraper_stage_latency_seconds_sum{{stage="{stage}"}} {values["total_seconds"]}')
+            lines.append(f'scraper_stage_latency_seconds_count{{stage="{stage}"}} {values["count"]}')
+        lines += [
+            "# HELP scraper_stage_items_total Items handled by a crawl stage; responses for downloads.",
+            "# TYPE scraper_stage_items_total counter",
+        ]
+        for stage, values in summary["stages"].items():
+            lines.append(f'scraper_stage_items_total{{stage="{stage}"}} {values["items"]}')
+        lines += [
+            "# HELP scraper_stage_items_per_second Items handled by a crawl stage per second of crawl.",
+            "# TYPE scraper_stage_items_per_second gauge",
+        ]
+        for stage, values in summary["stages"].items():
+            lines.append(f'scraper_stage_items_per_second{{stage="{stage}"}} {values["items_per_sec"]}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """HTTP server answering every GET with ``StageMetrics.prometheus``.
+
+    Serves from a daemon thread, so it does not block the reactor.
+    """
+
+    def __init__(self, metrics: StageMetrics, host: str, port: int):
+        """Initialize the server; it listens once started.
+
+        Args:
+            metrics: Metrics to serve
+            host: Address to listen on
+            port: Port to listen on, 0 for any free port
+        """
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._server: ThreadingHTTPServer | None = None
+
+    def start(self):
+        """Start listening; ``port`` is the actual port afterwards."""
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop listening."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
@@ -0,0 +1,216 @@
+"""Offline crawls for tests and benchmarks: a stand-in quotes site and a crawl runner."""
+
+import hashlib
+import html
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class QuotesSite:
+    """Local HTTP server serving a synthetic quotes.toscrape.com look-alike.
+
+    Pages live at ``/page/<n>/`` for ``1 <= n <= pages`` and use the same
+    markup as the real site. Any other path returns 404. With
+    ``max_concurrent`` set, requests beyond that many in flight are answered
+    with 429 Too Many Requests, like a rate-limited server. With ``etags``,
+    pages carry an ETag and are answered 304 Not Modified when requested
+    with a matching If-None-Match.
+    """
+
+    def __init__(
+        self,
+        pages: int = 10,
+        quotes_per_page: int = 10,
+        tags_per_quote: int = 3,
+        latency: float = 0.0,
+        max_concurrent: int | None = None,
+        etags: bool = False,
+    ):
+        """Initialize the site.
+
+        Args:
+            pages: Number of paginated pages
+            quotes_per_page: Number of quotes on each page
+            tags_per_quote: Number of tags attached to each quote
+            latency: Seconds to wait before answering each request
+            max_concurrent: Requests served at once before answering 429
+            etags: Whether pages are served with an ETag and revalidated
+        """
+        self.pages = pages
+        self.quotes_per_page = quotes_per_page
+        self.tags_per_quote = tags_per_quote
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.etags = etags
+        self.requests: list[str] = []
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Base URL of the running site."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, page: int) -> str:
+        """URL of a paginated page."""
+        return f"{self.url}/page/{page}/"
+
+    def quote(self, page: int, index: int) -> dict:
+        """The quote rendered at ``index`` on ``page``."""
+        number = (page - 1) * self.quotes_per_page + index
+        return {
+            "text": f"“Synthetic quote number {number}.”",
+            "author": f"Author {number % 97}",
+            "tags": [f"tag{(number + t) % 50}" for t in range(self.tags_per_quote)],
+        }
+
+    def render_page(self, page: int) -> bytes:
+        """Render the HTML of a paginated page."""
+        quotes = []
+        for index in range(self.quotes_per_page):
+            quote = self.quote(page, index)
+            tags = "".join(
+                f'<a class="tag" href="/tag/{html.escape(tag)}/page/1/">{html.escape(tag)}</a>'
+                for tag in quote["tags"]
+            )
+            quotes.append(
+                '<div class="quote" itemscope itemtype="http://schema.org/CreativeWork">'
+                f'<span class="text" itemprop="text">{html.escape(quote["text"])}</span>'
+                f'<span>by <small class="author" itemprop="author">{html.escape(quote["author"])}</small></span>'
+                f'<div class="tags">Tags: {tags}</div>'
+                "</div>"
+            )
+
+        pager = []
+        if page > 1:
+            pager.append(f'<li class="previous"><a href="/page/{page - 1}/">Previous</a></li>')
+        if page < self.pages:
+            pager.append(f'<li class="next"><a href="/page/{page + 1}/">Next</a></li>')
+
+        return (
+            "<html><head><title>Quotes to Scrape</title></head><body>"
+            '<div class="container"><div class="row"><div class="col-md-8">'
+            + "".join(quotes)
+            + f'<nav><ul class="pager">{"".join(pager)}</ul></nav>'
+            "</div></div></div></body></html>"
+        ).encode("utf-8")
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        """Answer a single GET request."""
+        with self._lock:
+            self.requests.append(handler.path)
+            self.in_flight += 1
+            rate_limited = (
+                self.max_concurrent is not None and self.in_flight > self.max_concurrent
+            )
+        try:
+            if rate_limited:
+                handler.send_response(429)
+                handler.send_header("Retry-After", "0")
+                handler.send_header("Content-Length", "0")
+                handler.end_headers()
+                return
+            self._serve(handler)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def _serve(self, handler: BaseHTTPRequestHandler):
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = handler.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "page" and parts[1].isdigit():
+            page = int(parts[1])
+            if 1 <= page <= self.pages:
+                body = self.render_page(page)
+                etag = f'"{hashlib.md5(body).hexdigest()}"'
+                if self.etags and handler.headers.get("If-None-Match") == etag:
+                    handler.send_response(304)
+                    handler.send_header("ETag", etag)
+                    handler.end_headers()
+                    return
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/html; charset=utf-8")
+                if self.etags:
+                    handler.send_header("ETag", etag)
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+                return
+
+        handler.send_response(404)
+        handler.send_header("Content-Length", "0")
+        handler.end_headers()
+
+    def start(self) -> "QuotesSite":
+        """Start serving on a free local port."""
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self) -> "QuotesSite":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def run_crawl(spider_cls, settings: dict, timeout: float = 120, **spider_kwargs) -> dict:
+    """Run a crawl in a fresh process and return its final stats.
+
+    Twisted reactors cannot be restarted, so every crawl gets its own
+    interpreter. ``spider_cls`` must be importable from that process.
+    """
+    process, queue = start_crawl(spider_cls, settings, **spider_kwargs)
+    try:
+        return queue.get(timeout=timeout)
+    finally:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.kill()
+
+
+def start_crawl(spider_cls, settings: dict, **spider_kwargs):
+    """Start a crawl in a fresh process without waiting for it.
+
+    Returns:
+        The crawl process and the queue its final stats are put on
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(
+        target=_crawl, args=(queue, spider_cls, settings, spider_kwargs))
+    process.start()
+    return process, queue
+
+
+def _crawl(queue, spider_cls, settings: dict, spider_kwargs: dict):
+    from scrapy.crawler import CrawlerProcess
+
+    process = CrawlerProcess(settings, install_root_handler=False)
+    crawler = process.create_crawler(spider_cls)
+    process.crawl(crawler, **spider_kwargs)
+    process.start()
+    queue.put(crawler.stats.get_stats())
@@ -0,0 +1,103 @@
+"""Shared helpers for benchmark scripts."""
+
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Iterator
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+import db
+from db import config
+
+ALEMBIC_INI = Path(db.__file__).parent / "alembic.ini"
+
+
+def time_calls(call: Callable[[], object], repeat: int) -> dict:
+    """Time ``repeat`` invocations of ``call``.
+
+    Returns:
+        Latency summary in milliseconds
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    """Summarize latency samples given in milliseconds."""
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "max_ms": ordered[-1],
+    }
+
+
+def percentile(ordered: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def write_report(report: dict, output: str | None):
+    """Write a report as JSON to ``output`` or stdout."""
+    data = json.dumps(report, indent=2, default=str)
+    if output:
+        Path(output).write_text(data + "\n")
+    else:
+        sys.stdout.write(data + "\n")
+
+
+@contextlib.contextmanager
+def scratch_database() -> Iterator[str]:
+    """Point the database configuration at a new, migrated scratch database.
+
+    The database is created next to the one configured by the ``DATABASE_*``
+    environment variables, migrated to head, and dropped on exit, so a
+    benchmark can delete, vacuum and drop partitions without touching live
+    quotes. ``DATABASE_NAME`` is set too, for crawls run in child processes.
+    Needs the CREATEDB privilege.
+
+    Yields:
+        The name of the scratch database
+    """
+    name = f"{config.postgres_database}_bench_{os.getpid()}"
+    admin = create_engine(config.database_url(), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        # The default template may differ from the configured database
+        encoding, collate, ctype = conn.execute(text(
+            "SELECT pg_encoding_to_char(encoding), datcollate, datctype "
+            "FROM pg_database WHERE datname = current_database()"
+        )).one()
+        conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        conn.execute(text(
+            f'CREATE DATABASE "{name}" TEMPLATE template0 '
+            f"ENCODING '{encoding}' LC_COLLATE '{collate}' LC_CTYPE '{ctype}'"
+        ))
+
+    previous = config.postgres_database, os.environ.get("DATABASE_NAME")
+    config.postgres_database = os.environ["DATABASE_NAME"] = name
+    try:
+        command.upgrade(Config(str(ALEMBIC_INI)), "head")
+        yield name
+    finally:
+        config.postgres_database = previous[0]
+        if previous[1] is None:
+            del os.environ["DATABASE_NAME"]
+        else:
+            os.environ["DATABASE_NAME"] = previous[1]
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        admin.dispose()
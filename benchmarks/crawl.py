@@ -0,0 +1,220 @@
+"""End-to-end crawl throughput against a local synthetic quotes site.
+
+Serves a quotes.toscrape.com look-alike of the requested size on localhost,
+crawls it with ``QuotesSpider`` and the project pipelines, and reports
+pages/sec, items/sec, database rows/sec and the peak RSS of the crawl
+process.
+
+With ``--backend stand-in`` (the default) the database pipeline writes to an
+in-memory table with a fixed latency per write, so no PostgreSQL is needed.
+With ``--backend postgres`` every run writes to a scratch database created
+next to the one configured by the ``DATABASE_*`` environment variables,
+migrated, and dropped afterwards.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import resource
+import sys
+from typing import Any
+
+from scrapy import signals
+
+import scraper.settings as project_settings
+from benchmarks._common import scratch_database, write_report
+from db.hashing import hash_text
+from db.repositories import UpsertResult
+from scraper.pipelines import QuotesDatabasePipeline
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+
+class StandInDatabasePipeline(QuotesDatabasePipeline):
+    """QuotesDatabasePipeline writing to an in-memory stand-in for Postgres.
+
+    Writes keep the semantics of ``QuotesRepository.upsert_many`` and take
+    ``BENCHMARK_DB_WRITE_LATENCY`` seconds each.
+    """
+
+    write_latency = 0.0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = super().from_crawler(crawler)
+        pipeline.write_latency = crawler.settings.getfloat("BENCHMARK_DB_WRITE_LATENCY")
+        pipeline.rows = {}
+        return pipeline
+
+    async def _upsert_quotes(self, rows: list[dict[str, Any]]) -> UpsertResult:
+        if self.write_latency:
+            await asyncio.sleep(self.write_latency)
+        result = UpsertResult()
+        collapsed = {(row["author"], row["text_hash"]): row["tags"] for row in rows}
+        result.unchanged += len(rows) - len(collapsed)
+        for key, tags in collapsed.items():
+            stored = self.rows.get(key)
+            if stored is None:
+                result.inserted += 1
+            elif stored != tags:
+                result.updated += 1
+            else:
+                result.unchanged += 1
+                continue
+            self.rows[key] = tags
+        return result
+
+    async def _save_quote(self, text: str, author: str, tags: list[str]):
+        result = await self._upsert_quotes(
+            [{"text": text, "text_hash": hash_text(text), "author": author, "tags": tags}])
+        if self.stats is not None:
+            self.stats.inc_value("quotes/db/inserted", result.inserted)
+            self.stats.inc_value("quotes/db/updated", result.updated)
+
+
+class PeakMemory:
+    """Record the peak RSS of the crawl process in ``bench/peak_rss_bytes``."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        extension = cls(crawler.stats)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        return extension
+
+    def spider_closed(self, spider):
+        self.stats.set_value("bench/peak_rss_bytes", peak_rss())
+
+
+def peak_rss() -> int:
+    """Peak resident set size of this process in bytes."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def crawl_settings(
+    backend: str,
+    concurrency: int,
+    fast_extraction: bool,
+    write_latency: float,
+    prefetch_window: int = 0,
+) -> dict:
+    """Project settings adjusted for a fast, repeatable local crawl."""
+    settings = {
+        name: getattr(project_settings, name)
+        for name in dir(project_settings)
+        if name.isupper()
+    }
+    settings.update({
+        "SPIDER_MODULES": ["scraper.spiders"],
+        "NEWSPIDER_MODULE": "scraper.spiders",
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+        "DOWNLOAD_DELAY": 0,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": concurrency,
+        "ADAPTIVE_CONCURRENCY_ENABLED": False,
+        # The site runs on a new port every time, so state remembered
+        # about its pages could never be reused.
+        "CONDITIONAL_REQUESTS_ENABLED": False,
+        "PAGE_FINGERPRINT_ENABLED": False,
+        "QUOTES_FAST_EXTRACTION_ENABLED": fast_extraction,
+        "PAGINATION_PREFETCH_ENABLED": prefetch_window > 0,
+        "PAGINATION_PREFETCH_WINDOW": prefetch_window,
+        "EXTENSIONS": {"benchmarks.crawl.PeakMemory": 0},
+    })
+    if backend == "stand-in":
+        settings["ITEM_PIPELINES"] = {
+            "scraper.pipelines.QuotesValidationPipeline": 100,
+            "benchmarks.crawl.StandInDatabasePipeline": 200,
+        }
+        settings["QUOTES_SEEN_SET_ENABLED"] = False
+        settings["BENCHMARK_DB_WRITE_LATENCY"] = write_latency
+    return settings
+
+
+def run(
+    pages: int,
+    quotes_per_page: int = 10,
+    tags_per_quote: int = 3,
+    latency: float = 0.0,
+    backend: str = "stand-in",
+    concurrency: int = 8,
+    fast_extraction: bool = False,
+    write_latency: float = 0.005,
+    prefetch_window: int = 0,
+    timeout: float = 600,
+) -> dict:
+    """Crawl a synthetic site of ``pages`` pages and summarize throughput."""
+    settings = crawl_settings(
+        backend, concurrency, fast_extraction, write_latency, prefetch_window)
+    database = scratch_database() if backend == "postgres" else contextlib.nullcontext()
+    with database, QuotesSite(pages, quotes_per_page, tags_per_quote, latency) as site:
+        stats = run_crawl(
+            QuotesSpider, settings, timeout=timeout, start_urls=[site.page_url(1)])
+
+    elapsed = (stats["finish_time"] - stats["start_time"]).total_seconds()
+    downloaded = stats.get("response_received_count", 0)
+    items = stats.get("item_scraped_count", 0)
+    rows = stats.get("quotes/db/inserted", 0) + stats.get("quotes/db/updated", 0)
+    return {
+        "site": {
+            "pages": pages,
+            "quotes_per_page": quotes_per_page,
+            "tags_per_quote": tags_per_quote,
+            "latency": latency,
+        },
+        "backend": backend,
+        "concurrency": concurrency,
+        "fast_extraction": fast_extraction,
+        "prefetch_window": prefetch_window,
+        "elapsed_sec": elapsed,
+        "pages": downloaded,
+        "items": items,
+        "items_dropped": stats.get("item_dropped_count", 0),
+        "db_rows": rows,
+        "db_rows_failed": stats.get("quotes/db/failed", 0),
+        "pages_per_sec": downloaded / elapsed,
+        "items_per_sec": items / elapsed,
+        "db_rows_per_sec": rows / elapsed,
+        "peak_rss_mb": stats["bench/peak_rss_bytes"] / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--quotes-per-page", type=int, default=10)
+    parser.add_argument("--tags-per-quote", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the site waits before every answer")
+    parser.add_argument("--backend", choices=["stand-in", "postgres"], default="stand-in")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="CONCURRENT_REQUESTS_PER_DOMAIN")
+    parser.add_argument("--fast-extraction", action="store_true",
+                        help="enable QUOTES_FAST_EXTRACTION_ENABLED")
+    parser.add_argument("--write-latency", type=float, default=0.005,
+                        help="seconds per write of the stand-in database")
+    parser.add_argument("--prefetch-window", type=int, default=0,
+                        help="PAGINATION_PREFETCH_WINDOW; 0 disables prefetching")
+    parser.add_argument("--timeout", type=float, default=600,
+                        help="seconds to wait for each crawl")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report(
+        {"benchmark": "crawl",
+         "results": [
+             run(pages, args.quotes_per_page, args.tags_per_quote, args.latency,
+                 args.backend, args.concurrency, args.fast_extraction,
+                 args.write_latency, args.prefetch_window, args.timeout)
+             for pages in args.pages
+         ]},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Quote extraction throughput: ItemLoader vs. precompiled XPaths.
+
+Renders synthetic pages with the markup of quotes.toscrape.com and runs
+``QuotesSpider.extract_quotes`` over them with and without fast extraction.
+Every run parses a fresh response, so HTML parsing is included in both.
+No network or database is needed.
+"""
+
+import argparse
+import time
+
+from scrapy.http import HtmlResponse
+
+from benchmarks._common import summarize, write_report
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite
+
+URL = "https://quotes.toscrape.com/page/1/"
+
+
+def measure(html: bytes, fast: bool, repeat: int) -> dict:
+    """Time ``repeat`` extractions of one page with one of the paths."""
+    spider = QuotesSpider()
+    spider.fast_extraction = fast
+
+    samples = []
+    quotes = 0
+    for _ in range(repeat):
+        response = HtmlResponse(url=URL, body=html, encoding="utf-8")
+        start = time.perf_counter()
+        quotes += sum(1 for _ in spider.extract_quotes(response))
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "quotes_per_sec": quotes / (sum(samples) / 1000),
+        "page_latency": summarize(samples),
+    }
+
+
+def run(quotes_per_page: int, repeat: int) -> dict:
+    """Benchmark both paths on a page with ``quotes_per_page`` quotes."""
+    html = QuotesSite(quotes_per_page=quotes_per_page).render_page(1)
+    item_loader = measure(html, fast=False, repeat=repeat)
+    fast = measure(html, fast=True, repeat=repeat)
+    return {
+        "quotes_per_page": quotes_per_page,
+        "page_bytes": len(html),
+        "item_loader": item_loader,
+        "fast": fast,
+        "speedup": fast["quotes_per_sec"] / item_loader["quotes_per_sec"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--quotes-per-page", type=int, nargs="+",
+                        default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="extractions per page size and path")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report(
+        {"benchmark": "extraction",
+         "results": [run(size, args.repeat) for size in args.quotes_per_page]},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
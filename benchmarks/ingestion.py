@@ -0,0 +1,107 @@
+"""Bulk ingestion throughput: ORM upserts vs. COPY into a staging table.
+
+Writes synthetic quotes in batches of ``--batch-size`` rows, as the database
+pipeline flushes its buffer, with ``QuotesRepository.upsert_many`` (the
+``orm`` writer) and with ``QuotesRepository.copy_upsert_many`` (the ``copy``
+writer). Each size is written twice per writer: once into an empty table,
+all inserts, and once more with changed tags, all updates.
+
+Writes to the ``quotes`` table of a scratch database created next to the
+one configured by the ``DATABASE_*`` environment variables, migrated, and
+dropped afterwards.
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from benchmarks._common import scratch_database, write_report
+from db.config import database_url
+from db.hashing import hash_text
+from db.repositories import QuotesRepository
+
+AUTHORS = 5000
+
+
+def quote_rows(size: int, tags: list[str]) -> list[dict]:
+    """Synthetic quotes with precomputed hashes, as the pipeline buffers them."""
+    rows = []
+    for number in range(size):
+        quote = f"“Synthetic quote number {number}.”"
+        rows.append({
+            "text": quote,
+            "text_hash": hash_text(quote),
+            "author": f"Author {number % AUTHORS}",
+            "tags": tags,
+        })
+    return rows
+
+
+async def empty_quotes(engine):
+    """Remove the quotes written by the previous writer.
+
+    Truncating leaves no dead rows behind, so every writer starts from the
+    same empty table.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE quotes"))
+
+
+async def write(session_factory, writer: str, rows: list[dict], batch_size: int) -> dict:
+    """Write ``rows`` in batches and time it."""
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    start = time.perf_counter()
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        async with session_factory() as session:
+            quotes_repo = QuotesRepository(session)
+            if writer == "copy":
+                result = await quotes_repo.copy_upsert_many(batch)
+            else:
+                result = await quotes_repo.upsert_many(batch)
+        counts["inserted"] += result.inserted
+        counts["updated"] += result.updated
+        counts["unchanged"] += result.unchanged
+    elapsed = time.perf_counter() - start
+    return {**counts, "elapsed_sec": elapsed, "rows_per_sec": len(rows) / elapsed}
+
+
+async def run(size: int, batch_size: int, writers: list[str]) -> dict:
+    """Benchmark every writer at ``size`` rows."""
+    engine = create_async_engine(database_url("asyncpg"))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    inserts = quote_rows(size, ["tag"])
+    updates = quote_rows(size, ["tag", "changed"])
+
+    result = {"rows": size, "batch_size": batch_size}
+    for writer in writers:
+        await empty_quotes(engine)
+        result[writer] = {
+            "insert": await write(session_factory, writer, inserts, batch_size),
+            "update": await write(session_factory, writer, updates, batch_size),
+        }
+
+    await engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--batch-size", type=int, default=5000,
+                        help="rows per write, QUOTES_DB_BUFFER_SIZE")
+    parser.add_argument("--writers", nargs="+", choices=["orm", "copy"],
+                        default=["orm", "copy"])
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with scratch_database():
+        results = [asyncio.run(run(size, args.batch_size, args.writers)) for size in args.sizes]
+    write_report({"benchmark": "ingestion", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Quote items: memory and pipeline throughput of Quote vs. CompactQuote.
+
+Builds a synthetic stream of ``--sizes`` quote items of each type, the way
+the spider's extraction paths do, from strings created beforehand so only
+the items themselves are measured:
+
+- ``bytes_per_item``: memory held by an item, its field storage and its
+  tags container, measured with tracemalloc while all items are alive.
+- ``read``: items/sec of building every item, validating it with
+  ``QuotesValidationPipeline`` and reading its fields the way
+  ``QuotesDatabasePipeline`` does.
+- ``pipelines``: items/sec of building every item and passing it through
+  ``QuotesValidationPipeline`` and ``QuotesDatabasePipeline``, with every
+  quote in the seen-set so no item reaches the database.
+
+No network or database is needed.
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+
+from benchmarks._common import write_report
+from db.hashing import hash_text
+from scraper.items import CompactQuote, Quote, quote_fields
+from scraper.pipelines import QuotesDatabasePipeline, QuotesValidationPipeline
+from scraper.seen_set import QuoteSeenSet
+from scraper.testing import QuotesSite
+
+KINDS = {
+    "quote": lambda text, author, tags: Quote(text=text, author=author, tags=list(tags)),
+    "compact": lambda text, author, tags: CompactQuote(text, author, tuple(tags)),
+}
+
+
+def synthetic_stream(size: int) -> list[tuple[str, str, list[str]]]:
+    """Fields of ``size`` quotes of the stand-in site."""
+    site = QuotesSite(quotes_per_page=size)
+    return [
+        (quote["text"], quote["author"], quote["tags"])
+        for quote in (site.quote(1, index) for index in range(size))
+    ]
+
+
+def bytes_per_item(kind: str, stream: list) -> float:
+    """Memory held by each item while all of them are alive."""
+    make = KINDS[kind]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    items = [make(text, author, tags) for text, author, tags in stream]
+    held = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(items)
+    tracemalloc.stop()
+    del items
+    return held / len(stream)
+
+
+def read_rate(kind: str, stream: list) -> float:
+    """Items/sec built, validated and read."""
+    make = KINDS[kind]
+    validation = QuotesValidationPipeline()
+    start = time.perf_counter()
+    for text, author, tags in stream:
+        item = validation.process_item(make(text, author, tags), None)
+        quote_fields(item)
+    return len(stream) / (time.perf_counter() - start)
+
+
+def pipelines_rate(kind: str, stream: list) -> float:
+    """Items/sec through the validation and database pipelines."""
+    make = KINDS[kind]
+    validation = QuotesValidationPipeline()
+    database = QuotesDatabasePipeline(seen_set_enabled=True)
+    database.seen_set = QuoteSeenSet()
+    for text, author, tags in stream:
+        database.seen_set.add(author, hash_text(text), tags)
+    database.seen_set.freeze()
+
+    async def run() -> float:
+        start = time.perf_counter()
+        for text, author, tags in stream:
+            await database.process_item(validation.process_item(make(text, author, tags), None), None)
+        return time.perf_counter() - start
+
+    return len(stream) / asyncio.run(run())
+
+
+def run(size: int) -> dict:
+    """Benchmark both item types on a stream of ``size`` quotes."""
+    stream = synthetic_stream(size)
+    result = {"items": size}
+    for kind in KINDS:
+        result[kind] = {
+            "bytes_per_item": bytes_per_item(kind, stream),
+            "read_items_per_sec": read_rate(kind, stream),
+            "pipelines_items_per_sec": pipelines_rate(kind, stream),
+        }
+    result["bytes_saved_per_item"] = (
+        result["quote"]["bytes_per_item"] - result["compact"]["bytes_per_item"])
+    result["read_speedup"] = (
+        result["compact"]["read_items_per_sec"] / result["quote"]["read_items_per_sec"])
+    result["pipelines_speedup"] = (
+        result["compact"]["pipelines_items_per_sec"] / result["quote"]["pipelines_items_per_sec"])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report({"benchmark": "items", "results": [run(size) for size in args.sizes]}, args.output)
+
+
+if __name__ == "__main__":
+    main()
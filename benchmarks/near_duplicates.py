@@ -0,0 +1,175 @@
+"""Near-duplicate detection: accuracy on labeled quotes, and throughput.
+
+Accuracy is measured on ``tests/fixtures/near_duplicates.json``, groups of
+an original quote and variants of it (straight quotes, whitespace,
+punctuation, a small edit, and combinations), plus hard negatives. For
+every ``--thresholds`` value:
+
+- ``precision`` and ``recall`` of the near-duplicate pairs found by the
+  LSH index, against all pairs of quotes of the same group.
+- ``recall_by_variant``: the share of variants of each kind found by
+  querying the index with them, excluding the variant itself.
+- ``exact_hash_recall``: the same share for the exact ``text_hash`` match
+  of ``QuotesRepository.find_duplicate``, which the index complements.
+
+Throughput is measured on ``--sizes`` synthetic quotes of random words
+drawn from a skewed vocabulary:
+
+- ``signatures_per_sec``: signing with ``MinHasher.signatures``.
+- ``query``: latency of ``LSHIndex.query`` for quotes of the index.
+- ``insert``: latency of ``LSHIndex.insert`` after ``freeze``.
+- ``freeze_sec`` and ``cluster_sec``: indexing and clustering everything.
+- ``bytes_per_entry`` and ``index_mb``: memory of the index.
+
+Needs no database.
+"""
+
+import argparse
+import itertools
+import json
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks._common import summarize, time_calls, write_report
+from db.hashing import hash_text
+from db.minhash import LSHIndex, MinHasher
+
+FIXTURE = Path(__file__).parent.parent / "tests" / "fixtures" / "near_duplicates.json"
+VOCABULARY = 20000
+MIN_WORDS = 6
+MAX_WORDS = 40
+
+
+def load_groups() -> list[list[tuple[str, str]]]:
+    """Load the labeled groups as lists of ``(kind, text)``, original first."""
+    groups = json.loads(FIXTURE.read_text(encoding="utf-8"))["groups"]
+    return [
+        [("original", group["original"]), *group["variants"].items()]
+        for group in groups
+    ]
+
+
+def accuracy(threshold: float) -> dict:
+    """Precision and recall on the labeled groups at a threshold."""
+    groups = load_groups()
+    texts = [text for group in groups for _, text in group]
+    kinds = [kind for group in groups for kind, _ in group]
+    sizes = [len(group) for group in groups]
+    labels = np.repeat(np.arange(len(groups)), sizes)
+    originals = np.repeat(np.cumsum(sizes) - sizes, sizes)
+
+    hasher = MinHasher()
+    signatures = hasher.signatures(texts)
+    index = LSHIndex(hasher)
+    index.add(signatures)
+    index.freeze()
+
+    found = {tuple(pair) for pair in index.pairs(threshold).tolist()}
+    expected = {
+        (first, second)
+        for first, second in itertools.combinations(range(len(texts)), 2)
+        if labels[first] == labels[second]
+    }
+    true_positives = len(found & expected)
+
+    by_variant: dict[str, list[bool]] = {}
+    exact_by_variant: dict[str, list[bool]] = {}
+    for position, kind in enumerate(kinds):
+        if kind == "original":
+            continue
+        original = int(originals[position])
+        matches = {entry_id for entry_id, _ in index.query(signatures[position], threshold)}
+        by_variant.setdefault(kind, []).append(original in matches)
+        exact_by_variant.setdefault(kind, []).append(
+            hash_text(texts[position]) == hash_text(texts[original]))
+
+    return {
+        "threshold": threshold,
+        "pairs": len(expected),
+        "found": len(found),
+        "precision": true_positives / len(found) if found else 1.0,
+        "recall": true_positives / len(expected),
+        "recall_by_variant": {kind: float(np.mean(hits)) for kind, hits in by_variant.items()},
+        "exact_hash_recall": {kind: float(np.mean(hits)) for kind, hits in exact_by_variant.items()},
+    }
+
+
+def synthetic_quotes(size: int, seed: int = 0) -> list[str]:
+    """``size`` quotes of random words, some frequent and most rare."""
+    rng = np.random.default_rng(seed)
+    words = [
+        "".join(rng.choice(list("abcdefghijklmnopqrstuvwxyz"), rng.integers(2, 10)))
+        for _ in range(VOCABULARY)
+    ]
+    lengths = rng.integers(MIN_WORDS, MAX_WORDS + 1, size)
+    picks = (VOCABULARY * rng.random(lengths.sum()) ** 3).astype(np.int64)
+    bounds = np.concatenate(([0], np.cumsum(lengths)))
+    return [
+        "“" + " ".join(words[pick] for pick in picks[start:end]).capitalize() + ".”"
+        for start, end in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+def throughput(size: int, repeat: int) -> dict:
+    """Signing, indexing, query and clustering speed for ``size`` quotes."""
+    quotes = synthetic_quotes(size)
+    hasher = MinHasher()
+
+    start = time.perf_counter()
+    signatures = hasher.signatures(quotes)
+    sign_sec = time.perf_counter() - start
+
+    index = LSHIndex(hasher)
+    index.add(signatures)
+    start = time.perf_counter()
+    index.freeze()
+    freeze_sec = time.perf_counter() - start
+
+    queries = random.Random(0).sample(range(size), min(repeat, size))
+    samples = []
+    for position in queries:
+        start = time.perf_counter()
+        index.query(signatures[position])
+        samples.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    labels = index.clusters()
+    cluster_sec = time.perf_counter() - start
+
+    inserted = iter(hasher.signatures(synthetic_quotes(repeat, seed=1)))
+    insert = time_calls(lambda: index.insert(next(inserted), 0), repeat)
+
+    return {
+        "quotes": size,
+        "signatures_per_sec": size / sign_sec,
+        "query": summarize(samples),
+        "insert": insert,
+        "freeze_sec": freeze_sec,
+        "cluster_sec": cluster_sec,
+        "clustered": int((np.bincount(labels)[labels] > 1).sum()),
+        "bytes_per_entry": index.entry_bytes,
+        "index_mb": index.nbytes / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=1000, help="queries per measurement")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report(
+        {"benchmark": "near_duplicates",
+         "accuracy": [accuracy(threshold) for threshold in args.thresholds],
+         "throughput": [throughput(size, args.repeat) for size in args.sizes]},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Duplicate lookup latency: text predicate vs. (author, text_hash) index.
+
+Builds a synthetic ``bench_quote_lookup`` table of each requested size and
+times the lookup ``find_duplicate`` used to run (``text = ? AND author = ?``,
+no index) against the hash lookup it runs now.
+"""
+
+import argparse
+import random
+
+from sqlalchemy import create_engine, text
+
+from benchmarks._common import time_calls, write_report
+from db.config import db_url
+from db.hashing import hash_text
+
+TABLE = "bench_quote_lookup"
+AUTHORS = 5000
+FILLER = " lorem ipsum" * 8
+
+
+def quote_text(number: int) -> str:
+    """Synthetic quote text; must match the SQL expression in populate()."""
+    return f"Synthetic quote {number}{FILLER}"
+
+
+def populate(conn, size: int):
+    """Create and fill the benchmark table with ``size`` rows."""
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(text(
+        f"CREATE TABLE {TABLE} (LIKE quotes INCLUDING DEFAULTS)"))
+    # The texts are already normalized, so SQL sha256 matches hash_text().
+    conn.execute(
+        text(
+            f"""
+            INSERT INTO {TABLE} (text, text_hash, author, tags)
+            SELECT t, encode(sha256(convert_to(t, 'UTF8')), 'hex'),
+                   'Author ' || (g % :authors), ARRAY['tag']
+            FROM generate_series(1, :size) AS g,
+                 LATERAL (SELECT 'Synthetic quote ' || g || :filler) AS s(t)
+            """
+        ),
+        {"size": size, "authors": AUTHORS, "filler": FILLER},
+    )
+    conn.execute(text(
+        f"CREATE UNIQUE INDEX ON {TABLE} (author, text_hash)"))
+    conn.execute(text(f"ANALYZE {TABLE}"))
+
+
+def run(size: int, lookups: int, scan_lookups: int) -> dict:
+    """Benchmark both lookups against a table of ``size`` rows."""
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        populate(conn, size)
+
+    numbers = [random.randint(1, size) for _ in range(max(lookups, scan_lookups))]
+    keys = iter([(quote_text(n), f"Author {n % AUTHORS}") for n in numbers] * 2)
+
+    by_text = text(f"SELECT id FROM {TABLE} WHERE text = :text AND author = :author")
+    by_hash = text(f"SELECT id FROM {TABLE} WHERE author = :author AND text_hash = :text_hash")
+
+    with engine.connect() as conn:
+        def text_lookup():
+            quote, author = next(keys)
+            conn.execute(by_text, {"text": quote, "author": author}).one()
+
+        def hash_lookup():
+            quote, author = next(keys)
+            conn.execute(by_hash, {"author": author, "text_hash": hash_text(quote)}).one()
+
+        result = {
+            "rows": size,
+            "text_predicate": time_calls(text_lookup, scan_lookups),
+            "text_hash_index": time_calls(hash_lookup, lookups),
+        }
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {TABLE}"))
+    engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--lookups", type=int, default=200,
+                        help="indexed lookups per size")
+    parser.add_argument("--scan-lookups", type=int, default=10,
+                        help="unindexed lookups per size")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report(
+        {"benchmark": "quote_lookup",
+         "results": [run(size, args.lookups, args.scan_lookups) for size in args.sizes]},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""Quote retention: row-by-row DELETE vs. dropping monthly partitions.
+
+Spreads ``--size`` synthetic quotes evenly over ``--months`` months of the
+year 2000 and expires the oldest ``--expire`` months, twice:
+
+- ``delete``: a ``bench_retention`` table with the schema ``quotes`` had
+  before it was partitioned, cleaned up with the single ``DELETE`` that
+  ``cleanup_old_quotes`` used to run, then vacuumed.
+- ``partitions``: the partitioned ``quotes`` table itself, cleaned up with
+  ``QuotePartitionsRepository.drop_before``, which also updates the
+  statistics; then the remaining partitions are vacuumed.
+
+Reports the runtime of the cleanup and of the vacuum, the dead rows left
+behind and the size of the tables before and after. Runs in a scratch
+database created next to the one configured by the ``DATABASE_*``
+environment variables, migrated, and dropped afterwards.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from benchmarks._common import scratch_database, write_report
+from db.config import database_url
+from db.repositories import QuotePartitionsRepository
+
+TABLE = "bench_retention"
+AUTHORS = 5000
+START = datetime(2000, 1, 1)
+# After every partition the benchmark can create
+END = datetime(2001, 1, 1)
+
+# Synthetic quotes evenly spread over :months months from :start, oldest
+# first; the texts are already normalized, so SQL sha256 matches hash_text()
+QUOTES = """
+    SELECT t, encode(sha256(convert_to(t, 'UTF8')), 'hex'), 'Author ' || (g % :authors),
+           ARRAY['tag'], created_at, created_at
+    FROM generate_series(1, :size) AS g,
+         LATERAL (SELECT '“Synthetic retention quote ' || g || '.”') AS s(t),
+         LATERAL (SELECT CAST(:start AS timestamp)
+                         + (g - 1) * (interval '1 month' * :months) / :size) AS c(created_at)
+"""
+
+
+def cutoff(months: int) -> datetime:
+    """Start of the month ``months`` months after ``START``."""
+    return START.replace(year=START.year + months // 12, month=months % 12 + 1)
+
+
+def dead_rows(engine, pattern: str) -> int:
+    """Dead rows of the tables named like ``pattern``, as counted by the cumulative statistics.
+
+    Backends report their counts when they exit, so the pool is closed
+    first.
+    """
+    engine.dispose()
+    time.sleep(1)
+    with engine.connect() as conn:
+        return conn.scalar(
+            text(
+                "SELECT CAST(coalesce(sum(n_dead_tup), 0) AS bigint) "
+                "FROM pg_stat_user_tables WHERE relname LIKE :pattern"
+            ),
+            {"pattern": pattern},
+        )
+
+
+def timed_vacuum(engine, table: str) -> float:
+    """Vacuum a table and return the seconds it took."""
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        start = time.perf_counter()
+        conn.execute(text(f"VACUUM {table}"))
+        return time.perf_counter() - start
+
+
+def run_delete(engine, size: int, months: int, expire: int) -> dict:
+    """Expire quotes with a DELETE on the unpartitioned schema."""
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(
+            f"""
+            CREATE TABLE {TABLE} (
+                id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+                text varchar NOT NULL,
+                text_hash varchar(64) NOT NULL,
+                author varchar NOT NULL,
+                tags text[] NOT NULL,
+                created_at timestamp NOT NULL DEFAULT now(),
+                updated_at timestamp NOT NULL DEFAULT now()
+            )
+            """
+        ))
+        conn.execute(
+            text(f"INSERT INTO {TABLE} (text, text_hash, author, tags, created_at, updated_at) {QUOTES}"),
+            {"size": size, "authors": AUTHORS, "start": START, "months": months},
+        )
+        conn.execute(text(f"CREATE UNIQUE INDEX ON {TABLE} (author, text_hash)"))
+        conn.execute(text(f"CREATE INDEX ON {TABLE} USING gin (tags)"))
+    timed_vacuum(engine, TABLE)
+
+    size_sql = text("SELECT pg_total_relation_size(CAST(:table AS regclass))")
+    with engine.connect() as conn:
+        bytes_before = conn.scalar(size_sql, {"table": TABLE})
+
+    with engine.begin() as conn:
+        start = time.perf_counter()
+        deleted = conn.execute(
+            text(f"DELETE FROM {TABLE} WHERE created_at < :cutoff"), {"cutoff": cutoff(expire)}
+        ).rowcount
+        elapsed = time.perf_counter() - start
+
+    dead = dead_rows(engine, TABLE)
+    vacuum = timed_vacuum(engine, TABLE)
+    with engine.begin() as conn:
+        bytes_after = conn.scalar(size_sql, {"table": TABLE})
+        conn.execute(text(f"DROP TABLE {TABLE}"))
+
+    return {
+        "removed": deleted,
+        "elapsed_sec": elapsed,
+        "dead_rows": dead,
+        "vacuum_sec": vacuum,
+        "bytes_before": bytes_before,
+        "bytes_after_vacuum": bytes_after,
+    }
+
+
+def run_partitions(engine, size: int, months: int, expire: int) -> dict:
+    """Expire quotes by dropping partitions of quotes."""
+    with Session(engine) as session:
+        partitions = QuotePartitionsRepository(session)
+        partitions.drop_before(END)
+        partitions.create(START, cutoff(months - 1))
+        session.execute(
+            text(f"INSERT INTO quotes (text, text_hash, author, tags, created_at, updated_at) {QUOTES}"),
+            {"size": size, "authors": AUTHORS, "start": START, "months": months},
+        )
+        session.commit()
+    timed_vacuum(engine, "quotes")
+
+    # The partitions of the benchmark
+    size_sql = text(
+        """
+        SELECT CAST(coalesce(sum(pg_total_relation_size(relid)), 0) AS bigint)
+        FROM pg_partition_tree('quotes')
+        WHERE relid::text LIKE 'quotes_p2000%'
+        """
+    )
+    with engine.connect() as conn:
+        bytes_before = conn.scalar(size_sql)
+
+    with Session(engine) as session:
+        start = time.perf_counter()
+        dropped = QuotePartitionsRepository(session).drop_before(cutoff(expire))
+        elapsed = time.perf_counter() - start
+
+    dead = dead_rows(engine, "quotes_p2000%")
+    vacuum = timed_vacuum(engine, "quotes")
+    with engine.connect() as conn:
+        bytes_after = conn.scalar(size_sql)
+
+    with Session(engine) as session:
+        QuotePartitionsRepository(session).drop_before(END)
+
+    return {
+        "removed_partitions": len(dropped),
+        "elapsed_sec": elapsed,
+        "dead_rows": dead,
+        "vacuum_sec": vacuum,
+        "bytes_before": bytes_before,
+        "bytes_after_vacuum": bytes_after,
+    }
+
+
+def run(size: int, months: int, expire: int) -> dict:
+    """Benchmark both cleanups at ``size`` quotes."""
+    engine = create_engine(database_url())
+    result = {
+        "rows": size,
+        "months": months,
+        "expired_months": expire,
+        "delete": run_delete(engine, size, months, expire),
+        "partitions": run_partitions(engine, size, months, expire),
+    }
+    engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000_000])
+    parser.add_argument("--months", type=int, default=12, help="months the quotes span, at most 12")
+    parser.add_argument("--expire", type=int, default=6, help="oldest months to expire")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with scratch_database():
+        results = [run(size, args.months, args.expire) for size in args.sizes]
+    write_report({"benchmark": "retention", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Tag query latency: comma-separated string column vs. text[] with GIN.
+
+Builds two synthetic tables of the requested size, one storing tags the way
+``quotes.tags`` used to (comma-separated ``String``) and one the way it does
+now (``text[]`` with a GIN index), and times "any of", "all of" and
+per-tag count queries against both.
+"""
+
+import argparse
+import random
+
+from sqlalchemy import create_engine, text
+
+from benchmarks._common import time_calls, write_report
+from db.config import db_url
+
+STRING_TABLE = "bench_tags_string"
+ARRAY_TABLE = "bench_tags_array"
+TAG_VOCABULARY = 2000
+TAGS_PER_QUOTE = 4
+
+
+def populate(conn, size: int):
+    """Create and fill both benchmark tables with ``size`` rows."""
+    conn.execute(text(f"DROP TABLE IF EXISTS {STRING_TABLE}, {ARRAY_TABLE}"))
+    conn.execute(text(
+        f"""
+        CREATE TABLE {ARRAY_TABLE} AS
+        SELECT g AS id,
+               ARRAY(
+                   SELECT 'tag' || ((g * 7919 + t * 104729) % :vocabulary)
+                   FROM generate_series(1, :per_quote) AS t
+               ) AS tags
+        FROM generate_series(1, :size) AS g
+        """
+    ), {"size": size, "vocabulary": TAG_VOCABULARY, "per_quote": TAGS_PER_QUOTE})
+    conn.execute(text(
+        f"""
+        CREATE TABLE {STRING_TABLE} AS
+        SELECT id, array_to_string(tags, ',') AS tags FROM {ARRAY_TABLE}
+        """
+    ))
+    conn.execute(text(f"CREATE INDEX ON {ARRAY_TABLE} USING gin (tags)"))
+    conn.execute(text(f"ANALYZE {ARRAY_TABLE}"))
+    conn.execute(text(f"ANALYZE {STRING_TABLE}"))
+
+
+def string_match(column: str, tag_param: str) -> str:
+    """SQL matching one tag inside a comma-separated string column."""
+    return f"(',' || {column} || ',') LIKE '%,' || :{tag_param} || ',%'"
+
+
+def run(size: int, repeat: int) -> dict:
+    """Benchmark tag queries against tables of ``size`` rows."""
+    engine = create_engine(db_url)
+    with engine.begin() as conn:
+        populate(conn, size)
+
+    def random_tags():
+        first, second = random.sample(range(TAG_VOCABULARY), 2)
+        return {"a": f"tag{first}", "b": f"tag{second}"}
+
+    queries = {
+        "any": (
+            f"SELECT id FROM {STRING_TABLE} "
+            f"WHERE {string_match('tags', 'a')} OR {string_match('tags', 'b')}",
+            f"SELECT id FROM {ARRAY_TABLE} WHERE tags && ARRAY[:a, :b]",
+        ),
+        "all": (
+            f"SELECT id FROM {STRING_TABLE} "
+            f"WHERE {string_match('tags', 'a')} AND {string_match('tags', 'b')}",
+            f"SELECT id FROM {ARRAY_TABLE} WHERE tags @> ARRAY[:a, :b]",
+        ),
+        "count": (
+            f"SELECT count(*) FROM {STRING_TABLE} WHERE {string_match('tags', 'a')}",
+            f"SELECT count(*) FROM {ARRAY_TABLE} WHERE tags @> ARRAY[:a]",
+        ),
+    }
+
+    result = {"rows": size}
+    with engine.connect() as conn:
+        for name, (string_sql, array_sql) in queries.items():
+            string_query, array_query = text(string_sql), text(array_sql)
+            result[name] = {
+                "string_column": time_calls(
+                    lambda: conn.execute(string_query, random_tags()).all(), repeat),
+                "array_gin": time_calls(
+                    lambda: conn.execute(array_query, random_tags()).all(), repeat),
+            }
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE {STRING_TABLE}, {ARRAY_TABLE}"))
+    engine.dispose()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20, help="queries per measurement")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    write_report(
+        {"benchmark": "tag_queries",
+         "results": [run(size, args.repeat) for size in args.sizes]},
+        args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
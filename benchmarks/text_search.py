@@ -0,0 +1,181 @@
+"""Quote search latency: ILIKE scans vs. the tsvector GIN index.
+
+Loads each of ``--sizes`` synthetic quotes of ``WORDS`` words, drawn from a
+vocabulary with a skewed frequency distribution, into partitions of the
+year 2000 of the ``quotes`` table. Then times, for rare, medium and common
+words and a combination of two:
+
+- ``ilike_ordered``: ``ILIKE`` on the text, most recently updated first,
+  the way quotes could be searched before; reads every row.
+- ``ilike_unordered``: the same without ordering, which stops after
+  ``--limit`` matches.
+- ``search``: the first page of ``QuotesRepository.search``, ranked.
+- ``search_next_page``: the second page of the same search, through its
+  cursor.
+
+Writes to the ``quotes`` table of a scratch database created next to the
+one configured by the ``DATABASE_*`` environment variables, migrated, and
+dropped afterwards; the partitions holding the synthetic quotes are dropped
+after each size.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from benchmarks._common import scratch_database, summarize, write_report
+from db.config import database_url
+from db.models import Quote
+from db.repositories import QuotePartitionsRepository, QuotesRepository
+
+VOCABULARY = 20000
+WORDS = 12
+AUTHORS = 5000
+START = datetime(2000, 1, 1)
+END = datetime(2001, 1, 1)
+
+# Word ``w<n>`` is drawn with a probability falling with n
+QUOTES = """
+    SELECT t, encode(sha256(convert_to(t, 'UTF8')), 'hex'), 'Author ' || (g % :authors),
+           ARRAY['tag'], created_at, created_at
+    FROM generate_series(1, :size) AS g,
+         LATERAL (
+             SELECT '“Synthetic ' || g || ' ' || string_agg(
+                 'w' || floor(:vocabulary * power(random(), 3))::int, ' ') || ' ”'
+             FROM generate_series(1, :words)
+             WHERE g IS NOT NULL
+         ) AS s(t),
+         LATERAL (SELECT CAST(:start AS timestamp)
+                         + (g - 1) * interval '1 year' / :size) AS c(created_at)
+"""
+
+# Ranges of word numbers to pick the searched words from
+FREQUENCIES = {
+    "rare": (10000, VOCABULARY),
+    "medium": (500, 2000),
+    "common": (0, 10),
+}
+
+
+def populate(size: int):
+    """Load ``size`` synthetic quotes into new partitions of the year 2000."""
+    engine = create_engine(database_url())
+    with Session(engine) as session:
+        partitions = QuotePartitionsRepository(session)
+        partitions.drop_before(END)
+        partitions.create(START, END.replace(year=START.year, month=12))
+        session.execute(
+            text(f"INSERT INTO quotes (text, text_hash, author, tags, created_at, updated_at) {QUOTES}"),
+            {"size": size, "authors": AUTHORS, "vocabulary": VOCABULARY,
+             "words": WORDS, "start": START},
+        )
+        session.commit()
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("VACUUM ANALYZE quotes"))
+    engine.dispose()
+
+
+def drop():
+    """Drop the partitions holding the synthetic quotes."""
+    engine = create_engine(database_url())
+    with Session(engine) as session:
+        QuotePartitionsRepository(session).drop_before(END)
+    engine.dispose()
+
+
+def random_words(kind: str) -> list[str]:
+    """Searched words of a kind of query."""
+    if kind == "two_words":
+        return random_words("medium") + random_words("common")
+    return [f"w{random.randrange(*FREQUENCIES[kind])}"]
+
+
+async def timed(call, repeat: int) -> dict:
+    """Time ``repeat`` awaits of ``call()``."""
+    samples, matches = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        matches += await call()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {**summarize(samples), "mean_results": matches / repeat}
+
+
+async def next_page_latency(
+    quotes_repo: QuotesRepository, kind: str, limit: int, repeat: int
+) -> dict | None:
+    """Time fetching the second page of searches with more than one page."""
+    samples = []
+    for _ in range(repeat):
+        query = " ".join(random_words(kind))
+        page = await quotes_repo.search(query, limit)
+        if page.cursor is None:
+            continue
+        start = time.perf_counter()
+        await quotes_repo.search(query, limit, page.cursor)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples) if samples else None
+
+
+async def run(size: int, repeat: int, limit: int) -> dict:
+    """Benchmark the searches against ``size`` synthetic quotes."""
+    populate(size)
+    engine = create_async_engine(database_url("asyncpg"))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+
+    result = {"rows": size}
+    try:
+        async with session_factory() as session:
+            quotes_repo = QuotesRepository(session)
+
+            def ilike(words: list[str], ordered: bool):
+                query = select(Quote).where(*(Quote.text.ilike(f"% {word} %") for word in words))
+                if ordered:
+                    query = query.order_by(Quote.updated_at.desc())
+                return query.limit(limit)
+
+            for kind in (*FREQUENCIES, "two_words"):
+                async def ilike_ordered():
+                    return len((await session.scalars(ilike(random_words(kind), True))).all())
+
+                async def ilike_unordered():
+                    return len((await session.scalars(ilike(random_words(kind), False))).all())
+
+                async def search():
+                    page = await quotes_repo.search(" ".join(random_words(kind)), limit)
+                    return len(page.quotes)
+
+                result[kind] = {
+                    "ilike_ordered": await timed(ilike_ordered, repeat),
+                    "ilike_unordered": await timed(ilike_unordered, repeat),
+                    "search": await timed(search, repeat),
+                    "search_next_page": await next_page_latency(quotes_repo, kind, limit, repeat),
+                }
+    finally:
+        await engine.dispose()
+        drop()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--repeat", type=int, default=20, help="queries per measurement")
+    parser.add_argument("--limit", type=int, default=20, help="quotes per page")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with scratch_database():
+        results = [asyncio.run(run(size, args.repeat, args.limit)) for size in args.sizes]
+    write_report({"benchmark": "text_search", "results": results}, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 """Airflow DAG for quotes scraping."""
 
+import json
 from datetime import datetime, timedelta
 from airflow import DAG
+from airflow.models import Variable
 from airflow.providers.docker.operators.docker import DockerOperator
 from airflow.providers.postgres.operators.postgres import PostgresOperator
 from airflow.operators.python import PythonOperator
 from airflow.operators.dummy import DummyOperator
+from docker.types import Mount
 
 # Default arguments
 default_args = {
@@ -43,19 +46,123 @@ db_check = PostgresOperator(
     dag=dag,
 )
 
-# Scraping task
-scrape_quotes = DockerOperator(
+# Partitions of the quotes table
+
+
+def maintain_quote_partitions():
+    """Create upcoming partitions of quotes and drop expired ones."""
+    from dags.utils.database_utils import cleanup_old_quotes, create_quote_partitions
+
+    created = create_quote_partitions()
+    print(f"Created partitions: {created or 'none'}")
+
+    # Quotes are kept forever unless the `quotes_retention_days` Variable is set
+    retention_days = Variable.get('quotes_retention_days', default_var=None)
+    if retention_days:
+        dropped = cleanup_old_quotes(int(retention_days))
+        print(f"Dropped partitions: {dropped or 'none'}")
+
+
+maintain_partitions = PythonOperator(
+    task_id='maintain_quote_partitions',
+    python_callable=maintain_quote_partitions,
+    dag=dag,
+)
+
+
+def sign_quotes():
+    """Sign the quotes stored since the last run, once for all shards."""
+    from dags.utils.database_utils import sign_new_quotes
+
+    signed = sign_new_quotes()
+    print(f"Signed {signed} quotes")
+    return signed
+
+
+sign_quotes_task = PythonOperator(
+    task_id='sign_quotes',
+    python_callable=sign_quotes,
+    dag=dag,
+)
+
+# Number of shards the crawl is split into when the `scrape_shards` Airflow
+# Variable is not set
+DEFAULT_SCRAPE_SHARDS = 4
+
+# Host directory mounted into the scraper containers for profiles, see the
+# `profile_scrape` and `profile_targets` Airflow Variables
+PROFILES_HOST_DIR = '/opt/airflow/scraper-profiles'
+
+# Days between full crawls when the `full_crawl_interval_days` Airflow
+# Variable is not set; other runs stop at the first pages of known quotes
+DEFAULT_FULL_CRAWL_INTERVAL_DAYS = 7
+
+
+def plan_scrape_shards(logical_date):
+    """Build the command of every shard of the crawl."""
+    from dags.utils.crawl_utils import is_full_crawl, shard_commands
+
+    shards = int(Variable.get('scrape_shards', default_var=DEFAULT_SCRAPE_SHARDS))
+    interval = int(Variable.get(
+        'full_crawl_interval_days', default_var=DEFAULT_FULL_CRAWL_INTERVAL_DAYS))
+    incremental = not is_full_crawl(logical_date, interval)
+    print(f"Planning {'an incremental' if incremental else 'a full'} crawl in {shards} shards")
+    return shard_commands(shards, incremental=incremental)
+
+
+plan_shards = PythonOperator(
+    task_id='plan_scrape_shards',
+    python_callable=plan_scrape_shards,
+    dag=dag,
+)
+
+# Scraping tasks, one mapped task per shard of the site
+scrape_quotes = DockerOperator.partial(
     task_id='scrape_quotes',
     image='web-scraper:latest',  # Your containerized scraper
-    command='python -m scrapy crawl quotes_spider',
     environment={
         'DATABASE_HOST': '{{ var.value.database_host }}',
         'DATABASE_PORT': '{{ var.value.database_port }}',
         'DATABASE_NAME': '{{ var.value.database_name }}',
         'DATABASE_USER': '{{ var.value.database_user }}',
         'DATABASE_PASSWORD': '{{ var.value.database_password }}',
+        # Retries of a shard resume from its last checkpoint
+        'CHECKPOINT_ID': '{{ run_id }}',
+        'PROFILING_ENABLED': '{{ var.value.get("profile_scrape", "False") }}',
+        'PROFILING_TARGETS': '{{ var.value.get("profile_targets", "") }}',
+        'PROFILING_DIR': '/app/profiles/{{ ds_nodash }}',
     },
+    mounts=[Mount(source=PROFILES_HOST_DIR, target='/app/profiles', type='bind')],
     network_mode='bridge',
+    # Each shard prints its stats as the last line of its output
+    do_xcom_push=True,
+    dag=dag,
+).expand(command=plan_shards.output)
+
+# Stats of the whole crawl
+
+
+def merge_shard_stats(ti):
+    """Merge the stats pushed by every scrape shard."""
+    from dags.utils.crawl_utils import merge_crawl_stats
+
+    shard_stats = [json.loads(output) for output in ti.xcom_pull(task_ids='scrape_quotes')]
+    stats = merge_crawl_stats(shard_stats)
+    print(
+        f"Crawl {stats['finish_reason']} in {stats['shards']} shards: "
+        f"{stats.get('item_scraped_count', 0)} items from "
+        f"{stats.get('response_received_count', 0)} responses")
+    for stage in ('download', 'parse', 'validation', 'db'):
+        if f'stages/{stage}/items' in stats:
+            print(
+                f"  {stage}: {stats[f'stages/{stage}/items_per_sec']:.1f} items/s, "
+                f"p95 at most {stats[f'stages/{stage}/p95_ms']:.1f} ms")
+    return stats
+
+
+merge_stats = PythonOperator(
+    task_id='merge_shard_stats',
+    python_callable=merge_shard_stats,
     dag=dag,
 )
 
@@ -64,10 +171,11 @@ scrape_quotes = DockerOperator(
 
 def validate_scraped_data():
     """Validate that quotes were scraped successfully."""
-    from dags.utils.database_utils import validate_quotes_data
+    from dags.utils.database_utils import get_pool_metrics, validate_quotes_data
 
     # Your validation logic here
     result = validate_quotes_data()
+    print(f"Database pool: {get_pool_metrics()}")
     if not result:
         raise ValueError("Data validation failed")
 
@@ -80,6 +188,27 @@ validation_task = PythonOperator(
     dag=dag,
 )
 
+# Clusters of near-duplicate quotes
+
+
+def cluster_near_duplicates():
+    """Sign the new quotes and cluster the near duplicates among all quotes."""
+    from dags.utils.database_utils import cluster_near_duplicate_quotes
+
+    threshold = float(Variable.get('near_duplicates_threshold', default_var=0.7))
+    summary = cluster_near_duplicate_quotes(threshold)
+    print(
+        f"Signed {summary['signed']} quotes; {summary['clustered']} of "
+        f"{summary['quotes']} quotes are in {summary['clusters']} clusters of near duplicates")
+    return summary
+
+
+near_duplicates_task = PythonOperator(
+    task_id='cluster_near_duplicates',
+    python_callable=cluster_near_duplicates,
+    dag=dag,
+)
+
 # End task
 end = DummyOperator(
     task_id='end',
@@ -87,4 +216,4 @@ end = DummyOperator(
 )
 
 # Define task dependencies
-start >> db_check >> scrape_quotes >> validation_task >> end
+start >> db_check >> maintain_partitions >> sign_quotes_task >> plan_shards >> scrape_quotes >> merge_stats >> validation_task >> near_duplicates_task >> end
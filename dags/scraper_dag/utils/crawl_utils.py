@@ -0,0 +1,110 @@
+"""Crawl sharding utility functions for Airflow DAGs."""
+
+import shlex
+
+# Where each shard's container writes its final stats, see the scraper's
+# StatsExport extension
+STATS_EXPORT_PATH = '/tmp/crawl_stats.json'
+
+# Stats that describe a single process rather than count work: the merged
+# value is the largest one of any shard.
+MAX_STATS = (
+    'elapsed_time_seconds',
+    'memusage/',
+    'prefetch/last_page',
+    'bench/peak_rss_bytes',
+    'db/pool/max_',
+)
+
+# Per-stage latency percentiles, see the scraper's StageMetricsExport: the
+# merged value is the largest one of any shard, an upper bound of the crawl's
+# percentile.
+MAX_STATS_SUFFIXES = ('_ms',)
+
+
+def shard_commands(shards, spider='quotes', incremental=False):
+    """Build the container command of every shard of a crawl.
+
+    Each command crawls one partition of the site, passed to the spider as
+    the ``shard`` and ``shards`` spider arguments, then prints the crawl
+    stats as the last line of its output for the task to push to XCom.
+    Quotes are signed for the near-duplicate check once by the DAG's
+    ``sign_quotes`` task, not by every shard.
+
+    Args:
+        shards (int): Number of shards the crawl is split into
+        spider (str): Name of the spider to run
+        incremental (bool): Stop walking the pages once they only hold
+            known quotes, instead of crawling the whole site
+
+    Returns:
+        list: One command per shard
+    """
+    if shards < 1:
+        raise ValueError(f"shards must be at least 1, got {shards}")
+
+    commands = []
+    for shard in range(shards):
+        crawl = (
+            f"python -m scrapy crawl {spider} -a shard={shard} -a shards={shards} "
+            f"-s STATS_EXPORT_PATH={STATS_EXPORT_PATH} "
+            f"-s INCREMENTAL_CRAWL_ENABLED={incremental} "
+            f"-s QUOTES_NEAR_DUPLICATES_SIGN=False"
+        )
+        script = f"{crawl} && cat {STATS_EXPORT_PATH}"
+        commands.append(f"bash -c {shlex.quote(script)}")
+    return commands
+
+
+def is_full_crawl(logical_date, interval_days):
+    """Check whether the run of a day crawls the whole site.
+
+    Args:
+        logical_date (datetime): Logical date of the DAG run
+        interval_days (int): Days between full crawls; 1 crawls the whole
+            site every day
+
+    Returns:
+        bool: True once every ``interval_days`` days, False otherwise
+    """
+    return logical_date.toordinal() % interval_days == 0
+
+
+def merge_crawl_stats(shard_stats):
+    """Merge the final stats of the shards of a crawl.
+
+    Counters are summed and per-process values (see ``MAX_STATS`` and
+    ``MAX_STATS_SUFFIXES``) take their maximum. The crawl starts with its first shard and finishes with
+    its last; its ``finish_reason`` is ``finished`` only if every shard
+    finished.
+
+    Args:
+        shard_stats (list): Stats of every shard, as exported by the scraper
+
+    Returns:
+        dict: Stats of the whole crawl, with the number of shards merged in
+        ``shards`` and the count of each shard finish reason in
+        ``finish_reasons``
+    """
+    merged = {}
+    reasons = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            if key == 'finish_reason':
+                reasons[value] = reasons.get(value, 0) + 1
+            elif key == 'start_time':
+                merged[key] = min(merged.get(key, value), value)
+            elif key == 'finish_time':
+                merged[key] = max(merged.get(key, value), value)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                merged.setdefault(key, value)
+            elif key.startswith(MAX_STATS) or key.endswith(MAX_STATS_SUFFIXES):
+                merged[key] = max(merged.get(key, value), value)
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+    unfinished = sorted(reason for reason in reasons if reason != 'finished')
+    merged['finish_reason'] = unfinished[0] if unfinished else 'finished'
+    merged['finish_reasons'] = reasons
+    merged['shards'] = len(shard_stats)
+    return merged
@@ -1,36 +1,46 @@
-"""Database utility functions for Airflow DAGs."""
+"""Database utility functions for Airflow DAGs.
 
-from airflow.providers.postgres.hooks.postgres import PostgresHook
-from airflow.models import Variable
+Queries go through the connection pool shared with the scraper, see
+``db.database``, configured with the ``DATABASE_*`` environment variables.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from db.database import sessionmanager
+from db.near_duplicates import cluster_quotes, sign_quotes
+from db.repositories import QuotePartitionsRepository
 
 
 def validate_quotes_data():
     """Validate that quotes were scraped successfully.
 
+    Reads the daily quote statistics, see ``db.repositories.quote_stats``,
+    rather than scanning ``quotes``.
+
     Returns:
         bool: True if validation passes, False otherwise
     """
     try:
-        # Get database connection
-        postgres_hook = PostgresHook(postgres_conn_id='postgres_default')
-
-        # Check if quotes were added recently (last 24 hours)
+        # Check if this run added quotes. The DAG runs after midnight, so
+        # they are counted today; yesterday holds the previous run's.
         query = """
-        SELECT COUNT(*) 
-        FROM quotes 
-        WHERE created_at >= NOW() - INTERVAL '24 hours'
+        SELECT COALESCE(SUM(inserted), 0)::bigint
+        FROM quote_daily_stats
+        WHERE day = CURRENT_DATE
         """
 
-        result = postgres_hook.get_first(query)
-        quote_count = result[0] if result else 0
+        with sessionmanager.sync_session() as session:
+            quote_count = session.scalar(text(query)) or 0
 
         # Validate that we have quotes
         if quote_count > 0:
             print(
-                f"Validation passed: {quote_count} quotes found in last 24 hours")
+                f"Validation passed: {quote_count} quotes added today")
             return True
         else:
-            print("Validation failed: No quotes found in last 24 hours")
+            print("Validation failed: No quotes added today")
             return False
 
     except Exception as e:
@@ -41,39 +51,44 @@ def validate_quotes_data():
 def get_quote_statistics():
     """Get statistics about scraped quotes.
 
+    Reads the statistics tables kept up to date by the writes to
+    ``quotes``, summing the slots their rows are spread over; run
+    ``python -m db.stats check`` to compare them with the table itself.
+    ``recent_updates`` counts the quotes last updated in the last 7 days,
+    not the updates made in them.
+
     Returns:
         dict: Statistics about quotes
     """
     try:
-        postgres_hook = PostgresHook(postgres_conn_id='postgres_default')
-
-        # Get total quotes count
-        total_query = "SELECT COUNT(*) FROM quotes"
-        total_result = postgres_hook.get_first(total_query)
-        total_quotes = total_result[0] if total_result else 0
-
-        # Get quotes by author
-        author_query = """
-        SELECT author, COUNT(*) as count 
-        FROM quotes 
-        GROUP BY author 
-        ORDER BY count DESC 
-        LIMIT 10
-        """
-        author_results = postgres_hook.get_records(author_query)
-
-        # Get recent quotes
-        recent_query = """
-        SELECT COUNT(*) 
-        FROM quotes 
-        WHERE created_at >= NOW() - INTERVAL '7 days'
-        """
-        recent_result = postgres_hook.get_first(recent_query)
-        recent_quotes = recent_result[0] if recent_result else 0
+        with sessionmanager.sync_session() as session:
+            # Get total quotes count
+            total_query = "SELECT COALESCE(SUM(quotes), 0)::bigint FROM quote_stats_totals"
+            total_quotes = session.scalar(text(total_query)) or 0
+
+            # Get quotes by author
+            author_query = """
+            SELECT author, SUM(quotes)::bigint AS quotes
+            FROM quote_author_stats
+            GROUP BY author
+            HAVING SUM(quotes) <> 0
+            ORDER BY quotes DESC, author
+            LIMIT 10
+            """
+            author_results = session.execute(text(author_query)).all()
+
+            # Get quotes added and last updated in the last 7 days
+            recent_query = """
+            SELECT COALESCE(SUM(inserted), 0)::bigint, COALESCE(SUM(updated), 0)::bigint
+            FROM quote_daily_stats
+            WHERE day > CURRENT_DATE - 7
+            """
+            recent_quotes, recent_updates = session.execute(text(recent_query)).one()
 
         return {
             'total_quotes': total_quotes,
             'recent_quotes': recent_quotes,
+            'recent_updates': recent_updates,
             'top_authors': dict(author_results) if author_results else {}
         }
 
@@ -82,26 +97,78 @@ def get_quote_statistics():
         return {}
 
 
+def create_quote_partitions(months_ahead=3):
+    """Create the partitions of quotes for this month and the next months.
+
+    Quotes can only be created in months that have a partition, so errors
+    are raised rather than reported.
+
+    Args:
+        months_ahead (int): Number of months ahead of the current one
+
+    Returns:
+        list: Names of the created partitions
+    """
+    with sessionmanager.sync_session() as session:
+        created = QuotePartitionsRepository(session).create_upcoming(months_ahead)
+    return [partition.name for partition in created]
+
+
 def cleanup_old_quotes(days_to_keep=30):
     """Clean up old quotes from the database.
 
+    Drops the monthly partitions of quotes whose quotes are all older than
+    ``days_to_keep`` days, rather than deleting rows. Quotes in the oldest
+    month that is kept may be older.
+
     Args:
         days_to_keep (int): Number of days to keep quotes
 
     Returns:
-        int: Number of quotes deleted
+        list: Names of the dropped partitions
     """
     try:
-        postgres_hook = PostgresHook(postgres_conn_id='postgres_default')
-
-        delete_query = """
-        DELETE FROM quotes 
-        WHERE created_at < NOW() - INTERVAL '%s days'
-        """ % days_to_keep
-
-        result = postgres_hook.run(delete_query)
-        return result.rowcount if hasattr(result, 'rowcount') else 0
+        cutoff = datetime.now() - timedelta(days=days_to_keep)
+        with sessionmanager.sync_session() as session:
+            dropped = QuotePartitionsRepository(session).drop_before(cutoff)
+        return [partition.name for partition in dropped]
 
     except Exception as e:
         print(f"Error cleaning up quotes: {e}")
-        return 0
+        return []
+
+
+def sign_new_quotes():
+    """Compute the MinHash signatures of the quotes that have none.
+
+    Returns:
+        int: Number of signed quotes
+    """
+    with sessionmanager.sync_session() as session:
+        return sign_quotes(session)
+
+
+def cluster_near_duplicate_quotes(threshold=0.7):
+    """Group the stored quotes into clusters of near duplicates.
+
+    Signs the quotes without a MinHash signature and stores the clusters in
+    ``quote_signatures.cluster_id``, see ``db.near_duplicates``.
+
+    Args:
+        threshold (float): Minimum estimated similarity of near duplicates
+
+    Returns:
+        dict: Numbers of signed quotes, clustered quotes and clusters, see
+        ``cluster_quotes``
+    """
+    with sessionmanager.sync_session() as session:
+        return cluster_quotes(session, threshold)
+
+
+def get_pool_metrics():
+    """Get the checkout counters and usage of the shared connection pools.
+
+    Returns:
+        dict: Counters by engine, see ``DatabaseSessionManager.pool_metrics``
+    """
+    return sessionmanager.pool_metrics()
@@ -1,6 +1,43 @@
 """Database package for web scraper."""
 
-from db.models import Quote
-from db.repositories import QuotesRepository
+from db.models import (
+    CrawlCheckpoint,
+    CrawledPage,
+    FrontierRequest,
+    Quote,
+    QuoteAuthorStats,
+    QuoteDailyStats,
+    QuoteKey,
+    QuoteSignature,
+    QuoteStaging,
+    QuoteStatsTotals,
+)
+from db.repositories import (
+    CheckpointsRepository,
+    CrawledPagesRepository,
+    FrontierRepository,
+    QuotePartitionsRepository,
+    QuoteSignaturesRepository,
+    QuoteStatsRepository,
+    QuotesRepository,
+)
 
-__all__ = ["Quote", "QuotesRepository"]
+__all__ = [
+    "CheckpointsRepository",
+    "CrawlCheckpoint",
+    "CrawledPage",
+    "CrawledPagesRepository",
+    "FrontierRepository",
+    "FrontierRequest",
+    "Quote",
+    "QuoteAuthorStats",
+    "QuoteDailyStats",
+    "QuoteKey",
+    "QuotePartitionsRepository",
+    "QuoteSignature",
+    "QuoteSignaturesRepository",
+    "QuoteStaging",
+    "QuoteStatsRepository",
+    "QuoteStatsTotals",
+    "QuotesRepository",
+]
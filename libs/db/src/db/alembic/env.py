@@ -5,7 +5,7 @@ from logging.config import fileConfig
 from alembic import context
 from asyncpg import Connection
 from db.models.orm import BaseEntity
-from db.config import db_url
+from db.config import database_url, db_url
 from sqlalchemy import pool
 from sqlalchemy.ext.asyncio import async_engine_from_config
 
@@ -55,7 +55,7 @@ async def run_migrations_online():
     and associate a connection with the context.
     """
     configuration = config.get_section(config.config_ini_section)
-    configuration["sqlalchemy.url"] = db_url
+    configuration["sqlalchemy.url"] = database_url("asyncpg")
     connectable = async_engine_from_config(
         configuration,
         prefix="sqlalchemy.",
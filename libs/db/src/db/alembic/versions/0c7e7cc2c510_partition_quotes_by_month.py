@@ -0,0 +1,195 @@
+"""partition quotes by month
+
+Revision ID: 0c7e7cc2c510
+Revises: ed4d73b317a5
+Create Date: 2025-10-25 08:52:03.917264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c7e7cc2c510'
+down_revision: Union[str, Sequence[str], None] = 'ed4d73b317a5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Months of partitions created ahead of the current one
+MONTHS_AHEAD = 3
+
+STATS_TRIGGERS = {
+    'quote_stats_insert': 'AFTER INSERT ON quotes REFERENCING NEW TABLE AS new_rows',
+    'quote_stats_update': (
+        'AFTER UPDATE ON quotes REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows'),
+    'quote_stats_delete': 'AFTER DELETE ON quotes REFERENCING OLD TABLE AS old_rows',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Writers wait until the quotes are copied into the partitioned table.
+    op.execute('LOCK TABLE quotes IN SHARE MODE')
+    op.execute('ALTER TABLE quotes RENAME TO quotes_unpartitioned')
+    op.execute(
+        'ALTER TABLE quotes_unpartitioned RENAME CONSTRAINT quotes_pkey TO quotes_unpartitioned_pkey')
+    op.drop_index('uq_quotes_author_text_hash', table_name='quotes_unpartitioned')
+    op.drop_index('ix_quotes_tags', table_name='quotes_unpartitioned')
+
+    op.create_table(
+        'quotes',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False,
+                  server_default=sa.func.gen_random_uuid()),
+        sa.Column('text', sa.String, nullable=False),
+        sa.Column('text_hash', sa.String(64), nullable=False),
+        sa.Column('author', sa.String, nullable=False),
+        sa.Column('tags', postgresql.ARRAY(sa.Text), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint('id', 'created_at', name='quotes_pkey'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    # One partition per month, from the oldest quote to MONTHS_AHEAD months
+    # from now
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            month timestamp;
+        BEGIN
+            FOR month IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(
+                        (SELECT min(created_at) FROM quotes_unpartitioned), now())),
+                    date_trunc('month', now()) + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF quotes FOR VALUES FROM (%L) TO (%L)',
+                    'quotes_p' || to_char(month, 'YYYYMM'), month, month + interval '1 month'
+                );
+            END LOOP;
+        END
+        $$
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO quotes (id, text, text_hash, author, tags, created_at, updated_at)
+        SELECT id, text, text_hash, author, tags, created_at, updated_at
+        FROM quotes_unpartitioned
+        """
+    )
+    op.drop_table('quotes_unpartitioned')
+
+    op.create_index('ix_quotes_author_text_hash', 'quotes', ['author', 'text_hash'])
+    op.create_index('ix_quotes_tags', 'quotes', ['tags'], postgresql_using='gin')
+
+    # Unique indexes of a partitioned table must include the partition key,
+    # so a trigger checks that inserted quotes are unique by (author,
+    # text_hash) across partitions. Concurrent inserts of the same quote must
+    # not both pass: the advisory lock, held until commit, serializes the
+    # checks, and each check sees the quotes committed before it. The
+    # triggers are named to fire after the statistics triggers, so writers
+    # lock the statistics totals before it, in the same order everywhere.
+    op.execute(
+        """
+        CREATE FUNCTION quote_check_unique() RETURNS trigger
+        LANGUAGE plpgsql AS $function$
+        BEGIN
+            -- Updates only need checking if they change a key; tag updates
+            -- leave the set difference empty
+            IF TG_OP = 'UPDATE' THEN
+                IF NOT EXISTS (
+                    SELECT id, author, text_hash FROM new_rows
+                    EXCEPT
+                    SELECT id, author, text_hash FROM old_rows
+                ) THEN
+                    RETURN NULL;
+                END IF;
+            END IF;
+
+            PERFORM pg_advisory_xact_lock(TG_RELID::bigint);
+            IF EXISTS (
+                SELECT FROM new_rows n
+                JOIN quotes q
+                    ON q.author = n.author AND q.text_hash = n.text_hash AND q.id <> n.id
+            ) THEN
+                RAISE EXCEPTION 'duplicate key value violates uniqueness of quotes (author, text_hash)'
+                    USING ERRCODE = 'unique_violation';
+            END IF;
+            RETURN NULL;
+        END
+        $function$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_insert AFTER INSERT ON quotes
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_check_unique()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_update AFTER UPDATE ON quotes
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_check_unique()
+        """
+    )
+
+    # The statistics triggers were dropped with the old table; the
+    # statistics themselves still hold, the rows are the same.
+    _create_stats_triggers()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('LOCK TABLE quotes IN SHARE MODE')
+    op.execute('ALTER TABLE quotes RENAME TO quotes_partitioned')
+    op.execute(
+        'ALTER TABLE quotes_partitioned RENAME CONSTRAINT quotes_pkey TO quotes_partitioned_pkey')
+    op.drop_index('ix_quotes_author_text_hash', table_name='quotes_partitioned')
+    op.drop_index('ix_quotes_tags', table_name='quotes_partitioned')
+
+    op.create_table(
+        'quotes',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True,
+                  server_default=sa.func.gen_random_uuid()),
+        sa.Column('text', sa.String, nullable=False),
+        sa.Column('text_hash', sa.String(64), nullable=False),
+        sa.Column('author', sa.String, nullable=False),
+        sa.Column('tags', postgresql.ARRAY(sa.Text), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+    )
+    op.execute(
+        """
+        INSERT INTO quotes (id, text, text_hash, author, tags, created_at, updated_at)
+        SELECT id, text, text_hash, author, tags, created_at, updated_at
+        FROM quotes_partitioned
+        """
+    )
+    # Drops the partitions and the triggers with it
+    op.drop_table('quotes_partitioned')
+    op.execute('DROP FUNCTION quote_check_unique()')
+
+    op.create_index(
+        'uq_quotes_author_text_hash', 'quotes', ['author', 'text_hash'], unique=True)
+    op.create_index('ix_quotes_tags', 'quotes', ['tags'], postgresql_using='gin')
+    _create_stats_triggers()
+
+
+def _create_stats_triggers() -> None:
+    """Create the statistics triggers of ed4d73b317a5 on the new quotes table."""
+    for name, timing in STATS_TRIGGERS.items():
+        op.execute(
+            f'CREATE TRIGGER {name} {timing} '
+            f'FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_apply()')
+    op.execute(
+        'CREATE TRIGGER quote_stats_truncate AFTER TRUNCATE ON quotes '
+        'FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_reset()')
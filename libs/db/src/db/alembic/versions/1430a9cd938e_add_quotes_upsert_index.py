@@ -0,0 +1,47 @@
+"""add quotes upsert index
+
+Revision ID: 1430a9cd938e
+Revises: 05864827ef32
+Create Date: 2025-09-20 10:12:41.227301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1430a9cd938e'
+down_revision: Union[str, Sequence[str], None] = '05864827ef32'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Collapse pre-existing duplicates so the unique index can be built,
+    # keeping the most recently updated row for each (author, text).
+    op.execute(
+        """
+        DELETE FROM quotes a
+        USING quotes b
+        WHERE a.author = b.author
+          AND a.text = b.text
+          AND (a.updated_at, a.id) < (b.updated_at, b.id)
+        """
+    )
+    # Index md5(text) rather than text itself: quote text is unbounded and
+    # may exceed the btree row size limit. Used as the ON CONFLICT arbiter
+    # for bulk upserts.
+    op.create_index(
+        'uq_quotes_author_text_md5',
+        'quotes',
+        ['author', sa.text('md5(text)')],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_quotes_author_text_md5', table_name='quotes')
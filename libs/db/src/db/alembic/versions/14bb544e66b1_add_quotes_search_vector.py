@@ -0,0 +1,47 @@
+"""add quotes search vector
+
+Revision ID: 14bb544e66b1
+Revises: 0c7e7cc2c510
+Create Date: 2025-11-01 10:14:37.502816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '14bb544e66b1'
+down_revision: Union[str, Sequence[str], None] = '0c7e7cc2c510'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Stored, so the rewrite computes the vector of every existing quote.
+    # Text matches rank above author matches.
+    op.add_column(
+        'quotes',
+        sa.Column(
+            'search_vector',
+            postgresql.TSVECTOR(),
+            sa.Computed(
+                "setweight(to_tsvector('english', text), 'A') || "
+                "setweight(to_tsvector('english', author), 'B')",
+                persisted=True,
+            ),
+        ),
+    )
+    # Created on every partition, and on the ones created later
+    op.create_index(
+        'ix_quotes_search_vector', 'quotes', ['search_vector'], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_quotes_search_vector', table_name='quotes')
+    op.drop_column('quotes', 'search_vector')
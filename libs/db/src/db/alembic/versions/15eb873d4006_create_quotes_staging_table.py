@@ -0,0 +1,40 @@
+"""create quotes staging table
+
+Revision ID: 15eb873d4006
+Revises: 8fce2764d940
+Create Date: 2025-10-11 10:37:52.618204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '15eb873d4006'
+down_revision: Union[str, Sequence[str], None] = '8fce2764d940'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Unlogged: staged rows are merged into quotes in the transaction that
+    # loads them, so they never need to survive a crash.
+    op.create_table(
+        'quotes_staging',
+        sa.Column('batch_id', sa.BigInteger, primary_key=True),
+        sa.Column('position', sa.Integer, primary_key=True),
+        sa.Column('text', sa.String, nullable=False),
+        sa.Column('text_hash', sa.String(64), nullable=False),
+        sa.Column('author', sa.String, nullable=False),
+        sa.Column('tags', postgresql.ARRAY(sa.Text), nullable=False),
+        prefixes=['UNLOGGED'],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('quotes_staging')
@@ -0,0 +1,38 @@
+"""create quote signatures table
+
+Revision ID: 1bc059a2bbcb
+Revises: 14bb544e66b1
+Create Date: 2025-11-04 16:22:51.318094
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1bc059a2bbcb'
+down_revision: Union[str, Sequence[str], None] = '14bb544e66b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # No foreign key: the primary key of the partitioned quotes table
+    # includes created_at. Signatures of dropped quotes are pruned instead.
+    op.create_table(
+        'quote_signatures',
+        sa.Column('quote_id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('signature', sa.LargeBinary, nullable=False),
+        sa.Column('cluster_id', postgresql.UUID(as_uuid=True), nullable=True),
+    )
+    op.create_index('ix_quote_signatures_cluster_id', 'quote_signatures', ['cluster_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_quote_signatures_cluster_id', table_name='quote_signatures')
+    op.drop_table('quote_signatures')
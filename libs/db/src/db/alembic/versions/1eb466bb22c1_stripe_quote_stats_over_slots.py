@@ -0,0 +1,233 @@
+"""stripe quote stats over slots
+
+Revision ID: 1eb466bb22c1
+Revises: 1bc059a2bbcb
+Create Date: 2025-11-08 10:41:17.205836
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1eb466bb22c1'
+down_revision: Union[str, Sequence[str], None] = '1bc059a2bbcb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows each statistic is spread over
+SLOTS = 16
+
+# Every connection writes the rows of its own slot, so concurrent writers
+# to quotes only wait for each other when their slots collide. The totals
+# row of the slot is still locked first, which keeps writers sharing a slot
+# from deadlocking on the other statistics.
+STRIPED_APPLY = """
+    CREATE OR REPLACE FUNCTION quote_stats_apply() RETURNS trigger
+    LANGUAGE plpgsql AS $function$
+    DECLARE
+        changes text;
+        slot smallint := quote_stats_slot();
+    BEGIN
+        changes := CASE TG_OP
+            WHEN 'INSERT' THEN
+                'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows'
+            WHEN 'DELETE' THEN
+                'SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+            ELSE
+                'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows
+                 UNION ALL
+                 SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+        END;
+
+        EXECUTE format($sql$
+            INSERT INTO quote_stats_totals AS s (slot, quotes)
+            SELECT %2$s, coalesce(sum(sign), 0) FROM (%1$s) c
+            ON CONFLICT (slot) DO UPDATE
+            SET quotes = s.quotes + excluded.quotes, updated_at = now()
+        $sql$, changes, slot);
+
+        EXECUTE format($sql$
+            INSERT INTO quote_author_stats AS s (author, slot, quotes)
+            SELECT author, %2$s, sum(sign) FROM (%1$s) c
+            GROUP BY author
+            HAVING sum(sign) <> 0
+            ON CONFLICT (author, slot) DO UPDATE SET quotes = s.quotes + excluded.quotes
+        $sql$, changes, slot);
+        EXECUTE format($sql$
+            DELETE FROM quote_author_stats s
+            USING (%1$s) c
+            WHERE s.author = c.author AND s.slot = %2$s AND c.sign < 0 AND s.quotes = 0
+        $sql$, changes, slot);
+
+        EXECUTE format($sql$
+            INSERT INTO quote_daily_stats AS s (day, slot, inserted, updated)
+            SELECT day, %2$s, sum(inserted), sum(updated) FROM (
+                SELECT created_at::date AS day, sign AS inserted, 0 AS updated
+                FROM (%1$s) c
+                UNION ALL
+                SELECT updated_at::date, 0, sign
+                FROM (%1$s) c
+                WHERE updated_at > created_at
+            ) d
+            GROUP BY day
+            HAVING sum(inserted) <> 0 OR sum(updated) <> 0
+            ON CONFLICT (day, slot) DO UPDATE
+            SET inserted = s.inserted + excluded.inserted,
+                updated = s.updated + excluded.updated
+        $sql$, changes, slot);
+        EXECUTE format($sql$
+            DELETE FROM quote_daily_stats s
+            USING (%1$s) c
+            WHERE s.day IN (c.created_at::date, c.updated_at::date) AND s.slot = %2$s
+              AND c.sign < 0 AND s.inserted = 0 AND s.updated = 0
+        $sql$, changes, slot);
+
+        RETURN NULL;
+    END
+    $function$
+"""
+
+PREVIOUS_APPLY = """
+    CREATE OR REPLACE FUNCTION quote_stats_apply() RETURNS trigger
+    LANGUAGE plpgsql AS $function$
+    DECLARE
+        changes text;
+    BEGIN
+        changes := CASE TG_OP
+            WHEN 'INSERT' THEN
+                'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows'
+            WHEN 'DELETE' THEN
+                'SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+            ELSE
+                'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows
+                 UNION ALL
+                 SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+        END;
+
+        EXECUTE format($sql$
+            UPDATE quote_stats_totals
+            SET quotes = quotes + (SELECT coalesce(sum(sign), 0) FROM (%s) c),
+                updated_at = now()
+        $sql$, changes);
+
+        EXECUTE format($sql$
+            INSERT INTO quote_author_stats AS s (author, quotes)
+            SELECT author, sum(sign) FROM (%s) c
+            GROUP BY author
+            HAVING sum(sign) <> 0
+            ON CONFLICT (author) DO UPDATE SET quotes = s.quotes + excluded.quotes
+        $sql$, changes);
+        EXECUTE format($sql$
+            DELETE FROM quote_author_stats s
+            USING (%s) c
+            WHERE s.author = c.author AND c.sign < 0 AND s.quotes = 0
+        $sql$, changes);
+
+        EXECUTE format($sql$
+            INSERT INTO quote_daily_stats AS s (day, inserted, updated)
+            SELECT day, sum(inserted), sum(updated) FROM (
+                SELECT created_at::date AS day, sign AS inserted, 0 AS updated
+                FROM (%1$s) c
+                UNION ALL
+                SELECT updated_at::date, 0, sign
+                FROM (%1$s) c
+                WHERE updated_at > created_at
+            ) d
+            GROUP BY day
+            HAVING sum(inserted) <> 0 OR sum(updated) <> 0
+            ON CONFLICT (day) DO UPDATE
+            SET inserted = s.inserted + excluded.inserted,
+                updated = s.updated + excluded.updated
+        $sql$, changes);
+        EXECUTE format($sql$
+            DELETE FROM quote_daily_stats s
+            USING (%1$s) c
+            WHERE s.day IN (c.created_at::date, c.updated_at::date)
+              AND c.sign < 0 AND s.inserted = 0 AND s.updated = 0
+        $sql$, changes);
+
+        RETURN NULL;
+    END
+    $function$
+"""
+
+STATS_KEYS = {
+    'quote_stats_totals': [],
+    'quote_author_stats': ['author'],
+    'quote_daily_stats': ['day'],
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        f"""
+        CREATE FUNCTION quote_stats_slot() RETURNS smallint
+        LANGUAGE sql STABLE AS $$ SELECT (pg_backend_pid() % {SLOTS})::smallint $$
+        """
+    )
+
+    # Existing rows become the rows of slot 0
+    op.drop_constraint('ck_quote_stats_totals_single_row', 'quote_stats_totals', type_='check')
+    op.drop_constraint('quote_stats_totals_pkey', 'quote_stats_totals', type_='primary')
+    op.drop_column('quote_stats_totals', 'id')
+    op.drop_index('ix_quote_author_stats_quotes', table_name='quote_author_stats')
+    for table, keys in STATS_KEYS.items():
+        if keys:
+            op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.add_column(table, sa.Column('slot', sa.SmallInteger, nullable=False, server_default='0'))
+        op.alter_column(table, 'slot', server_default=None)
+        op.create_primary_key(f'{table}_pkey', table, [*keys, 'slot'])
+
+    op.execute(STRIPED_APPLY)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute(PREVIOUS_APPLY)
+
+    # Writers wait until the slots are summed up
+    op.execute('LOCK TABLE quotes IN SHARE MODE')
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE author_totals ON COMMIT DROP AS
+        SELECT author, sum(quotes) AS quotes FROM quote_author_stats
+        GROUP BY author HAVING sum(quotes) <> 0
+        """
+    )
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE daily_totals ON COMMIT DROP AS
+        SELECT day, sum(inserted) AS inserted, sum(updated) AS updated FROM quote_daily_stats
+        GROUP BY day HAVING sum(inserted) <> 0 OR sum(updated) <> 0
+        """
+    )
+    op.execute(
+        """
+        CREATE TEMPORARY TABLE totals ON COMMIT DROP AS
+        SELECT coalesce(sum(quotes), 0) AS quotes FROM quote_stats_totals
+        """
+    )
+    for table in STATS_KEYS:
+        op.execute(f'DELETE FROM {table}')
+
+    for table, keys in STATS_KEYS.items():
+        op.drop_constraint(f'{table}_pkey', table, type_='primary')
+        op.drop_column(table, 'slot')
+        if keys:
+            op.create_primary_key(f'{table}_pkey', table, keys)
+    op.add_column('quote_stats_totals', sa.Column('id', sa.Boolean, nullable=False, server_default='true'))
+    op.create_primary_key('quote_stats_totals_pkey', 'quote_stats_totals', ['id'])
+    op.create_check_constraint('ck_quote_stats_totals_single_row', 'quote_stats_totals', 'id')
+    op.create_index('ix_quote_author_stats_quotes', 'quote_author_stats', ['quotes'])
+
+    op.execute('INSERT INTO quote_author_stats (author, quotes) SELECT author, quotes FROM author_totals')
+    op.execute(
+        'INSERT INTO quote_daily_stats (day, inserted, updated) '
+        'SELECT day, inserted, updated FROM daily_totals')
+    op.execute('INSERT INTO quote_stats_totals (quotes) SELECT quotes FROM totals')
+
+    op.execute('DROP FUNCTION quote_stats_slot()')
@@ -0,0 +1,40 @@
+"""create crawled pages table
+
+Revision ID: 36d4ab0e1adc
+Revises: d6959f561cc4
+Create Date: 2025-10-03 14:27:19.004556
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '36d4ab0e1adc'
+down_revision: Union[str, Sequence[str], None] = 'd6959f561cc4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'crawled_pages',
+        sa.Column('url', sa.Text, primary_key=True),
+        sa.Column('etag', sa.Text, nullable=True),
+        sa.Column('last_modified', sa.Text, nullable=True),
+        sa.Column('content_length', sa.Integer, nullable=True),
+        sa.Column('links', postgresql.ARRAY(sa.Text), nullable=True),
+        sa.Column(
+            'updated_at', sa.TIMESTAMP(), nullable=False,
+            server_default=sa.func.now(), onupdate=sa.func.now()
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('crawled_pages')
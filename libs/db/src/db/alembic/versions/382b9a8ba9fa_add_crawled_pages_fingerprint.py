@@ -0,0 +1,28 @@
+"""add crawled pages fingerprint
+
+Revision ID: 382b9a8ba9fa
+Revises: 36d4ab0e1adc
+Create Date: 2025-10-06 11:52:30.871245
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '382b9a8ba9fa'
+down_revision: Union[str, Sequence[str], None] = '36d4ab0e1adc'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('crawled_pages', sa.Column('fingerprint', sa.Text, nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('crawled_pages', 'fingerprint')
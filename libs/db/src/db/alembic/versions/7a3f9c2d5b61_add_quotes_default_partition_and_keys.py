@@ -0,0 +1,204 @@
+"""add quotes default partition and keys
+
+Revision ID: 7a3f9c2d5b61
+Revises: 1eb466bb22c1
+Create Date: 2025-11-15 09:12:44.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a3f9c2d5b61'
+down_revision: Union[str, Sequence[str], None] = '1eb466bb22c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The uniqueness check of 0c7e7cc2c510, restored on downgrade
+PREVIOUS_CHECK = """
+    CREATE FUNCTION quote_check_unique() RETURNS trigger
+    LANGUAGE plpgsql AS $function$
+    BEGIN
+        -- Updates only need checking if they change a key; tag updates
+        -- leave the set difference empty
+        IF TG_OP = 'UPDATE' THEN
+            IF NOT EXISTS (
+                SELECT id, author, text_hash FROM new_rows
+                EXCEPT
+                SELECT id, author, text_hash FROM old_rows
+            ) THEN
+                RETURN NULL;
+            END IF;
+        END IF;
+
+        PERFORM pg_advisory_xact_lock(TG_RELID::bigint);
+        IF EXISTS (
+            SELECT FROM new_rows n
+            JOIN quotes q
+                ON q.author = n.author AND q.text_hash = n.text_hash AND q.id <> n.id
+        ) THEN
+            RAISE EXCEPTION 'duplicate key value violates uniqueness of quotes (author, text_hash)'
+                USING ERRCODE = 'unique_violation';
+        END IF;
+        RETURN NULL;
+    END
+    $function$
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Quotes created in a month without a partition, e.g. when partition
+    # maintenance fell behind, land here instead of failing the write.
+    # QuotePartitionsRepository.create moves them into the month's partition.
+    op.execute('CREATE TABLE quotes_default PARTITION OF quotes DEFAULT')
+
+    # Quotes are unique by (author, text_hash) through the primary key of an
+    # unpartitioned table of their keys, kept by triggers on quotes. Writers
+    # inserting the same key wait for each other on that key alone; the
+    # loser fails with a unique violation once the winner commits.
+    op.create_table(
+        'quote_keys',
+        sa.Column('author', sa.String, nullable=False),
+        sa.Column('text_hash', sa.String(64), nullable=False),
+        sa.PrimaryKeyConstraint('author', 'text_hash', name='quote_keys_pkey'),
+    )
+    op.execute('LOCK TABLE quotes IN SHARE MODE')
+    op.execute('INSERT INTO quote_keys (author, text_hash) SELECT author, text_hash FROM quotes')
+
+    op.execute('DROP TRIGGER quote_unique_insert ON quotes')
+    op.execute('DROP TRIGGER quote_unique_update ON quotes')
+    op.execute('DROP FUNCTION quote_check_unique()')
+    op.execute(
+        """
+        CREATE FUNCTION quote_keys_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $function$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO quote_keys (author, text_hash)
+                SELECT author, text_hash FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                DELETE FROM quote_keys k USING old_rows o
+                WHERE k.author = o.author AND k.text_hash = o.text_hash;
+            ELSE
+                -- Tag updates leave both set differences empty
+                DELETE FROM quote_keys k USING (
+                    SELECT author, text_hash FROM old_rows
+                    EXCEPT
+                    SELECT author, text_hash FROM new_rows
+                ) o
+                WHERE k.author = o.author AND k.text_hash = o.text_hash;
+                INSERT INTO quote_keys (author, text_hash)
+                SELECT author, text_hash FROM new_rows
+                EXCEPT
+                SELECT author, text_hash FROM old_rows;
+            END IF;
+            RETURN NULL;
+        END
+        $function$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION quote_keys_reset() RETURNS trigger
+        LANGUAGE plpgsql AS $function$
+        BEGIN
+            TRUNCATE quote_keys;
+            RETURN NULL;
+        END
+        $function$
+        """
+    )
+    # Named to fire after the statistics triggers, as the check they replace
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_insert AFTER INSERT ON quotes
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_keys_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_update AFTER UPDATE ON quotes
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_keys_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_delete AFTER DELETE ON quotes
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_keys_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_truncate AFTER TRUNCATE ON quotes
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_keys_reset()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER quote_unique_insert ON quotes')
+    op.execute('DROP TRIGGER quote_unique_update ON quotes')
+    op.execute('DROP TRIGGER quote_unique_delete ON quotes')
+    op.execute('DROP TRIGGER quote_unique_truncate ON quotes')
+    op.execute('DROP FUNCTION quote_keys_apply()')
+    op.execute('DROP FUNCTION quote_keys_reset()')
+    op.drop_table('quote_keys')
+    op.execute(PREVIOUS_CHECK)
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_insert AFTER INSERT ON quotes
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_check_unique()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_unique_update AFTER UPDATE ON quotes
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_check_unique()
+        """
+    )
+
+    # Move the quotes of the default partition into monthly partitions of
+    # their own; moving them between partitions fires no trigger on quotes,
+    # so the statistics are left as they are.
+    op.execute(
+        """
+        DO $$
+        DECLARE
+            month timestamp;
+            partition text;
+        BEGIN
+            FOR month IN
+                SELECT DISTINCT date_trunc('month', created_at) FROM quotes_default ORDER BY 1
+            LOOP
+                partition := 'quotes_p' || to_char(month, 'YYYYMM');
+                EXECUTE format(
+                    'CREATE TABLE %I (LIKE quotes INCLUDING DEFAULTS INCLUDING GENERATED)',
+                    partition);
+                EXECUTE format(
+                    'WITH moved AS (
+                        DELETE FROM quotes_default
+                        WHERE created_at >= %L AND created_at < %L
+                        RETURNING id, text, text_hash, author, tags, created_at, updated_at
+                    )
+                    INSERT INTO %I (id, text, text_hash, author, tags, created_at, updated_at)
+                    SELECT * FROM moved',
+                    month, month + interval '1 month', partition);
+                EXECUTE format(
+                    'ALTER TABLE quotes ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition, month, month + interval '1 month');
+            END LOOP;
+        END
+        $$
+        """
+    )
+    op.execute('DROP TABLE quotes_default')
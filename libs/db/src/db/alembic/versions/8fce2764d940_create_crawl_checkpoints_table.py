@@ -0,0 +1,36 @@
+"""create crawl checkpoints table
+
+Revision ID: 8fce2764d940
+Revises: f4ce60daa222
+Create Date: 2025-10-09 14:12:47.203815
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8fce2764d940'
+down_revision: Union[str, Sequence[str], None] = 'f4ce60daa222'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'crawl_checkpoints',
+        sa.Column('id', sa.Text, primary_key=True),
+        sa.Column('state', sa.LargeBinary, nullable=False),
+        sa.Column(
+            'updated_at', sa.TIMESTAMP(), nullable=False,
+            server_default=sa.func.now()
+        ),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('crawl_checkpoints')
@@ -0,0 +1,88 @@
+"""add quotes text hash
+
+Revision ID: c4a0f84b62fe
+Revises: 1430a9cd938e
+Create Date: 2025-09-24 18:40:03.518920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from db.hashing import hash_text
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a0f84b62fe'
+down_revision: Union[str, Sequence[str], None] = '1430a9cd938e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+quotes = sa.table(
+    'quotes',
+    sa.column('id', sa.UUID),
+    sa.column('text', sa.String),
+    sa.column('text_hash', sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('quotes', sa.Column('text_hash', sa.String(64), nullable=True))
+
+    # The hash is defined in Python, so backfill it from Python in batches
+    # keyed on id.
+    bind = op.get_bind()
+    last_id = None
+    while True:
+        query = sa.select(quotes.c.id, quotes.c.text).order_by(quotes.c.id)
+        if last_id is not None:
+            query = query.where(quotes.c.id > last_id)
+        rows = bind.execute(query.limit(BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        bind.execute(
+            quotes.update()
+            .where(quotes.c.id == sa.bindparam('row_id'))
+            .values(text_hash=sa.bindparam('row_hash')),
+            [{'row_id': row.id, 'row_hash': hash_text(row.text)} for row in rows],
+        )
+        last_id = rows[-1].id
+
+    op.alter_column('quotes', 'text_hash', nullable=False)
+
+    # Texts that only differ in whitespace or Unicode form now share a hash;
+    # keep the most recently updated row of each.
+    op.execute(
+        """
+        DELETE FROM quotes a
+        USING quotes b
+        WHERE a.author = b.author
+          AND a.text_hash = b.text_hash
+          AND (a.updated_at, a.id) < (b.updated_at, b.id)
+        """
+    )
+
+    op.drop_index('uq_quotes_author_text_md5', table_name='quotes')
+    op.create_index(
+        'uq_quotes_author_text_hash',
+        'quotes',
+        ['author', 'text_hash'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_quotes_author_text_hash', table_name='quotes')
+    op.create_index(
+        'uq_quotes_author_text_md5',
+        'quotes',
+        ['author', sa.text('md5(text)')],
+        unique=True,
+    )
+    op.drop_column('quotes', 'text_hash')
@@ -0,0 +1,42 @@
+"""store quote tags as array
+
+Revision ID: d6959f561cc4
+Revises: c4a0f84b62fe
+Create Date: 2025-09-29 09:05:57.640118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6959f561cc4'
+down_revision: Union[str, Sequence[str], None] = 'c4a0f84b62fe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tags were stored comma-separated; the rewrite backfills every row.
+    op.alter_column(
+        'quotes', 'tags',
+        type_=postgresql.ARRAY(sa.Text),
+        postgresql_using="string_to_array(tags, ',')",
+    )
+    op.create_index(
+        'ix_quotes_tags', 'quotes', ['tags'], postgresql_using='gin'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_quotes_tags', table_name='quotes')
+    op.alter_column(
+        'quotes', 'tags',
+        type_=sa.String,
+        postgresql_using="array_to_string(tags, ',')",
+    )
@@ -0,0 +1,192 @@
+"""create quote stats tables
+
+Revision ID: ed4d73b317a5
+Revises: 15eb873d4006
+Create Date: 2025-10-18 09:14:27.540391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ed4d73b317a5'
+down_revision: Union[str, Sequence[str], None] = '15eb873d4006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'quote_author_stats',
+        sa.Column('author', sa.String, primary_key=True),
+        sa.Column('quotes', sa.BigInteger, nullable=False),
+    )
+    op.create_index('ix_quote_author_stats_quotes', 'quote_author_stats', ['quotes'])
+    op.create_table(
+        'quote_daily_stats',
+        sa.Column('day', sa.Date, primary_key=True),
+        sa.Column('inserted', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('updated', sa.BigInteger, nullable=False, server_default='0'),
+    )
+    op.create_table(
+        'quote_stats_totals',
+        sa.Column('id', sa.Boolean, primary_key=True, server_default='true'),
+        sa.Column('quotes', sa.BigInteger, nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()),
+        sa.CheckConstraint('id', name='ck_quote_stats_totals_single_row'),
+    )
+
+    # Statement-level triggers apply the rows a statement inserted, updated
+    # or deleted in a few aggregate statements, rather than one per row.
+    # Rows entering quotes count +1 and rows leaving it -1; an update is
+    # both. The totals row is always locked first, see QuoteStatsTotals.
+    op.execute(
+        """
+        CREATE FUNCTION quote_stats_apply() RETURNS trigger
+        LANGUAGE plpgsql AS $function$
+        DECLARE
+            changes text;
+        BEGIN
+            changes := CASE TG_OP
+                WHEN 'INSERT' THEN
+                    'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows'
+                WHEN 'DELETE' THEN
+                    'SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+                ELSE
+                    'SELECT author, created_at, updated_at, 1 AS sign FROM new_rows
+                     UNION ALL
+                     SELECT author, created_at, updated_at, -1 AS sign FROM old_rows'
+            END;
+
+            EXECUTE format($sql$
+                UPDATE quote_stats_totals
+                SET quotes = quotes + (SELECT coalesce(sum(sign), 0) FROM (%s) c),
+                    updated_at = now()
+            $sql$, changes);
+
+            EXECUTE format($sql$
+                INSERT INTO quote_author_stats AS s (author, quotes)
+                SELECT author, sum(sign) FROM (%s) c
+                GROUP BY author
+                HAVING sum(sign) <> 0
+                ON CONFLICT (author) DO UPDATE SET quotes = s.quotes + excluded.quotes
+            $sql$, changes);
+            EXECUTE format($sql$
+                DELETE FROM quote_author_stats s
+                USING (%s) c
+                WHERE s.author = c.author AND c.sign < 0 AND s.quotes = 0
+            $sql$, changes);
+
+            EXECUTE format($sql$
+                INSERT INTO quote_daily_stats AS s (day, inserted, updated)
+                SELECT day, sum(inserted), sum(updated) FROM (
+                    SELECT created_at::date AS day, sign AS inserted, 0 AS updated
+                    FROM (%1$s) c
+                    UNION ALL
+                    SELECT updated_at::date, 0, sign
+                    FROM (%1$s) c
+                    WHERE updated_at > created_at
+                ) d
+                GROUP BY day
+                HAVING sum(inserted) <> 0 OR sum(updated) <> 0
+                ON CONFLICT (day) DO UPDATE
+                SET inserted = s.inserted + excluded.inserted,
+                    updated = s.updated + excluded.updated
+            $sql$, changes);
+            EXECUTE format($sql$
+                DELETE FROM quote_daily_stats s
+                USING (%1$s) c
+                WHERE s.day IN (c.created_at::date, c.updated_at::date)
+                  AND c.sign < 0 AND s.inserted = 0 AND s.updated = 0
+            $sql$, changes);
+
+            RETURN NULL;
+        END
+        $function$
+        """
+    )
+    op.execute(
+        """
+        CREATE FUNCTION quote_stats_reset() RETURNS trigger
+        LANGUAGE plpgsql AS $function$
+        BEGIN
+            UPDATE quote_stats_totals SET quotes = 0, updated_at = now();
+            DELETE FROM quote_author_stats;
+            DELETE FROM quote_daily_stats;
+            RETURN NULL;
+        END
+        $function$
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_stats_insert AFTER INSERT ON quotes
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_stats_update AFTER UPDATE ON quotes
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_stats_delete AFTER DELETE ON quotes
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_apply()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER quote_stats_truncate AFTER TRUNCATE ON quotes
+        FOR EACH STATEMENT EXECUTE FUNCTION quote_stats_reset()
+        """
+    )
+
+    # Statistics of the quotes stored so far; writers wait for the lock
+    # until the tables are filled.
+    op.execute('LOCK TABLE quotes IN SHARE MODE')
+    op.execute(
+        """
+        INSERT INTO quote_stats_totals (quotes)
+        SELECT count(*) FROM quotes
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO quote_author_stats (author, quotes)
+        SELECT author, count(*) FROM quotes GROUP BY author
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO quote_daily_stats (day, inserted, updated)
+        SELECT day, sum(inserted), sum(updated) FROM (
+            SELECT created_at::date AS day, 1 AS inserted, 0 AS updated FROM quotes
+            UNION ALL
+            SELECT updated_at::date, 0, 1 FROM quotes WHERE updated_at > created_at
+        ) d
+        GROUP BY day
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER quote_stats_truncate ON quotes')
+    op.execute('DROP TRIGGER quote_stats_delete ON quotes')
+    op.execute('DROP TRIGGER quote_stats_update ON quotes')
+    op.execute('DROP TRIGGER quote_stats_insert ON quotes')
+    op.execute('DROP FUNCTION quote_stats_reset()')
+    op.execute('DROP FUNCTION quote_stats_apply()')
+    op.drop_table('quote_stats_totals')
+    op.drop_table('quote_daily_stats')
+    op.drop_index('ix_quote_author_stats_quotes', table_name='quote_author_stats')
+    op.drop_table('quote_author_stats')
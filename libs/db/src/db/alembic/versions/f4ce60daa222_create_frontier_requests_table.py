@@ -0,0 +1,56 @@
+"""create frontier requests table
+
+Revision ID: f4ce60daa222
+Revises: 382b9a8ba9fa
+Create Date: 2025-10-07 09:41:18.552031
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4ce60daa222'
+down_revision: Union[str, Sequence[str], None] = '382b9a8ba9fa'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'frontier_requests',
+        sa.Column('crawl_id', sa.Text, primary_key=True),
+        sa.Column('fingerprint', sa.Text, primary_key=True),
+        sa.Column('seq', sa.BigInteger, sa.Identity(), nullable=False),
+        sa.Column('priority', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('request', sa.LargeBinary, nullable=True),
+        sa.Column('state', sa.String(16), nullable=False, server_default='pending'),
+        sa.Column('worker', sa.Text, nullable=True),
+        sa.Column('lease_expires_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column(
+            'created_at', sa.TIMESTAMP(), nullable=False,
+            server_default=sa.func.now()
+        ),
+    )
+    op.create_index(
+        'ix_frontier_requests_pending',
+        'frontier_requests',
+        ['crawl_id', sa.text('priority DESC'), 'seq'],
+        postgresql_where=sa.text("state = 'pending'"),
+    )
+    op.create_index(
+        'ix_frontier_requests_claimed',
+        'frontier_requests',
+        ['crawl_id', 'lease_expires_at'],
+        postgresql_where=sa.text("state = 'claimed'"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_frontier_requests_claimed', table_name='frontier_requests')
+    op.drop_index('ix_frontier_requests_pending', table_name='frontier_requests')
+    op.drop_table('frontier_requests')
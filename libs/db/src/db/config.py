@@ -1,8 +1,11 @@
-
 """Database configuration."""
 
 import os
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
 # Database configuration
 postgres_host: str = os.getenv("DATABASE_HOST", "localhost")
 postgres_port: str = os.getenv("DATABASE_PORT", "5432")
@@ -11,5 +14,35 @@ postgres_username: str = os.getenv("DATABASE_USER", "scraper")
 postgres_password: str = os.getenv("DATABASE_PASSWORD", "scraper_password")
 postgres_schema: str = os.getenv("POSTGRES_SCHEMA", "public")
 
+# Connection pool of each engine: connections kept open, extra connections
+# opened under load, seconds before a connection is replaced and seconds to
+# wait for a free connection before giving up
+pool_size: int = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+pool_max_overflow: int = int(os.getenv("DATABASE_POOL_MAX_OVERFLOW", "10"))
+pool_recycle: int = int(os.getenv("DATABASE_POOL_RECYCLE", "1800"))
+pool_timeout: float = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+
+# Prepared statements cached per asyncpg connection; 0 disables the cache,
+# as needed behind PgBouncer in transaction mode
+statement_cache_size: int = int(os.getenv("DATABASE_STATEMENT_CACHE_SIZE", "100"))
+
+echo_sql: bool = os.getenv("DATABASE_ECHO", "").lower() in ("1", "true")
+
+
+def database_url(driver: str = "psycopg2") -> str:
+    """Build the connection string of the configured database.
+
+    Args:
+        driver: SQLAlchemy driver name, e.g. ``psycopg2`` or ``asyncpg``
+
+    Returns:
+        The SQLAlchemy URL
+    """
+    return (
+        f"postgresql+{driver}://{postgres_username}:{postgres_password}"
+        f"@{postgres_host}:{postgres_port}/{postgres_database}"
+    )
+
+
 # Connection string and arguments used by SQLAlchemy
-db_url = f"postgresql+psycopg2://{postgres_username}:{postgres_password}@{postgres_host}:{postgres_port}/{postgres_database}"
+db_url = database_url("psycopg2")
@@ -1,39 +1,204 @@
+"""Engines, connection pools and sessions shared by every app."""
+
 import contextlib
-from typing import Any, AsyncIterator
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator
 
-from app.config import settings
+from sqlalchemy import Engine, create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import (
     AsyncConnection,
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 
-Base = declarative_base()
+from db import config
 
 # Heavily inspired by https://praciano.com.br/fastapi-and-async-sqlalchemy-20-with-pytest-done-right.html
 
 
+class PoolMetrics:
+    """Checkout counters of a connection pool.
+
+    Updated by the instrumented pools from any thread. ``wait_seconds`` is
+    the total time spent waiting for a connection, including opening new
+    ones; ``max_in_use`` is the most connections checked out at once.
+    """
+
+    def __init__(self):
+        """Initialize the counters at zero."""
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_in_use = 0
+
+    def record_checkout(self, wait_seconds: float, in_use: int):
+        """Count a connection handed out after ``wait_seconds``."""
+        with self._lock:
+            self.checkouts += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+            self.max_in_use = max(self.max_in_use, in_use)
+
+    def record_timeout(self, wait_seconds: float):
+        """Count a checkout that gave up after ``wait_seconds``."""
+        with self._lock:
+            self.timeouts += 1
+            self.wait_seconds += wait_seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, wait_seconds)
+
+    def as_dict(self) -> dict[str, Any]:
+        """The counters, by name."""
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds": self.wait_seconds,
+                "max_wait_seconds": self.max_wait_seconds,
+                "max_in_use": self.max_in_use,
+            }
+
+
+class _InstrumentedPool:
+    """Mixin timing every checkout of a queue pool into its ``metrics``."""
+
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        if self.metrics is None:
+            return super()._do_get()
+
+        start = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - start)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, self.checkedout())
+        return record
+
+    def recreate(self):
+        # Called when the engine is disposed; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    """Queue pool of blocking engines recording ``PoolMetrics``."""
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    """Queue pool of asyncio engines recording ``PoolMetrics``."""
+
+
 class DatabaseSessionManager:
-    def __init__(self, host: str, engine_kwargs: dict[str, Any] = {}):
-        self._engine = create_async_engine(host, **engine_kwargs)
-        self._sessionmaker = async_sessionmaker(autocommit=False, bind=self._engine)
+    """One asyncio engine and one blocking engine with instrumented pools.
 
-    async def close(self):
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-        await self._engine.dispose()
+    Both engines are created on first use and share the pool configuration;
+    the asyncio engine uses asyncpg and the blocking one psycopg2. Every app
+    goes through the module-level ``sessionmanager``, so pools are sized and
+    observed in one place, see ``pool_metrics``.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = config.pool_size,
+        max_overflow: int = config.pool_max_overflow,
+        pool_recycle: int = config.pool_recycle,
+        pool_timeout: float = config.pool_timeout,
+        statement_cache_size: int = config.statement_cache_size,
+        echo: bool = config.echo_sql,
+    ):
+        """Initialize the manager; no connection is opened yet.
+
+        Args:
+            pool_size: Connections each pool keeps open
+            max_overflow: Connections each pool opens beyond ``pool_size``
+                under load
+            pool_recycle: Seconds after which a connection is replaced
+            pool_timeout: Seconds to wait for a free connection
+            statement_cache_size: Prepared statements cached per asyncpg
+                connection, 0 to disable
+            echo: Log every SQL statement
+        """
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self.pool_recycle = pool_recycle
+        self.pool_timeout = pool_timeout
+        self.statement_cache_size = statement_cache_size
+        self.echo = echo
+        self.metrics = {"async": PoolMetrics(), "sync": PoolMetrics()}
+        self._lock = threading.Lock()
+        self._engine: AsyncEngine | None = None
+        self._sessionmaker: async_sessionmaker[AsyncSession] | None = None
+        self._sync_engine: Engine | None = None
+        self._sync_sessionmaker: sessionmaker[Session] | None = None
+
+    def _engine_kwargs(self) -> dict[str, Any]:
+        return {
+            "echo": self.echo,
+            "pool_pre_ping": True,  # Verify connections before use
+            "pool_size": self.pool_size,
+            "max_overflow": self.max_overflow,
+            "pool_recycle": self.pool_recycle,
+            "pool_timeout": self.pool_timeout,
+        }
+
+    @property
+    def engine(self) -> AsyncEngine:
+        """The asyncio engine, created on first use."""
+        with self._lock:
+            if self._engine is None:
+                self._engine = create_async_engine(
+                    config.database_url("asyncpg"),
+                    poolclass=InstrumentedAsyncQueuePool,
+                    connect_args={"prepared_statement_cache_size": self.statement_cache_size},
+                    **self._engine_kwargs(),
+                )
+                self._engine.pool.metrics = self.metrics["async"]
+                self._sessionmaker = async_sessionmaker(
+                    self._engine, class_=AsyncSession, expire_on_commit=False)
+            return self._engine
 
-        self._engine = None
-        self._sessionmaker = None
+    @property
+    def sync_engine(self) -> Engine:
+        """The blocking engine, created on first use."""
+        with self._lock:
+            if self._sync_engine is None:
+                self._sync_engine = create_engine(
+                    config.database_url("psycopg2"),
+                    poolclass=InstrumentedQueuePool,
+                    **self._engine_kwargs(),
+                )
+                self._sync_engine.pool.metrics = self.metrics["sync"]
+                self._sync_sessionmaker = sessionmaker(
+                    self._sync_engine, class_=Session, expire_on_commit=False)
+            return self._sync_engine
+
+    @property
+    def session_factory(self) -> async_sessionmaker[AsyncSession]:
+        """Factory of asyncio sessions on the shared pool."""
+        self.engine  # Creates the factory along with the engine
+        return self._sessionmaker
+
+    @property
+    def sync_session_factory(self) -> sessionmaker[Session]:
+        """Factory of blocking sessions on the shared pool."""
+        self.sync_engine  # Creates the factory along with the engine
+        return self._sync_sessionmaker
 
     @contextlib.asynccontextmanager
     async def connect(self) -> AsyncIterator[AsyncConnection]:
-        if self._engine is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        async with self._engine.begin() as connection:
+        """An asyncio connection in a transaction, rolled back on error."""
+        async with self.engine.begin() as connection:
             try:
                 yield connection
             except Exception:
@@ -42,10 +207,8 @@ class DatabaseSessionManager:
 
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncIterator[AsyncSession]:
-        if self._sessionmaker is None:
-            raise Exception("DatabaseSessionManager is not initialized")
-
-        session = self._sessionmaker()
+        """An asyncio session, rolled back on error and always closed."""
+        session = self.session_factory()
         try:
             yield session
         except Exception:
@@ -54,10 +217,51 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    @contextlib.contextmanager
+    def sync_session(self) -> Iterator[Session]:
+        """A blocking session, rolled back on error and always closed."""
+        session = self.sync_session_factory()
+        try:
+            yield session
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def pool_metrics(self) -> dict[str, dict[str, Any]]:
+        """Checkout counters and current usage of the engines created so far.
+
+        Returns:
+            By engine, ``async`` or ``sync``: the ``PoolMetrics`` counters
+            plus ``in_use``, the connections checked out right now, and
+            ``idle``, the open connections waiting in the pool
+        """
+        metrics = {}
+        for name, engine in (("async", self._engine), ("sync", self._sync_engine)):
+            if engine is None:
+                continue
+            metrics[name] = {
+                **self.metrics[name].as_dict(),
+                "in_use": engine.pool.checkedout(),
+                "idle": engine.pool.checkedin(),
+            }
+        return metrics
+
+    async def close(self):
+        """Close every pooled connection; the engines are recreated on use."""
+        with self._lock:
+            engine, self._engine, self._sessionmaker = self._engine, None, None
+            sync_engine, self._sync_engine, self._sync_sessionmaker = self._sync_engine, None, None
+        if engine is not None:
+            await engine.dispose()
+        if sync_engine is not None:
+            sync_engine.dispose()
+
 
-sessionmanager = DatabaseSessionManager(settings.database_url, {"echo": settings.echo_sql})
+sessionmanager = DatabaseSessionManager()
 
 
 async def get_db_session():
     async with sessionmanager.session() as session:
-        yield session
\ No newline at end of file
+        yield session
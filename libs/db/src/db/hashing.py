@@ -0,0 +1,57 @@
+"""Content hashing for quotes."""
+
+import hashlib
+import unicodedata
+from typing import Sequence
+
+
+def normalize_text(text: str) -> str:
+    """Normalize quote text before hashing.
+
+    Applies Unicode NFC normalization and collapses runs of whitespace, so
+    texts that differ only in encoding form or spacing hash identically.
+
+    Args:
+        text: The quote text
+
+    Returns:
+        The normalized text
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def hash_text(text: str) -> str:
+    """Compute the content hash stored in ``quotes.text_hash``.
+
+    Args:
+        text: The quote text
+
+    Returns:
+        Hex-encoded SHA-256 digest of the normalized text
+    """
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def hash_tags(tags: Sequence[str]) -> str:
+    """Compute the content hash of a quote's tags.
+
+    Args:
+        tags: The tags as stored in ``quotes.tags``, in order
+
+    Returns:
+        Hex-encoded SHA-256 digest of the tags
+    """
+    return hashlib.sha256("\x1f".join(tags).encode("utf-8")).hexdigest()
+
+
+def fingerprint(*parts: str) -> int:
+    """Compute the 64-bit fingerprint of a quote in the in-memory indexes.
+
+    Args:
+        parts: The fields identifying the quote, e.g. its author and text hash
+
+    Returns:
+        The first 8 bytes of the BLAKE2b digest of the fields, as an integer
+    """
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
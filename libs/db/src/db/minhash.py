@@ -0,0 +1,386 @@
+"""Near-duplicate detection for quotes with MinHash and LSH.
+
+Quote texts are normalized for similarity, cut into character shingles and
+summarized by MinHash signatures: the share of positions on which two
+signatures agree estimates the Jaccard similarity of the texts' shingle
+sets. An ``LSHIndex`` splits signatures into bands and finds the entries
+that agree with a query on every row of at least one band; those similar
+enough are near duplicates.
+
+With the defaults, 16 bands of 4 rows, a pair of texts with similarity ``s``
+becomes a candidate with probability ``1 - (1 - s**4)**16``: 0.99 at 0.7,
+0.64 at 0.5 and 0.12 at 0.3. Candidates are kept if their estimated
+similarity is at least ``THRESHOLD``.
+"""
+
+import re
+import unicodedata
+from typing import Sequence
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Characters per shingle; quotes are short, so a small edit changes fewer
+# shingles of 3 than of the usual 5 characters
+SHINGLE_SIZE = 3
+# Signature length and LSH bands; each band holds NUM_PERM / BANDS rows
+NUM_PERM = 64
+BANDS = 16
+# Minimum estimated Jaccard similarity of near duplicates
+THRESHOLD = 0.7
+# Texts signed per vectorized batch; bounds the temporary hash matrix
+SIGN_BATCH_SIZE = 256
+
+NON_WORD = re.compile(r"[\W_]+")
+
+_MASK = (1 << 64) - 1
+# Powers of an odd 64-bit constant, for polynomial hashes of shingles
+_BASE = 0x9E3779B97F4A7C15
+_POWERS = np.array(
+    [pow(_BASE, power, 1 << 64) for power in range(32)], dtype=np.uint64)
+
+
+def normalize_for_similarity(text: str) -> str:
+    """Normalize quote text before shingling.
+
+    Folds compatibility characters (NFKC) and case, and replaces every run
+    of punctuation, typographic quotes and whitespace by a single space, so
+    texts that differ only in those compare as identical.
+
+    Args:
+        text: The quote text
+
+    Returns:
+        The normalized text
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return NON_WORD.sub(" ", text).strip()
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimate the Jaccard similarity of two texts from their signatures."""
+    return float(np.mean(first == second))
+
+
+def to_bytes(signatures: np.ndarray) -> list[bytes]:
+    """Encode signatures for storage, as little-endian 32-bit values."""
+    encoded = np.ascontiguousarray(signatures, dtype="<u4")
+    return [row.tobytes() for row in encoded]
+
+
+def from_bytes(encoded: Sequence[bytes], num_perm: int = NUM_PERM) -> np.ndarray:
+    """Decode stored signatures.
+
+    Returns:
+        Array of shape ``(len(encoded), num_perm)``
+    """
+    values = np.frombuffer(b"".join(encoded), dtype="<u4")
+    return values.astype(np.uint32).reshape(len(encoded), num_perm)
+
+
+class MinHasher:
+    """MinHash signatures and LSH band keys of quote texts.
+
+    Signatures are ``NUM_PERM`` 32-bit minimums of multiply-shift hashes of
+    the shingles. Signatures are only comparable between hashers with the
+    same parameters; the defaults are those of the stored signatures, see
+    ``QuoteSignaturesRepository``.
+    """
+
+    def __init__(
+        self,
+        num_perm: int = NUM_PERM,
+        bands: int = BANDS,
+        shingle_size: int = SHINGLE_SIZE,
+        seed: int = 1,
+    ):
+        """Initialize the hash functions.
+
+        Args:
+            num_perm: Signature length
+            bands: LSH bands, must divide ``num_perm``
+            shingle_size: Characters per shingle
+            seed: Seed of the hash functions
+
+        Raises:
+            ValueError: If ``bands`` does not divide ``num_perm``
+        """
+        if num_perm % bands:
+            raise ValueError(f"{bands} bands do not divide a signature of {num_perm}")
+        if not 0 < shingle_size <= len(_POWERS):
+            raise ValueError(f"Shingle size must be between 1 and {len(_POWERS)}")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self.multipliers = rng.integers(0, _MASK, num_perm, dtype=np.uint64, endpoint=True) | np.uint64(1)
+        self.increments = rng.integers(0, _MASK, num_perm, dtype=np.uint64, endpoint=True)
+        self.band_seeds = _mix(np.arange(1, bands + 1, dtype=np.uint64))
+
+    def signature(self, text: str) -> np.ndarray:
+        """Compute the signature of a quote text.
+
+        Returns:
+            ``num_perm`` 32-bit values
+        """
+        return self.signatures([text])[0]
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """Compute the signatures of quote texts, ``SIGN_BATCH_SIZE`` at a time.
+
+        Returns:
+            Array of shape ``(len(texts), num_perm)``
+        """
+        result = np.empty((len(texts), self.num_perm), dtype=np.uint32)
+        for start in range(0, len(texts), SIGN_BATCH_SIZE):
+            batch = texts[start:start + SIGN_BATCH_SIZE]
+            result[start:start + len(batch)] = self._sign(batch)
+        return result
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Hash every band of signatures into one 64-bit key.
+
+        Keys of different bands differ even for equal rows.
+
+        Args:
+            signatures: Array of shape ``(n, num_perm)``
+
+        Returns:
+            Array of shape ``(n, bands)``
+        """
+        rows = signatures.reshape(len(signatures), self.bands, self.num_perm // self.bands).astype(np.uint64)
+        keys = np.repeat(self.band_seeds[None, :], len(signatures), axis=0)
+        for row in range(rows.shape[2]):
+            keys = _mix(keys ^ rows[:, :, row])
+        return keys
+
+    def _sign(self, texts: Sequence[str]) -> np.ndarray:
+        """Compute the signatures of a batch of texts in one pass."""
+        values, counts = self._shingles([normalize_for_similarity(text) for text in texts])
+        # Texts without shingles get the same, maximal signature
+        signatures = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        nonempty = counts > 0
+        if not nonempty.any():
+            return signatures
+
+        # One row per hash function: reducing along rows is much faster
+        hashed = self.multipliers[:, None] * values
+        hashed += self.increments[:, None]
+        hashed >>= np.uint64(32)
+        starts = (np.cumsum(counts) - counts)[nonempty]
+        signatures[nonempty] = np.minimum.reduceat(hashed.astype(np.uint32), starts, axis=1).T
+        return signatures
+
+    def _shingles(self, texts: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Hash the character shingles of normalized texts, all at once.
+
+        Shingles are hashed at every position of the concatenated texts and
+        those running into the next text are discarded. A text shorter than
+        a shingle is a single shingle. Repeated shingles are kept; they do
+        not change the minimums.
+
+        Returns:
+            The shingle hashes of all texts in order, and the number per text
+        """
+        size = self.shingle_size
+        lengths = np.array([len(text) for text in texts], dtype=np.int64)
+        codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+        starts = np.cumsum(lengths) - lengths
+        full = lengths >= size
+        counts = np.where(full, lengths - size + 1, np.minimum(lengths, 1))
+
+        # Start of every shingle in the concatenated codes
+        offsets = np.cumsum(counts) - counts
+        positions = np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+        values = np.empty(len(positions), dtype=np.uint64)
+        in_full = np.repeat(full, counts)
+        if in_full.any():
+            windows = sliding_window_view(codes, size)
+            values[in_full] = windows[positions[in_full]] @ _POWERS[:size]
+        for index in np.flatnonzero(~full & (lengths > 0)).tolist():
+            short = codes[starts[index]:starts[index] + lengths[index]]
+            values[offsets[index]] = short @ _POWERS[:len(short)]
+        return _mix(values), counts
+
+
+class LSHIndex:
+    """Signatures searchable by LSH band.
+
+    Entries are added in bulk while loading and indexed once by ``freeze``,
+    which sorts the band keys of all of them; a query is then one binary
+    search per band. Entries inserted after ``freeze`` are kept apart in a
+    dict from band key to entries and searched as well.
+
+    Every entry costs ``entry_bytes``: its signature, its ID and its band
+    keys, 456 bytes with the default hasher.
+    """
+
+    def __init__(self, hasher: MinHasher | None = None, max_bytes: int | None = None):
+        """Initialize an empty index.
+
+        Args:
+            hasher: Hasher of the signatures, by default ``MinHasher()``
+            max_bytes: Maximum memory for entries, or None for no limit
+        """
+        self.hasher = hasher or MinHasher()
+        self.max_bytes = max_bytes
+        self.signatures = np.empty((0, self.hasher.num_perm), dtype=np.uint32)
+        self.ids = np.empty(0, dtype=np.uint64)
+        self._loading: list[tuple[np.ndarray, np.ndarray]] = []
+        self._loading_count = 0
+        self._keys = np.empty(0, dtype=np.uint64)
+        self._entries = np.empty(0, dtype=np.uint32)
+        self._inserted_signatures: list[np.ndarray] = []
+        self._inserted_ids: list[int] = []
+        self._inserted_buckets: dict[int, list[int]] = {}
+
+    @property
+    def entry_bytes(self) -> int:
+        """Memory used per entry."""
+        return self.hasher.num_perm * 4 + 8 + self.hasher.bands * (8 + 4)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the entries."""
+        return len(self) * self.entry_bytes
+
+    def add(self, signatures: np.ndarray, ids: np.ndarray | None = None) -> bool:
+        """Add entries while loading.
+
+        Args:
+            signatures: Array of shape ``(n, num_perm)``
+            ids: 64-bit IDs of the entries, by default their positions
+
+        Returns:
+            False if the entries did not fit within ``max_bytes``
+        """
+        if self.max_bytes is not None and self.nbytes + len(signatures) * self.entry_bytes > self.max_bytes:
+            return False
+        if ids is None:
+            start = len(self.signatures) + self._loading_count
+            ids = np.arange(start, start + len(signatures), dtype=np.uint64)
+        self._loading.append((signatures, np.asarray(ids, dtype=np.uint64)))
+        self._loading_count += len(signatures)
+        return True
+
+    def freeze(self):
+        """Index the loaded entries so they can be searched."""
+        if self._loading:
+            self.signatures = np.concatenate([self.signatures, *(s for s, _ in self._loading)])
+            self.ids = np.concatenate([self.ids, *(ids for _, ids in self._loading)])
+            self._loading = []
+            self._loading_count = 0
+        keys = self.hasher.band_keys(self.signatures).ravel()
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._entries = (order // self.hasher.bands).astype(np.uint32)
+
+    def insert(self, signature: np.ndarray, entry_id: int):
+        """Add one entry after ``freeze``, e.g. a quote seen during a crawl."""
+        position = len(self._inserted_ids)
+        self._inserted_signatures.append(signature)
+        self._inserted_ids.append(entry_id)
+        for key in self.hasher.band_keys(signature[None, :])[0].tolist():
+            self._inserted_buckets.setdefault(key, []).append(position)
+
+    def query(self, signature: np.ndarray, threshold: float = THRESHOLD) -> list[tuple[int, float]]:
+        """Find the entries similar to a signature.
+
+        Args:
+            signature: Signature of the query text
+            threshold: Minimum estimated similarity
+
+        Returns:
+            ``(id, similarity)`` of the matching entries, most similar first
+        """
+        keys = self.hasher.band_keys(signature[None, :])[0]
+        matches = []
+
+        low = np.searchsorted(self._keys, keys, side="left")
+        high = np.searchsorted(self._keys, keys, side="right")
+        if (high > low).any():
+            candidates = np.unique(np.concatenate(
+                [self._entries[start:end] for start, end in zip(low, high)]))
+            similarities = (self.signatures[candidates] == signature).mean(axis=1)
+            similar = similarities >= threshold
+            matches.extend(zip(self.ids[candidates[similar]].tolist(), similarities[similar].tolist()))
+
+        inserted = {
+            position
+            for key in keys.tolist()
+            for position in self._inserted_buckets.get(key, ())
+        }
+        for position in inserted:
+            value = similarity(self._inserted_signatures[position], signature)
+            if value >= threshold:
+                matches.append((self._inserted_ids[position], value))
+
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def pairs(self, threshold: float = THRESHOLD) -> np.ndarray:
+        """Find the similar pairs among the entries indexed by ``freeze``.
+
+        Args:
+            threshold: Minimum estimated similarity
+
+        Returns:
+            Array of shape ``(k, 2)`` of entry positions, smaller first
+        """
+        bounds = np.flatnonzero(np.diff(self._keys)) + 1
+        starts = np.concatenate(([0], bounds))
+        sizes = np.diff(np.concatenate((starts, [len(self._keys)])))
+
+        # All pairs within every bucket, one vectorized pass per bucket size
+        found = []
+        for size in np.unique(sizes[sizes > 1]).tolist():
+            bucket_starts = starts[sizes == size]
+            members = self._entries[bucket_starts[:, None] + np.arange(size)]
+            first, second = np.triu_indices(size, 1)
+            found.append(np.stack([members[:, first].ravel(), members[:, second].ravel()], axis=1))
+        if not found:
+            return np.empty((0, 2), dtype=np.int64)
+
+        candidates = np.sort(np.concatenate(found).astype(np.int64), axis=1)
+        candidates = candidates[candidates[:, 0] != candidates[:, 1]]
+        candidates = np.unique(candidates, axis=0)
+        similar = np.concatenate([
+            (self.signatures[chunk[:, 0]] == self.signatures[chunk[:, 1]]).mean(axis=1) >= threshold
+            for chunk in np.array_split(candidates, max(1, len(candidates) // 100_000))
+        ])
+        return candidates[similar]
+
+    def clusters(self, threshold: float = THRESHOLD) -> np.ndarray:
+        """Group the entries indexed by ``freeze`` into clusters of near duplicates.
+
+        Clusters are the connected components of the similar pairs.
+
+        Args:
+            threshold: Minimum estimated similarity of a pair
+
+        Returns:
+            The cluster of every entry, as the position of its first entry
+        """
+        labels = np.arange(len(self.signatures))
+        pairs = self.pairs(threshold)
+        while len(pairs):
+            lowest = np.minimum(labels[pairs[:, 0]], labels[pairs[:, 1]])
+            updated = labels.copy()
+            np.minimum.at(updated, pairs[:, 0], lowest)
+            np.minimum.at(updated, pairs[:, 1], lowest)
+            updated = updated[updated]
+            if np.array_equal(updated, labels):
+                break
+            labels = updated
+        return labels
+
+    def __len__(self) -> int:
+        return len(self.signatures) + self._loading_count + len(self._inserted_ids)
+
+
+def _mix(values: np.ndarray) -> np.ndarray:
+    """Scramble 64-bit values with the splitmix64 finalizer."""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
@@ -1,5 +1,27 @@
 """Database models package."""
 
-from db.models.orm import Quote
+from db.models.orm import (
+    CrawlCheckpoint,
+    CrawledPage,
+    FrontierRequest,
+    Quote,
+    QuoteAuthorStats,
+    QuoteDailyStats,
+    QuoteKey,
+    QuoteSignature,
+    QuoteStaging,
+    QuoteStatsTotals,
+)
 
-__all__ = ["Quote"]
+__all__ = [
+    "CrawlCheckpoint",
+    "CrawledPage",
+    "FrontierRequest",
+    "Quote",
+    "QuoteAuthorStats",
+    "QuoteDailyStats",
+    "QuoteKey",
+    "QuoteSignature",
+    "QuoteStaging",
+    "QuoteStatsTotals",
+]
@@ -1,11 +1,25 @@
 """SQLAlchemy ORM models."""
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import Column, String, TIMESTAMP, func
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.ext.declarative import DeclarativeBase
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Computed,
+    Date,
+    Identity,
+    Index,
+    Integer,
+    LargeBinary,
+    SmallInteger,
+    String,
+    Text,
+    TIMESTAMP,
+    func,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR, UUID
+from sqlalchemy.orm import DeclarativeBase, deferred
 
 
 class BaseEntity(DeclarativeBase):
@@ -15,9 +29,19 @@ class BaseEntity(DeclarativeBase):
 
 
 class Quote(BaseEntity):
-    """Quote model representing a quote from the web scraper."""
+    """Quote model representing a quote from the web scraper.
+
+    The table is partitioned by month of ``created_at``, see
+    ``QuotePartitionsRepository``, so the primary key includes it. Unique
+    indexes of a partitioned table must include the partition key as well,
+    so triggers keep the keys of quotes in ``QuoteKey`` instead: inserting
+    a quote whose ``(author, text_hash)`` exists in any partition fails with
+    a unique violation, as it did on the unique index of the unpartitioned
+    table.
+    """
 
     __tablename__ = "quotes"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id: uuid.UUID = Column(
         UUID(as_uuid=True),
@@ -25,10 +49,12 @@ class Quote(BaseEntity):
         server_default=func.gen_random_uuid()
     )
     text: str = Column(String, nullable=False)
+    text_hash: str = Column(String(64), nullable=False)
     author: str = Column(String, nullable=False)
-    tags: str = Column(String, nullable=False)
+    tags: list[str] = Column(ARRAY(Text), nullable=False)
     created_at: datetime = Column(
         TIMESTAMP(),
+        primary_key=True,
         nullable=False,
         server_default=func.now()
     )
@@ -38,7 +64,258 @@ class Quote(BaseEntity):
         server_default=func.now(),
         onupdate=func.now()
     )
+    # Full-text search document, see QuotesRepository.search. Computed by
+    # the database and only loaded on access.
+    search_vector = deferred(Column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', text), 'A') || "
+            "setweight(to_tsvector('english', author), 'B')",
+            persisted=True,
+        ),
+    ))
 
     def __repr__(self) -> str:
         """String representation of the Quote model."""
         return f"<Quote(id={self.id}, author='{self.author}', text='{self.text[:50]}...')>"
+
+
+# Finding quotes by dedup key, one probe per partition. The hash is computed in
+# Python, see db.hashing.
+Index("ix_quotes_author_text_hash", Quote.author, Quote.text_hash)
+
+# Tag containment and overlap queries.
+Index("ix_quotes_tags", Quote.tags, postgresql_using="gin")
+
+# Full-text search.
+Index("ix_quotes_search_vector", Quote.search_vector, postgresql_using="gin")
+
+
+class QuoteKey(BaseEntity):
+    """Key of a stored quote, unique across the partitions of ``quotes``.
+
+    Kept by triggers on ``quotes``; dropping a partition removes the keys of
+    its quotes, see ``QuotePartitionsRepository.drop_before``.
+    """
+
+    __tablename__ = "quote_keys"
+
+    author: str = Column(String, primary_key=True)
+    text_hash: str = Column(String(64), primary_key=True)
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteKey model."""
+        return f"<QuoteKey(author='{self.author}', text_hash='{self.text_hash}')>"
+
+
+class QuoteStaging(BaseEntity):
+    """Quotes loaded with COPY before they are merged into ``quotes``.
+
+    The table is unlogged: its rows only live for the transaction that
+    loads and merges a batch, see ``QuotesRepository.copy_upsert_many``.
+    Concurrent writers keep their rows apart by ``batch_id``.
+    """
+
+    __tablename__ = "quotes_staging"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    batch_id: int = Column(BigInteger, primary_key=True)
+    position: int = Column(Integer, primary_key=True)
+    text: str = Column(String, nullable=False)
+    text_hash: str = Column(String(64), nullable=False)
+    author: str = Column(String, nullable=False)
+    tags: list[str] = Column(ARRAY(Text), nullable=False)
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteStaging model."""
+        return f"<QuoteStaging(batch_id={self.batch_id}, position={self.position})>"
+
+
+class QuoteSignature(BaseEntity):
+    """MinHash signature of a quote's text, see ``db.minhash``.
+
+    Written by ``db.near_duplicates``, which also sets ``cluster_id`` to the
+    ID of the oldest quote of the cluster of near duplicates the quote
+    belongs to, or NULL if it has none.
+    """
+
+    __tablename__ = "quote_signatures"
+
+    quote_id: uuid.UUID = Column(UUID(as_uuid=True), primary_key=True)
+    # NUM_PERM little-endian 32-bit values
+    signature: bytes = Column(LargeBinary, nullable=False)
+    cluster_id: uuid.UUID | None = Column(UUID(as_uuid=True), nullable=True)
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteSignature model."""
+        return f"<QuoteSignature(quote_id={self.quote_id}, cluster_id={self.cluster_id})>"
+
+
+# Listing the quotes of a cluster.
+Index("ix_quote_signatures_cluster_id", QuoteSignature.cluster_id)
+
+
+class QuoteAuthorStats(BaseEntity):
+    """Number of quotes of each author, summed over the slots.
+
+    Kept up to date by triggers on ``quotes``, like ``QuoteDailyStats`` and
+    ``QuoteStatsTotals``; see ``QuoteStatsRepository`` to read, check and
+    rebuild them. Each database connection writes the rows of its slot,
+    ``quote_stats_slot()``, so a slot may count quotes another one added as
+    removed. Slots whose count drops to zero lose their row.
+    """
+
+    __tablename__ = "quote_author_stats"
+
+    author: str = Column(String, primary_key=True)
+    slot: int = Column(SmallInteger, primary_key=True)
+    quotes: int = Column(BigInteger, nullable=False)
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteAuthorStats model."""
+        return f"<QuoteAuthorStats(author='{self.author}', slot={self.slot}, quotes={self.quotes})>"
+
+
+class QuoteDailyStats(BaseEntity):
+    """Quotes by the day they were created and by the day they were last updated.
+
+    ``inserted`` counts the quotes whose ``created_at`` falls on ``day``,
+    ``updated`` those whose ``updated_at`` does and is later than their
+    ``created_at``, summed over the slots as in ``QuoteAuthorStats``.
+
+    ``updated`` is not the number of updates made that day: a quote updated
+    again moves from the day of its previous update to the new one, and a
+    deleted quote is not counted at all. That keeps the statistics derivable
+    from ``quotes``, so they can be checked and rebuilt.
+    """
+
+    __tablename__ = "quote_daily_stats"
+
+    day: date = Column(Date, primary_key=True)
+    slot: int = Column(SmallInteger, primary_key=True)
+    inserted: int = Column(BigInteger, nullable=False, server_default="0")
+    updated: int = Column(BigInteger, nullable=False, server_default="0")
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteDailyStats model."""
+        return (f"<QuoteDailyStats(day={self.day}, slot={self.slot}, "
+                f"inserted={self.inserted}, updated={self.updated})>")
+
+
+class QuoteStatsTotals(BaseEntity):
+    """Number of quotes, summed over the slots as in ``QuoteAuthorStats``.
+
+    Every write to ``quotes`` updates the row of its slot before any other
+    statistics. Writers only wait for each other when they share a slot,
+    and the ones that do cannot deadlock on the other statistics rows.
+    """
+
+    __tablename__ = "quote_stats_totals"
+
+    slot: int = Column(SmallInteger, primary_key=True)
+    quotes: int = Column(BigInteger, nullable=False, server_default="0")
+    updated_at: datetime = Column(
+        TIMESTAMP(),
+        nullable=False,
+        server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """String representation of the QuoteStatsTotals model."""
+        return f"<QuoteStatsTotals(quotes={self.quotes}, updated_at={self.updated_at!r})>"
+
+
+class CrawledPage(BaseEntity):
+    """State of a crawled page, remembered between crawls."""
+
+    __tablename__ = "crawled_pages"
+
+    url: str = Column(Text, primary_key=True)
+    etag: str | None = Column(Text, nullable=True)
+    last_modified: str | None = Column(Text, nullable=True)
+    content_length: int | None = Column(Integer, nullable=True)
+    links: list[str] | None = Column(ARRAY(Text), nullable=True)
+    fingerprint: str | None = Column(Text, nullable=True)
+    updated_at: datetime = Column(
+        TIMESTAMP(),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """String representation of the CrawledPage model."""
+        return f"<CrawledPage(url='{self.url}', etag={self.etag!r})>"
+
+
+class FrontierRequest(BaseEntity):
+    """A request of a crawl frontier shared by several workers.
+
+    Rows are never deleted during a crawl, so the table is also the
+    dupefilter of the crawl: a request is new only if no row with its
+    fingerprint exists. ``state`` moves from ``pending`` to ``claimed`` (by
+    ``worker``, until ``lease_expires_at``) to ``done``.
+    """
+
+    __tablename__ = "frontier_requests"
+
+    crawl_id: str = Column(Text, primary_key=True)
+    fingerprint: str = Column(Text, primary_key=True)
+    # Insertion order, used to hand out requests first in, first out
+    seq: int = Column(BigInteger, Identity(), nullable=False)
+    priority: int = Column(Integer, nullable=False, server_default="0")
+    # Serialized request, cleared once it is done
+    request: bytes | None = Column(LargeBinary, nullable=True)
+    state: str = Column(String(16), nullable=False, server_default="pending")
+    worker: str | None = Column(Text, nullable=True)
+    lease_expires_at: datetime | None = Column(TIMESTAMP(), nullable=True)
+    created_at: datetime = Column(
+        TIMESTAMP(),
+        nullable=False,
+        server_default=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """String representation of the FrontierRequest model."""
+        return (
+            f"<FrontierRequest(crawl_id='{self.crawl_id}', "
+            f"fingerprint='{self.fingerprint}', state='{self.state}')>"
+        )
+
+
+# Claiming the next batch of a crawl.
+Index(
+    "ix_frontier_requests_pending",
+    FrontierRequest.crawl_id,
+    FrontierRequest.priority.desc(),
+    FrontierRequest.seq,
+    postgresql_where=FrontierRequest.state == "pending",
+)
+
+# Finding expired leases of a crawl.
+Index(
+    "ix_frontier_requests_claimed",
+    FrontierRequest.crawl_id,
+    FrontierRequest.lease_expires_at,
+    postgresql_where=FrontierRequest.state == "claimed",
+)
+
+
+class CrawlCheckpoint(BaseEntity):
+    """Last saved state of a crawl that has not finished yet."""
+
+    __tablename__ = "crawl_checkpoints"
+
+    id: str = Column(Text, primary_key=True)
+    # Serialized crawl state
+    state: bytes = Column(LargeBinary, nullable=False)
+    updated_at: datetime = Column(
+        TIMESTAMP(),
+        nullable=False,
+        server_default=func.now(),
+        onupdate=func.now()
+    )
+
+    def __repr__(self) -> str:
+        """String representation of the CrawlCheckpoint model."""
+        return f"<CrawlCheckpoint(id='{self.id}', updated_at={self.updated_at!r})>"
@@ -0,0 +1,136 @@
+"""Find clusters of near-duplicate quotes.
+
+    python -m db.near_duplicates [--threshold 0.7]
+
+Computes the MinHash signatures of the quotes that have none, loads all
+signatures into an LSH index and stores the clusters of near duplicates in
+``quote_signatures.cluster_id``, see ``db.minhash``. Signatures of dropped
+quotes are pruned first. Uses the database configured by the
+``DATABASE_*`` environment variables.
+"""
+
+import argparse
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from db.database import sessionmanager
+from db.hashing import fingerprint
+from db.minhash import THRESHOLD, LSHIndex, MinHasher, from_bytes, to_bytes
+from db.repositories import QuoteSignaturesRepository
+
+
+def sign_quotes(session: Session, hasher: MinHasher | None = None, batch_size: int = 10000) -> int:
+    """Compute and store the signatures of the quotes that have none.
+
+    Args:
+        session: Database session
+        hasher: Hasher of the signatures, by default ``MinHasher()``
+        batch_size: Quotes signed per transaction
+
+    Returns:
+        Number of signed quotes
+    """
+    hasher = hasher or MinHasher()
+    signatures_repo = QuoteSignaturesRepository(session)
+    signed, after = 0, None
+    while quotes := signatures_repo.unsigned(after, batch_size):
+        quote_ids = [quote_id for quote_id, _ in quotes]
+        signatures = to_bytes(hasher.signatures([text for _, text in quotes]))
+        signatures_repo.save(dict(zip(quote_ids, signatures)))
+        signed += len(quotes)
+        after = quote_ids[-1]
+    return signed
+
+
+def load_index(
+    session: Session,
+    hasher: MinHasher | None = None,
+    max_bytes: int | None = None,
+) -> LSHIndex | None:
+    """Load the stored signatures into an LSH index.
+
+    Entry IDs are the ``db.hashing.fingerprint`` of the author and text
+    hash of the quotes.
+
+    Args:
+        session: Database session
+        hasher: Hasher of the signatures, by default ``MinHasher()``
+        max_bytes: Maximum memory for entries, or None for no limit
+
+    Returns:
+        The frozen index, or None if it would exceed ``max_bytes``
+    """
+    index = LSHIndex(hasher, max_bytes)
+    for rows in QuoteSignaturesRepository(session).iter_signatures():
+        ids = np.array(
+            [fingerprint(author, text_hash) for _, author, text_hash, _ in rows], dtype=np.uint64)
+        signatures = from_bytes([signature for *_, signature in rows], index.hasher.num_perm)
+        if not index.add(signatures, ids):
+            return None
+    index.freeze()
+    return index
+
+
+def cluster_quotes(session: Session, threshold: float = THRESHOLD) -> dict[str, int]:
+    """Sign the unsigned quotes and store the clusters of near duplicates.
+
+    The cluster ID of a quote is the ID of the oldest quote of its cluster.
+    The index of all signatures is held in memory while clustering, about
+    ``LSHIndex.entry_bytes`` per quote.
+
+    Args:
+        session: Database session
+        threshold: Minimum estimated similarity of near duplicates
+
+    Returns:
+        Numbers of ``pruned`` and ``signed`` signatures, of ``quotes``, of
+        quotes in a cluster (``clustered``) and of ``clusters``
+    """
+    hasher = MinHasher()
+    signatures_repo = QuoteSignaturesRepository(session)
+    pruned = signatures_repo.prune()
+    signed = sign_quotes(session, hasher)
+
+    index = LSHIndex(hasher)
+    quote_ids: list[uuid.UUID] = []
+    for rows in signatures_repo.iter_signatures():
+        quote_ids.extend(quote_id for quote_id, *_ in rows)
+        index.add(from_bytes([signature for *_, signature in rows], hasher.num_perm))
+    index.freeze()
+
+    # Labels are the positions of the oldest quotes of the clusters
+    labels = index.clusters(threshold)
+    clustered = np.flatnonzero(np.bincount(labels, minlength=len(labels))[labels] > 1)
+    clusters = {quote_ids[position]: quote_ids[labels[position]] for position in clustered.tolist()}
+    signatures_repo.set_clusters(clusters)
+
+    return {
+        "pruned": pruned,
+        "signed": signed,
+        "quotes": len(quote_ids),
+        "clustered": len(clusters),
+        "clusters": len(set(clusters.values())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--threshold", type=float, default=THRESHOLD,
+        help="minimum estimated similarity of near duplicates")
+    args = parser.parse_args()
+
+    with sessionmanager.sync_session() as session:
+        summary = cluster_quotes(session, args.threshold)
+
+    print(
+        f"Signed {summary['signed']} quotes, pruned {summary['pruned']} signatures; "
+        f"{summary['clustered']} of {summary['quotes']} quotes are in "
+        f"{summary['clusters']} clusters of near duplicates"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,25 @@
 """Database repositories package."""
 
-from db.repositories.quotes import QuotesRepository
+from db.repositories.checkpoints import CheckpointsRepository
+from db.repositories.crawled_pages import CrawledPagesRepository
+from db.repositories.frontier import FrontierRepository
+from db.repositories.quote_partitions import QuotePartition, QuotePartitionsRepository
+from db.repositories.quote_signatures import QuoteSignaturesRepository
+from db.repositories.quote_stats import DailyStats, QuoteStatsRepository, StatsMismatch
+from db.repositories.quotes import QuotesRepository, SearchCursor, SearchPage, UpsertResult
 
-__all__ = ["QuotesRepository"]
+__all__ = [
+    "CheckpointsRepository",
+    "CrawledPagesRepository",
+    "DailyStats",
+    "FrontierRepository",
+    "QuotePartition",
+    "QuotePartitionsRepository",
+    "QuoteSignaturesRepository",
+    "QuoteStatsRepository",
+    "QuotesRepository",
+    "SearchCursor",
+    "SearchPage",
+    "StatsMismatch",
+    "UpsertResult",
+]
@@ -0,0 +1,52 @@
+"""Crawl checkpoints repository for database operations."""
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db.models.orm import CrawlCheckpoint
+
+
+class CheckpointsRepository:
+    """Repository for managing CrawlCheckpoint entities.
+
+    Like ``FrontierRepository`` it works on a synchronous session: it is
+    used from the Scrapy scheduler, whose interface is synchronous.
+    """
+
+    def __init__(self, session: Session):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Database session
+        """
+        self.session = session
+
+    def get(self, checkpoint_id: str) -> bytes | None:
+        """Get the state saved by a checkpoint, if any."""
+        return self.session.execute(
+            select(CrawlCheckpoint.state).where(CrawlCheckpoint.id == checkpoint_id)
+        ).scalar()
+
+    def save(self, checkpoint_id: str, state: bytes):
+        """Save the state of a checkpoint, replacing the previous one."""
+        stmt = insert(CrawlCheckpoint).values(id=checkpoint_id, state=state)
+        self.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CrawlCheckpoint.id],
+                set_={"state": stmt.excluded.state, "updated_at": func.now()},
+            )
+        )
+        self.session.commit()
+
+    def delete(self, checkpoint_id: str) -> bool:
+        """Delete a checkpoint.
+
+        Returns:
+            True if the checkpoint existed
+        """
+        result = self.session.execute(
+            delete(CrawlCheckpoint).where(CrawlCheckpoint.id == checkpoint_id)
+        )
+        self.session.commit()
+        return result.rowcount > 0
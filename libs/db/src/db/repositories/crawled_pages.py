@@ -0,0 +1,64 @@
+"""Crawled pages repository for database operations."""
+
+from typing import Any, AsyncIterator, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db.models.orm import CrawledPage
+from db.repositories.quotes import CHUNK_SIZE, STREAM_BATCH_SIZE
+
+
+class CrawledPagesRepository:
+    """Repository for managing CrawledPage entities."""
+
+    def __init__(self, session: AsyncSession):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Async database session
+        """
+        self.session = session
+
+    async def iter_all(self, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[CrawledPage]:
+        """Stream all crawled pages through a server-side cursor.
+
+        Args:
+            batch_size: Number of rows fetched per round trip
+
+        Yields:
+            CrawledPage instances
+        """
+        result = await self.session.stream_scalars(
+            select(CrawledPage).execution_options(yield_per=batch_size)
+        )
+        async for page in result:
+            yield page
+
+    async def upsert_many(self, rows: Sequence[dict[str, Any]]) -> int:
+        """Insert or replace the state of many pages.
+
+        Every row must have the same keys, including ``url``; all other keys
+        overwrite the stored values.
+
+        Args:
+            rows: Mappings of CrawledPage column values
+
+        Returns:
+            The number of rows written
+        """
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[start:start + CHUNK_SIZE]
+            stmt = insert(CrawledPage).values(chunk)
+            columns = {key: stmt.excluded[key] for key in chunk[0] if key != "url"}
+            await self.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[CrawledPage.url],
+                    set_={**columns, "updated_at": func.now()},
+                )
+            )
+
+        await self.session.commit()
+
+        return len(rows)
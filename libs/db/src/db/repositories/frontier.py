@@ -0,0 +1,229 @@
+"""Crawl frontier repository for database operations."""
+
+from datetime import timedelta
+from typing import Any, Sequence
+
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from db.models.orm import FrontierRequest
+from db.repositories.quotes import CHUNK_SIZE
+
+
+class FrontierRepository:
+    """Repository for the shared crawl frontier.
+
+    Unlike the other repositories it works on a synchronous session: it is
+    used from the Scrapy scheduler, which runs it in the reactor's thread pool.
+    """
+
+    def __init__(self, session: Session):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Database session
+        """
+        self.session = session
+
+    def add_many(self, crawl_id: str, rows: Sequence[dict[str, Any]]) -> set[str]:
+        """Add requests that are not in the frontier yet.
+
+        Args:
+            crawl_id: Crawl the requests belong to
+            rows: Mappings with ``fingerprint``, ``priority`` and ``request``
+
+        Returns:
+            The fingerprints of the requests that were added; the others were
+            already known to the crawl
+        """
+        added = set()
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = [{**row, "crawl_id": crawl_id} for row in rows[start:start + CHUNK_SIZE]]
+            result = self.session.execute(
+                insert(FrontierRequest)
+                .values(chunk)
+                .on_conflict_do_nothing(
+                    index_elements=[FrontierRequest.crawl_id, FrontierRequest.fingerprint])
+                .returning(FrontierRequest.fingerprint)
+            )
+            added.update(result.scalars())
+
+        self.session.commit()
+
+        return added
+
+    def claim(
+        self, crawl_id: str, worker: str, limit: int, lease_seconds: float
+    ) -> list[tuple[str, bytes]]:
+        """Claim the next pending requests of a crawl for a worker.
+
+        Rows locked by concurrent claims are skipped, so workers never claim
+        the same request. Claims expire after ``lease_seconds`` unless
+        renewed.
+
+        Args:
+            crawl_id: Crawl to claim from
+            worker: Identifier of the claiming worker
+            limit: Maximum number of requests to claim
+            lease_seconds: Duration of the lease
+
+        Returns:
+            ``(fingerprint, request)`` pairs in queue order
+        """
+        claimable = (
+            select(FrontierRequest.fingerprint)
+            .where(
+                FrontierRequest.crawl_id == crawl_id,
+                FrontierRequest.state == "pending",
+            )
+            .order_by(FrontierRequest.priority.desc(), FrontierRequest.seq)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            # Materialized so the LIMIT is applied once, whatever the plan
+            .cte("claimable")
+            .prefix_with("MATERIALIZED")
+        )
+        result = self.session.execute(
+            update(FrontierRequest)
+            .where(
+                FrontierRequest.crawl_id == crawl_id,
+                FrontierRequest.fingerprint.in_(select(claimable.c.fingerprint)),
+            )
+            .values(
+                state="claimed",
+                worker=worker,
+                lease_expires_at=func.now() + timedelta(seconds=lease_seconds),
+            )
+            .returning(
+                FrontierRequest.fingerprint,
+                FrontierRequest.request,
+                FrontierRequest.priority,
+                FrontierRequest.seq,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        rows = sorted(result.all(), key=lambda row: (-row.priority, row.seq))
+
+        self.session.commit()
+
+        return [(row.fingerprint, row.request) for row in rows]
+
+    def renew(self, crawl_id: str, worker: str, lease_seconds: float) -> int:
+        """Extend the leases of all requests a worker holds.
+
+        Returns:
+            The number of renewed leases
+        """
+        result = self.session.execute(
+            update(FrontierRequest)
+            .where(
+                FrontierRequest.crawl_id == crawl_id,
+                FrontierRequest.state == "claimed",
+                FrontierRequest.worker == worker,
+            )
+            .values(lease_expires_at=func.now() + timedelta(seconds=lease_seconds))
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+        return result.rowcount
+
+    def mark_done(self, crawl_id: str, fingerprints: Sequence[str]) -> int:
+        """Mark requests as done and drop their serialized form.
+
+        Returns:
+            The number of requests marked done
+        """
+        return self._finish(
+            FrontierRequest.crawl_id == crawl_id,
+            FrontierRequest.fingerprint.in_(fingerprints),
+        )
+
+    def finish_claimed(self, crawl_id: str, worker: str) -> int:
+        """Mark every request a worker still holds as done.
+
+        Only safe once the worker has handed out and finished all of them;
+        requests that failed to download are left unfinished otherwise.
+
+        Returns:
+            The number of requests marked done
+        """
+        return self._finish(
+            FrontierRequest.crawl_id == crawl_id,
+            FrontierRequest.state == "claimed",
+            FrontierRequest.worker == worker,
+        )
+
+    def release(self, crawl_id: str, worker: str) -> int:
+        """Return the requests a worker holds to the pending queue.
+
+        Returns:
+            The number of released requests
+        """
+        return self._release(
+            FrontierRequest.crawl_id == crawl_id,
+            FrontierRequest.state == "claimed",
+            FrontierRequest.worker == worker,
+        )
+
+    def release_expired(self, crawl_id: str) -> int:
+        """Return requests whose lease expired, e.g. of a dead worker, to the queue.
+
+        Returns:
+            The number of released requests
+        """
+        return self._release(
+            FrontierRequest.crawl_id == crawl_id,
+            FrontierRequest.state == "claimed",
+            FrontierRequest.lease_expires_at < func.now(),
+        )
+
+    def has_unfinished(self, crawl_id: str) -> bool:
+        """Check whether a crawl has pending or claimed requests."""
+        return self.session.execute(
+            select(exists().where(
+                FrontierRequest.crawl_id == crawl_id,
+                FrontierRequest.state != "done",
+            ))
+        ).scalar()
+
+    def counts(self, crawl_id: str) -> dict[str, int]:
+        """Count the requests of a crawl by state."""
+        result = self.session.execute(
+            select(FrontierRequest.state, func.count())
+            .where(FrontierRequest.crawl_id == crawl_id)
+            .group_by(FrontierRequest.state)
+        )
+        return {state: count for state, count in result}
+
+    def delete_crawl(self, crawl_id: str) -> int:
+        """Delete all requests of a crawl.
+
+        Returns:
+            The number of deleted requests
+        """
+        result = self.session.execute(
+            delete(FrontierRequest).where(FrontierRequest.crawl_id == crawl_id)
+        )
+        self.session.commit()
+        return result.rowcount
+
+    def _finish(self, *conditions) -> int:
+        result = self.session.execute(
+            update(FrontierRequest)
+            .where(*conditions)
+            .values(state="done", request=None, worker=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+        return result.rowcount
+
+    def _release(self, *conditions) -> int:
+        result = self.session.execute(
+            update(FrontierRequest)
+            .where(*conditions)
+            .values(state="pending", worker=None, lease_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+        return result.rowcount
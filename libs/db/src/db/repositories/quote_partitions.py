@@ -0,0 +1,192 @@
+"""Quote partitions repository for database operations."""
+
+import re
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import column, delete, func, select, table, text
+from sqlalchemy.orm import Session
+
+from db.models.orm import Quote, QuoteKey
+from db.repositories.quote_stats import subtraction
+
+# Partition bounds as printed by pg_get_expr, e.g.
+# FOR VALUES FROM ('2025-10-01 00:00:00') TO ('2025-11-01 00:00:00')
+BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Partition of the quotes created in months without a partition of their own
+DEFAULT_PARTITION = f"{Quote.__tablename__}_default"
+
+
+@dataclass
+class QuotePartition:
+    """A partition of ``quotes``, holding the quotes created from ``start`` until ``end``."""
+
+    name: str
+    start: datetime
+    end: datetime
+
+
+class QuotePartitionsRepository:
+    """Repository for the monthly partitions of ``quotes``.
+
+    Like ``FrontierRepository`` it works on a synchronous session: the
+    partitions are maintained from Airflow tasks. Quotes created in a month
+    without a partition are stored in the default partition, so
+    ``create_upcoming`` should run ahead of time, e.g. daily, to keep it
+    empty.
+    """
+
+    def __init__(self, session: Session):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Database session
+        """
+        self.session = session
+
+    def partitions(self) -> list[QuotePartition]:
+        """List the monthly partitions, without the default partition.
+
+        Returns:
+            QuotePartition instances, oldest first
+        """
+        result = self.session.execute(text(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.oid = CAST(:table AS regclass)
+            """
+        ), {"table": Quote.__tablename__})
+
+        partitions = []
+        for name, bounds in result:
+            if name == DEFAULT_PARTITION:
+                continue
+            start, end = BOUNDS.search(bounds).groups()
+            partitions.append(QuotePartition(
+                name, datetime.fromisoformat(start), datetime.fromisoformat(end)))
+
+        return sorted(partitions, key=lambda partition: partition.start)
+
+    def create(self, start: datetime, end: datetime) -> list[QuotePartition]:
+        """Create the missing partitions of the months from ``start`` until ``end``.
+
+        Quotes of those months already stored in the default partition are
+        moved into the new partitions. Moving them fires no trigger on
+        ``quotes``, so the statistics and keys are left as they are.
+
+        Args:
+            start: Any time in the first month
+            end: Any time in the last month
+
+        Returns:
+            The created partitions, oldest first
+        """
+        existing = {partition.name for partition in self.partitions()}
+        months = self.session.scalars(select(func.generate_series(
+            func.date_trunc("month", start),
+            func.date_trunc("month", end),
+            text("interval '1 month'"),
+        ))).all()
+
+        created = []
+        for month in months:
+            partition = QuotePartition(
+                f"{Quote.__tablename__}_p{month:%Y%m}",
+                month,
+                month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1),
+            )
+            if partition.name in existing:
+                continue
+            # Attaching a partition checks that the default partition holds
+            # none of its quotes, so they are moved out first, with writers
+            # kept out of the default partition until the commit.
+            self.session.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE"))
+            self.session.execute(text(
+                f"CREATE TABLE {partition.name} "
+                f"(LIKE {Quote.__tablename__} INCLUDING DEFAULTS INCLUDING GENERATED)"
+            ))
+            self.session.execute(text(
+                f"""
+                WITH moved AS (
+                    DELETE FROM {DEFAULT_PARTITION}
+                    WHERE created_at >= :start AND created_at < :end
+                    RETURNING id, text, text_hash, author, tags, created_at, updated_at
+                )
+                INSERT INTO {partition.name} (id, text, text_hash, author, tags, created_at, updated_at)
+                SELECT * FROM moved
+                """
+            ), {"start": partition.start, "end": partition.end})
+            self.session.execute(text(
+                f"ALTER TABLE {Quote.__tablename__} ATTACH PARTITION {partition.name} "
+                f"FOR VALUES FROM ('{partition.start.isoformat()}') TO ('{partition.end.isoformat()}')"
+            ))
+            created.append(partition)
+
+        self.session.commit()
+
+        return created
+
+    def create_upcoming(self, months: int = 3) -> list[QuotePartition]:
+        """Create the missing partitions of this month and the next ``months``.
+
+        Months follow the clock of the database, which sets ``created_at``.
+
+        Args:
+            months: Months ahead of the current one
+
+        Returns:
+            The created partitions, oldest first
+        """
+        now = self.session.scalar(select(func.localtimestamp()))
+        upcoming = self.session.scalar(
+            select(func.localtimestamp() + text(f"interval '{int(months)} months'")))
+        return self.create(now, upcoming)
+
+    def drop_before(self, cutoff: datetime) -> list[QuotePartition]:
+        """Drop the partitions holding only quotes created before ``cutoff``.
+
+        Each partition is detached, its quotes are subtracted from the
+        statistics and their keys removed, and it is dropped, in one
+        transaction; no quote is deleted row by row. The default partition
+        is never dropped. Writes to ``quotes`` wait until the transaction
+        commits.
+
+        Args:
+            cutoff: Quotes created at or after this time are kept
+
+        Returns:
+            The dropped partitions, oldest first
+        """
+        dropped = []
+        for partition in self.partitions():
+            if partition.end > cutoff:
+                continue
+
+            # Detaching first waits for the writers in progress and keeps new
+            # ones out before the statistics are locked, the order in which
+            # writers lock them.
+            self.session.execute(text(
+                f"ALTER TABLE {Quote.__tablename__} DETACH PARTITION {partition.name}"))
+            detached = table(
+                partition.name,
+                column("author"),
+                column("text_hash"),
+                column("created_at"),
+                column("updated_at"),
+            )
+            for statement in subtraction(detached):
+                self.session.execute(statement)
+            self.session.execute(delete(QuoteKey).where(
+                QuoteKey.author == detached.c.author,
+                QuoteKey.text_hash == detached.c.text_hash,
+            ))
+            self.session.execute(text(f"DROP TABLE {partition.name}"))
+            self.session.commit()
+
+            dropped.append(partition)
+
+        return dropped
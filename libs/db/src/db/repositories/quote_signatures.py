@@ -0,0 +1,139 @@
+"""Quote signatures repository for database operations."""
+
+import uuid
+from typing import Iterator
+
+from sqlalchemy import bindparam, delete, exists, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, UUID, insert
+from sqlalchemy.orm import Session
+
+from db.models.orm import Quote, QuoteSignature
+
+
+class QuoteSignaturesRepository:
+    """Repository for the MinHash signatures of quotes, see ``db.minhash``.
+
+    Like ``QuotePartitionsRepository`` it works on a synchronous session:
+    signatures are computed and clustered from Airflow tasks, and loaded
+    into the LSH index of a crawl before it starts. Signatures are stored as
+    bytes; encoding and decoding them is up to the caller.
+    """
+
+    def __init__(self, session: Session):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Database session
+        """
+        self.session = session
+
+    def unsigned(
+        self,
+        after: uuid.UUID | None = None,
+        limit: int = 10000
+    ) -> list[tuple[uuid.UUID, str]]:
+        """List quotes without a signature, in order of ID.
+
+        Args:
+            after: Only list quotes with a greater ID, to page through them
+            limit: Maximum number of quotes
+
+        Returns:
+            ``(quote_id, text)`` tuples
+        """
+        query = (
+            select(Quote.id, Quote.text)
+            .where(~exists().where(QuoteSignature.quote_id == Quote.id))
+            .order_by(Quote.id)
+            .limit(limit)
+        )
+        if after is not None:
+            query = query.where(Quote.id > after)
+        return [tuple(row) for row in self.session.execute(query)]
+
+    def save(self, signatures: dict[uuid.UUID, bytes]):
+        """Store the signatures of quotes, replacing existing ones.
+
+        Args:
+            signatures: Signature of every quote ID
+        """
+        if not signatures:
+            return
+        statement = insert(QuoteSignature)
+        self.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[QuoteSignature.quote_id],
+                set_={"signature": statement.excluded.signature},
+            ),
+            [
+                {"quote_id": quote_id, "signature": signature}
+                for quote_id, signature in signatures.items()
+            ],
+        )
+        self.session.commit()
+
+    def iter_signatures(
+        self,
+        batch_size: int = 10000
+    ) -> Iterator[list[tuple[uuid.UUID, str, str, bytes]]]:
+        """Stream the signatures of all quotes, oldest quote first.
+
+        Rows are fetched through a server-side cursor, ``batch_size`` at a
+        time, so memory use does not grow with the table.
+
+        Args:
+            batch_size: Number of rows fetched per round trip
+
+        Yields:
+            Lists of ``(quote_id, author, text_hash, signature)`` tuples
+        """
+        result = self.session.execute(
+            select(Quote.id, Quote.author, Quote.text_hash, QuoteSignature.signature)
+            .join(QuoteSignature, QuoteSignature.quote_id == Quote.id)
+            .order_by(Quote.created_at, Quote.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for rows in result.partitions():
+            yield [tuple(row) for row in rows]
+
+    def prune(self) -> int:
+        """Delete the signatures of quotes that no longer exist.
+
+        Returns:
+            Number of deleted signatures
+        """
+        result = self.session.execute(
+            delete(QuoteSignature)
+            .where(~exists().where(Quote.id == QuoteSignature.quote_id))
+        )
+        self.session.commit()
+        return result.rowcount
+
+    def set_clusters(self, clusters: dict[uuid.UUID, uuid.UUID]):
+        """Replace the clusters of near duplicates.
+
+        Args:
+            clusters: Cluster ID of every quote in a cluster; the cluster of
+                all other quotes is cleared
+        """
+        self.session.execute(
+            update(QuoteSignature)
+            .where(QuoteSignature.cluster_id.is_not(None))
+            .values(cluster_id=None)
+        )
+        if clusters:
+            self.session.execute(
+                text(
+                    """
+                    UPDATE quote_signatures
+                    SET cluster_id = clusters.cluster_id
+                    FROM unnest(:quote_ids, :cluster_ids) AS clusters(quote_id, cluster_id)
+                    WHERE quote_signatures.quote_id = clusters.quote_id
+                    """
+                ).bindparams(
+                    bindparam("quote_ids", type_=ARRAY(UUID(as_uuid=True))),
+                    bindparam("cluster_ids", type_=ARRAY(UUID(as_uuid=True))),
+                ),
+                {"quote_ids": list(clusters), "cluster_ids": list(clusters.values())},
+            )
+        self.session.commit()
@@ -0,0 +1,317 @@
+"""Quote statistics repository."""
+
+from dataclasses import dataclass
+from datetime import date
+from typing import Any
+
+from sqlalchemy import BigInteger, FromClause, cast, delete, func, insert, literal, or_, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Executable
+
+from db.models.orm import Quote, QuoteAuthorStats, QuoteDailyStats, QuoteStatsTotals
+
+
+@dataclass
+class DailyStats:
+    """Quotes created and quotes last updated on a day, see ``QuoteDailyStats``."""
+
+    day: date
+    inserted: int
+    updated: int
+
+
+@dataclass
+class StatsMismatch:
+    """A statistic that differs from what the ``quotes`` table says."""
+
+    table: str
+    key: Any
+    stored: tuple[int, ...] | None
+    actual: tuple[int, ...] | None
+
+
+class QuoteStatsRepository:
+    """Repository for the quote statistics kept up to date by triggers on ``quotes``.
+
+    Reads sum the slots of the statistics, a handful of rows per author or
+    day whatever the size of ``quotes``. ``check`` and ``rebuild`` scan the
+    whole table.
+    """
+
+    def __init__(self, session: AsyncSession):
+        """Initialize the repository with a database session.
+
+        Args:
+            session: Async database session
+        """
+        self.session = session
+
+    async def total(self) -> int:
+        """Get the number of quotes."""
+        return await self.session.scalar(_total()) or 0
+
+    async def top_authors(self, limit: int = 10) -> list[tuple[str, int]]:
+        """Get the authors with the most quotes.
+
+        Args:
+            limit: Maximum number of authors to return
+
+        Returns:
+            ``(author, quotes)`` pairs, most quotes first
+        """
+        authors = _stored_author_counts().subquery()
+        result = await self.session.execute(
+            select(authors.c.author, authors.c.quotes)
+            .order_by(authors.c.quotes.desc(), authors.c.author)
+            .limit(limit)
+        )
+
+        return [(row.author, row.quotes) for row in result]
+
+    async def daily(self, since: date) -> list[DailyStats]:
+        """Get the daily statistics from a day on.
+
+        ``updated`` counts the quotes whose last update was on the day, not
+        the updates made that day.
+
+        Args:
+            since: First day to return
+
+        Returns:
+            DailyStats instances, oldest first; days without inserted or
+            updated quotes are missing
+        """
+        days = _stored_daily_counts().subquery()
+        result = await self.session.execute(
+            select(days.c.day, days.c.inserted, days.c.updated)
+            .where(days.c.day >= since)
+            .order_by(days.c.day)
+        )
+
+        return [DailyStats(row.day, row.inserted, row.updated) for row in result]
+
+    async def check(self) -> list[StatsMismatch]:
+        """Compare the statistics with statistics computed from ``quotes``.
+
+        Both are read from one snapshot, so concurrent writes do not show up
+        as mismatches.
+
+        Returns:
+            The statistics that differ, empty if all agree
+        """
+        await self.session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+        try:
+            mismatches = []
+
+            stored = _stored_author_counts().subquery()
+            actual = _author_counts().subquery()
+            result = await self.session.execute(
+                select(
+                    func.coalesce(stored.c.author, actual.c.author),
+                    stored.c.quotes,
+                    actual.c.quotes,
+                )
+                .select_from(stored.outerjoin(
+                    actual, stored.c.author == actual.c.author, full=True))
+                .where(stored.c.quotes.is_distinct_from(actual.c.quotes))
+            )
+            mismatches.extend(
+                StatsMismatch(
+                    QuoteAuthorStats.__tablename__, author,
+                    None if stored is None else (stored,),
+                    None if counted is None else (counted,),
+                )
+                for author, stored, counted in result
+            )
+
+            stored = _stored_daily_counts().subquery()
+            actual = _daily_counts().subquery()
+            result = await self.session.execute(
+                select(
+                    func.coalesce(stored.c.day, actual.c.day),
+                    stored.c.inserted,
+                    stored.c.updated,
+                    actual.c.inserted,
+                    actual.c.updated,
+                )
+                .select_from(stored.outerjoin(
+                    actual, stored.c.day == actual.c.day, full=True))
+                .where(or_(
+                    stored.c.inserted.is_distinct_from(actual.c.inserted),
+                    stored.c.updated.is_distinct_from(actual.c.updated),
+                ))
+            )
+            mismatches.extend(
+                StatsMismatch(
+                    QuoteDailyStats.__tablename__, day,
+                    None if stored_inserted is None else (stored_inserted, stored_updated),
+                    None if inserted is None else (inserted, updated),
+                )
+                for day, stored_inserted, stored_updated, inserted, updated in result
+            )
+
+            stored = await self.session.scalar(_total())
+            counted = await self.session.scalar(select(func.count()).select_from(Quote))
+            if stored != counted:
+                mismatches.append(StatsMismatch(
+                    QuoteStatsTotals.__tablename__, "quotes",
+                    None if stored is None else (stored,), (counted,)))
+        finally:
+            await self.session.rollback()
+
+        return mismatches
+
+    async def rebuild(self) -> int:
+        """Recompute the statistics from ``quotes``, in slot 0.
+
+        Writes to ``quotes`` wait until the statistics are rebuilt.
+
+        Returns:
+            The number of quotes
+        """
+        await self.session.execute(text(f"LOCK TABLE {Quote.__tablename__} IN SHARE MODE"))
+
+        authors = _author_counts().subquery()
+        await self.session.execute(delete(QuoteAuthorStats))
+        await self.session.execute(
+            insert(QuoteAuthorStats).from_select(
+                ["author", "slot", "quotes"],
+                select(authors.c.author, literal(0), authors.c.quotes),
+            )
+        )
+        days = _daily_counts().subquery()
+        await self.session.execute(delete(QuoteDailyStats))
+        await self.session.execute(
+            insert(QuoteDailyStats).from_select(
+                ["day", "slot", "inserted", "updated"],
+                select(days.c.day, literal(0), days.c.inserted, days.c.updated),
+            )
+        )
+
+        total = await self.session.scalar(select(func.count()).select_from(Quote))
+        await self.session.execute(delete(QuoteStatsTotals))
+        await self.session.execute(insert(QuoteStatsTotals).values(slot=0, quotes=total))
+
+        await self.session.commit()
+
+        return total
+
+
+def subtraction(source: FromClause) -> list[Executable]:
+    """Statements removing quotes from the statistics, for writes the triggers miss.
+
+    Run them in the transaction that removes the quotes, e.g. by detaching
+    the partition holding them.
+
+    Args:
+        source: Table or subquery with the ``author``, ``created_at`` and
+            ``updated_at`` columns of the quotes
+
+    Returns:
+        The statements, in the order they must run; they write the slot of
+        the connection, whose totals row is locked first, as by the triggers
+    """
+    slot = func.quote_stats_slot()
+    authors = _author_counts(source).subquery()
+    days = _daily_counts(source).subquery()
+
+    totals = pg_insert(QuoteStatsTotals).from_select(
+        ["slot", "quotes"], select(slot, -func.count()).select_from(source))
+    author_stats = pg_insert(QuoteAuthorStats).from_select(
+        ["author", "slot", "quotes"], select(authors.c.author, slot, -authors.c.quotes))
+    daily_stats = pg_insert(QuoteDailyStats).from_select(
+        ["day", "slot", "inserted", "updated"],
+        select(days.c.day, slot, -days.c.inserted, -days.c.updated),
+    )
+    return [
+        totals.on_conflict_do_update(
+            index_elements=[QuoteStatsTotals.slot],
+            set_={
+                "quotes": QuoteStatsTotals.quotes + totals.excluded.quotes,
+                "updated_at": func.now(),
+            },
+        ),
+        author_stats.on_conflict_do_update(
+            index_elements=[QuoteAuthorStats.author, QuoteAuthorStats.slot],
+            set_={"quotes": QuoteAuthorStats.quotes + author_stats.excluded.quotes},
+        ),
+        delete(QuoteAuthorStats).where(
+            QuoteAuthorStats.author.in_(select(authors.c.author)),
+            QuoteAuthorStats.slot == slot,
+            QuoteAuthorStats.quotes == 0,
+        ),
+        daily_stats.on_conflict_do_update(
+            index_elements=[QuoteDailyStats.day, QuoteDailyStats.slot],
+            set_={
+                "inserted": QuoteDailyStats.inserted + daily_stats.excluded.inserted,
+                "updated": QuoteDailyStats.updated + daily_stats.excluded.updated,
+            },
+        ),
+        delete(QuoteDailyStats).where(
+            QuoteDailyStats.day.in_(select(days.c.day)),
+            QuoteDailyStats.slot == slot,
+            QuoteDailyStats.inserted == 0,
+            QuoteDailyStats.updated == 0,
+        ),
+    ]
+
+
+def _total():
+    """Sum the quotes counted by the slots."""
+    return select(func.coalesce(_sum(QuoteStatsTotals.quotes), 0))
+
+
+def _stored_author_counts():
+    """Sum the quotes of each author over the slots; authors without quotes are left out."""
+    quotes = _sum(QuoteAuthorStats.quotes)
+    return (
+        select(QuoteAuthorStats.author, quotes.label("quotes"))
+        .group_by(QuoteAuthorStats.author)
+        .having(quotes != 0)
+    )
+
+
+def _stored_daily_counts():
+    """Sum the daily statistics over the slots; days without quotes are left out."""
+    inserted = _sum(QuoteDailyStats.inserted)
+    updated = _sum(QuoteDailyStats.updated)
+    return (
+        select(QuoteDailyStats.day, inserted.label("inserted"), updated.label("updated"))
+        .group_by(QuoteDailyStats.day)
+        .having(or_(inserted != 0, updated != 0))
+    )
+
+
+def _sum(column):
+    # The sum of bigints is numeric
+    return cast(func.sum(column), BigInteger)
+
+
+def _author_counts(source: FromClause = Quote.__table__):
+    """Count quotes by author."""
+    return (
+        select(source.c.author, func.count().label("quotes"))
+        .group_by(source.c.author)
+    )
+
+
+def _daily_counts(source: FromClause = Quote.__table__):
+    """Count quotes by the day they were created and by the day they were last updated."""
+    days = union_all(
+        select(
+            func.date(source.c.created_at).label("day"),
+            literal(1).label("inserted"),
+            literal(0).label("updated"),
+        ),
+        select(func.date(source.c.updated_at), literal(0), literal(1))
+        .where(source.c.updated_at > source.c.created_at),
+    ).subquery()
+    return (
+        select(
+            days.c.day,
+            func.sum(days.c.inserted).label("inserted"),
+            func.sum(days.c.updated).label("updated"),
+        )
+        .group_by(days.c.day)
+    )
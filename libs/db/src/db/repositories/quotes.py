@@ -1,11 +1,63 @@
 """Quotes repository for database operations."""
 
 import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal, Sequence
 
-from sqlalchemy import delete, select
+from sqlalchemy import String, Text, column, delete, exists, func, select, tuple_, update, values
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import Selectable
 
-from db.models.orm import Quote
+from db.hashing import hash_text
+from db.models.orm import Quote, QuoteStaging
+
+# Rows or IDs per statement; keeps bind parameters well below the
+# PostgreSQL protocol limit of 32767.
+CHUNK_SIZE = 1000
+
+# Rows fetched per round trip by the streaming methods
+STREAM_BATCH_SIZE = 1000
+
+# Columns written by the bulk upserts
+UPSERT_COLUMNS = ["text", "text_hash", "author", "tags"]
+
+# Attempts of a bulk upsert that keeps losing races to insert quotes
+CONFLICT_ATTEMPTS = 5
+
+# Text search configuration of queries; must match the one of
+# Quote.search_vector, or the GIN index cannot serve them
+SEARCH_CONFIG = "english"
+
+
+@dataclass
+class UpsertResult:
+    """Outcome of a bulk upsert."""
+
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+
+
+@dataclass(frozen=True)
+class SearchCursor:
+    """Position after the last quote of a page of search results."""
+
+    rank: float
+    id: uuid.UUID
+
+
+@dataclass
+class SearchPage:
+    """A page of full-text search results."""
+
+    quotes: list[Quote]
+    # Relevance of each quote, as computed by ts_rank
+    ranks: list[float]
+    # Continues the search after this page; None on the last page
+    cursor: SearchCursor | None = None
 
 
 class QuotesRepository:
@@ -23,7 +75,7 @@ class QuotesRepository:
         self,
         text: str,
         author: str,
-        tags: str
+        tags: list[str]
     ) -> Quote:
         """Create a new quote.
 
@@ -36,21 +88,44 @@ class QuotesRepository:
             The created Quote instance
 
         Raises:
-            ValueError: If a duplicate quote exists
+            IntegrityError: If a duplicate quote exists
         """
-
-        quote = Quote(
-            text=text,
-            author=author,
-            tags=tags
+        quote = await self.session.scalar(
+            insert(Quote)
+            .values(_quote_row({"text": text, "author": author, "tags": tags}))
+            .returning(Quote)
         )
 
-        self.session.add(quote)
         await self.session.commit()
-        await self.session.refresh(quote)
 
         return quote
 
+    async def create_many(self, rows: Sequence[dict[str, Any]]) -> list[Quote]:
+        """Create many quotes.
+
+        Args:
+            rows: Mappings with ``text``, ``author`` and ``tags`` keys and
+                optionally a precomputed ``text_hash``
+
+        Returns:
+            The created Quote instances, in input order
+
+        Raises:
+            IntegrityError: If any duplicate quote exists
+        """
+        quotes = []
+        for start in range(0, len(rows), CHUNK_SIZE):
+            chunk = [_quote_row(row) for row in rows[start:start + CHUNK_SIZE]]
+            result = await self.session.scalars(
+                insert(Quote).returning(Quote, sort_by_parameter_order=True),
+                chunk,
+            )
+            quotes.extend(result.all())
+
+        await self.session.commit()
+
+        return quotes
+
     async def delete(self, quote_id: uuid.UUID) -> bool:
         """Delete a quote by ID.
 
@@ -68,6 +143,26 @@ class QuotesRepository:
 
         return result.rowcount > 0
 
+    async def delete_many(self, quote_ids: Sequence[uuid.UUID]) -> int:
+        """Delete many quotes by ID.
+
+        Args:
+            quote_ids: The UUIDs of the quotes to delete
+
+        Returns:
+            The number of quotes deleted
+        """
+        deleted = 0
+        for start in range(0, len(quote_ids), CHUNK_SIZE):
+            result = await self.session.execute(
+                delete(Quote).where(Quote.id.in_(quote_ids[start:start + CHUNK_SIZE]))
+            )
+            deleted += result.rowcount
+
+        await self.session.commit()
+
+        return deleted
+
     async def get_by_id(self, quote_id: uuid.UUID) -> Quote | None:
         """Get a quote by ID.
 
@@ -83,9 +178,30 @@ class QuotesRepository:
 
         return result.scalar_one_or_none()
 
+    async def get_many_by_ids(self, quote_ids: Sequence[uuid.UUID]) -> list[Quote]:
+        """Get many quotes by ID.
+
+        Args:
+            quote_ids: The UUIDs of the quotes to retrieve
+
+        Returns:
+            The Quote instances found, in no particular order
+        """
+        quotes = []
+        for start in range(0, len(quote_ids), CHUNK_SIZE):
+            result = await self.session.scalars(
+                select(Quote).where(Quote.id.in_(quote_ids[start:start + CHUNK_SIZE]))
+            )
+            quotes.extend(result.all())
+
+        return quotes
+
     async def find_duplicate(self, text: str, author: str) -> Quote | None:
         """Check if a quote with the same text and author already exists.
 
+        Texts are compared by their normalized content hash, which is served
+        by the (author, text_hash) index of each partition.
+
         Args:
             text: The quote text to search for
             author: The quote author to search for
@@ -95,14 +211,239 @@ class QuotesRepository:
         """
         result = await self.session.execute(
             select(Quote).where(
-                Quote.text == text,
-                Quote.author == author
+                Quote.author == author,
+                Quote.text_hash == hash_text(text)
             )
         )
 
         return result.scalar_one_or_none()
 
-    async def update_tags(self, quote_id: uuid.UUID, tags: str) -> Quote:
+    async def get_tags_by_keys(
+        self,
+        keys: Sequence[tuple[str, str]]
+    ) -> dict[tuple[str, str], list[str]]:
+        """Get the stored tags of quotes by dedup key.
+
+        Served by the (author, text_hash) index of each partition, with one
+        statement per ``CHUNK_SIZE`` keys.
+
+        Args:
+            keys: ``(author, text_hash)`` pairs
+
+        Returns:
+            The tags of the quotes found, by ``(author, text_hash)``
+        """
+        tags = {}
+        for start in range(0, len(keys), CHUNK_SIZE):
+            result = await self.session.execute(
+                select(Quote.author, Quote.text_hash, Quote.tags).where(
+                    tuple_(Quote.author, Quote.text_hash).in_(keys[start:start + CHUNK_SIZE])
+                )
+            )
+            for author, text_hash, quote_tags in result:
+                tags[(author, text_hash)] = quote_tags
+
+        return tags
+
+    async def find_by_tags(
+        self,
+        tags: Sequence[str],
+        match: Literal["any", "all"] = "any",
+        limit: int = 100
+    ) -> list[Quote]:
+        """Find quotes by tag.
+
+        Both modes are served by the GIN index on ``tags``. No tags match no
+        quote in either mode.
+
+        Args:
+            tags: The tags to search for
+            match: ``"any"`` for quotes with at least one of the tags,
+                ``"all"`` for quotes with every tag
+            limit: Maximum number of quotes to return; use ``iter_all`` or
+                ``iter_since`` to go through many quotes
+
+        Returns:
+            The matching Quote instances, most recently updated first
+
+        Raises:
+            ValueError: If ``match`` is unknown or ``limit`` is not positive
+        """
+        if match == "any":
+            condition = Quote.tags.overlap(list(tags))
+        elif match == "all":
+            condition = Quote.tags.contains(list(tags))
+        else:
+            raise ValueError(f"Unknown tag match mode: {match}")
+        if limit < 1:
+            raise ValueError(f"limit must be positive, got {limit}")
+        # Every array contains the empty one
+        if not tags:
+            return []
+
+        result = await self.session.scalars(
+            select(Quote).where(condition).order_by(Quote.updated_at.desc()).limit(limit)
+        )
+
+        return list(result.all())
+
+    async def tag_counts(
+        self,
+        tags: Sequence[str] | None = None,
+        limit: int | None = None
+    ) -> list[tuple[str, int]]:
+        """Count quotes per tag.
+
+        Counting the given ``tags`` takes one statement, which reads only the
+        quotes with any of them through the GIN index. Without ``tags`` every
+        tag is counted, which has to read every row.
+
+        Args:
+            tags: The tags to count, or None for all tags
+            limit: Maximum number of tags to return, or None for all
+
+        Returns:
+            ``(tag, count)`` pairs, most frequent first, then by tag; given
+            tags without quotes count 0
+        """
+        if tags is not None and not tags:
+            return []
+
+        quotes = select(func.unnest(Quote.tags).label("tag"))
+        if tags is not None:
+            quotes = quotes.where(Quote.tags.overlap(list(tags)))
+        unnested = quotes.subquery()
+        count = func.count().label("count")
+        query = select(unnested.c.tag, count).group_by(unnested.c.tag)
+        if tags is not None:
+            # Other tags of the same quotes
+            query = query.where(unnested.c.tag.in_(list(tags)))
+        else:
+            query = query.order_by(count.desc(), unnested.c.tag)
+            if limit is not None:
+                query = query.limit(limit)
+
+        result = await self.session.execute(query)
+        counts = {row.tag: row.count for row in result}
+        if tags is None:
+            return list(counts.items())
+
+        pairs = sorted(
+            ((tag, counts.get(tag, 0)) for tag in dict.fromkeys(tags)),
+            key=lambda pair: (-pair[1], pair[0]),
+        )
+        return pairs[:limit] if limit is not None else pairs
+
+    async def search(
+        self,
+        query: str,
+        limit: int = 20,
+        cursor: SearchCursor | None = None
+    ) -> SearchPage:
+        """Find quotes whose text or author match a full-text search query.
+
+        ``query`` uses web search syntax: words, ``"quoted phrases"``,
+        ``or`` and ``-excluded`` words. Matches are found with the GIN index
+        on ``search_vector`` and ranked by ``ts_rank``, text matches above
+        author matches. Pages are keyset-paginated on ``(rank, id)``, so a
+        page costs the same however deep it is; every page still ranks all
+        the matches.
+
+        Args:
+            query: The search query
+            limit: Maximum number of quotes per page
+            cursor: The cursor of the previous page, or None for the first
+
+        Returns:
+            The page of matching quotes, best match first
+        """
+        tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        rank = func.ts_rank(Quote.search_vector, tsquery)
+
+        statement = select(Quote, rank).where(Quote.search_vector.bool_op("@@")(tsquery))
+        if cursor is not None:
+            statement = statement.where(tuple_(rank, Quote.id) < tuple_(cursor.rank, cursor.id))
+        # One more row tells whether there is a next page
+        statement = statement.order_by(rank.desc(), Quote.id.desc()).limit(limit + 1)
+
+        rows = (await self.session.execute(statement)).all()
+        page = SearchPage(
+            quotes=[quote for quote, _ in rows[:limit]],
+            ranks=[quote_rank for _, quote_rank in rows[:limit]],
+        )
+        if len(rows) > limit:
+            page.cursor = SearchCursor(page.ranks[-1], page.quotes[-1].id)
+
+        return page
+
+    async def iter_all(self, batch_size: int = STREAM_BATCH_SIZE) -> AsyncIterator[Quote]:
+        """Stream all quotes.
+
+        Rows are fetched through a server-side cursor, ``batch_size`` at a
+        time, so memory use does not grow with the table.
+
+        Args:
+            batch_size: Number of rows fetched per round trip
+
+        Yields:
+            Quote instances
+        """
+        async for quote in self._stream(select(Quote), batch_size):
+            yield quote
+
+    async def iter_since(
+        self,
+        updated_at: datetime,
+        batch_size: int = STREAM_BATCH_SIZE
+    ) -> AsyncIterator[Quote]:
+        """Stream quotes created or updated at or after a point in time.
+
+        Args:
+            updated_at: Only quotes with ``updated_at`` at or after this time
+            batch_size: Number of rows fetched per round trip
+
+        Yields:
+            Quote instances, oldest update first
+        """
+        query = (
+            select(Quote)
+            .where(Quote.updated_at >= updated_at)
+            .order_by(Quote.updated_at)
+        )
+        async for quote in self._stream(query, batch_size):
+            yield quote
+
+    async def iter_keys(
+        self,
+        batch_size: int = 10000
+    ) -> AsyncIterator[tuple[str, str, list[str]]]:
+        """Stream the dedup keys of all quotes.
+
+        Rows are fetched through a server-side cursor, ``batch_size`` at a
+        time, so memory use does not grow with the table.
+
+        Args:
+            batch_size: Number of rows fetched per round trip
+
+        Yields:
+            ``(author, text_hash, tags)`` tuples
+        """
+        result = await self.session.stream(
+            select(Quote.author, Quote.text_hash, Quote.tags)
+            .execution_options(yield_per=batch_size)
+        )
+        async for author, text_hash, tags in result:
+            yield author, text_hash, tags
+
+    async def _stream(self, query, batch_size: int) -> AsyncIterator[Quote]:
+        """Stream the ORM results of a query through a server-side cursor."""
+        result = await self.session.stream_scalars(
+            query.execution_options(yield_per=batch_size)
+        )
+        async for quote in result:
+            yield quote
+
+    async def update_tags(self, quote_id: uuid.UUID, tags: list[str]) -> Quote:
         """Update the tags of a quote.
 
         Args:
@@ -111,13 +452,203 @@ class QuotesRepository:
 
         Returns:
             The updated Quote instance
+
+        Raises:
+            ValueError: If the quote does not exist
         """
-        quote = await self.get_by_id(quote_id)
+        quote = await self.session.scalar(
+            update(Quote)
+            .where(Quote.id == quote_id)
+            .values(tags=tags)
+            .returning(Quote)
+        )
         if quote is None:
             raise ValueError("Quote not found")
 
-        quote.tags = tags
         await self.session.commit()
-        await self.session.refresh(quote)
 
         return quote
+
+    async def upsert_many(self, rows: Sequence[dict[str, Any]]) -> UpsertResult:
+        """Insert new quotes and update the tags of existing ones.
+
+        Rows are written in chunks of ``CHUNK_SIZE``, each with a single
+        statement, see ``_merge``, and committed once. Existing quotes whose
+        tags did not change are left untouched.
+
+        Args:
+            rows: Mappings with ``text``, ``author`` and ``tags`` keys and
+                optionally a precomputed ``text_hash``
+
+        Returns:
+            Counts of inserted, updated and unchanged rows
+        """
+        if not rows:
+            return UpsertResult()
+
+        unique_rows = _unique_quote_rows(rows)
+
+        async def write() -> UpsertResult:
+            result = UpsertResult(unchanged=len(rows) - len(unique_rows))
+            for start in range(0, len(unique_rows), CHUNK_SIZE):
+                chunk = unique_rows[start:start + CHUNK_SIZE]
+                source = values(
+                    column("text", String),
+                    column("text_hash", String),
+                    column("author", String),
+                    column("tags", ARRAY(Text)),
+                    name="source",
+                ).data([tuple(row[name] for name in UPSERT_COLUMNS) for row in chunk])
+                inserted, updated = await self._merge(source)
+                result.inserted += inserted
+                result.updated += updated
+                result.unchanged += len(chunk) - inserted - updated
+            return result
+
+        return await self._retry_conflicts(write)
+
+    async def copy_upsert_many(self, rows: Sequence[dict[str, Any]]) -> UpsertResult:
+        """Insert new quotes and update the tags of existing ones through COPY.
+
+        Same outcome as ``upsert_many``, for large batches: the rows are
+        loaded into the unlogged ``quotes_staging`` table with ``COPY`` and
+        merged into ``quotes`` with a single statement, all in one
+        transaction. Requires the asyncpg driver.
+
+        Args:
+            rows: Mappings with ``text``, ``author`` and ``tags`` keys and
+                optionally a precomputed ``text_hash``
+
+        Returns:
+            Counts of inserted, updated and unchanged rows
+        """
+        if not rows:
+            return UpsertResult()
+
+        unique_rows = _unique_quote_rows(rows)
+
+        async def write() -> UpsertResult:
+            # The transaction ID keeps the rows of concurrent batches apart.
+            # Running it also begins the transaction the COPY below joins.
+            batch_id = await self.session.scalar(select(func.txid_current()))
+            connection = await self.session.connection()
+            raw_connection = await connection.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                QuoteStaging.__tablename__,
+                records=(
+                    (batch_id, position, row["text"], row["text_hash"], row["author"], row["tags"])
+                    for position, row in enumerate(unique_rows)
+                ),
+                columns=["batch_id", "position", *UPSERT_COLUMNS],
+            )
+
+            inserted, updated = await self._merge(
+                select(*(QuoteStaging.__table__.c[name] for name in UPSERT_COLUMNS))
+                .where(QuoteStaging.batch_id == batch_id)
+            )
+            await self.session.execute(
+                delete(QuoteStaging).where(QuoteStaging.batch_id == batch_id)
+            )
+
+            return UpsertResult(
+                inserted=inserted,
+                updated=updated,
+                unchanged=len(rows) - inserted - updated,
+            )
+
+        return await self._retry_conflicts(write)
+
+    async def _merge(self, source: Selectable) -> tuple[int, int]:
+        """Insert the new quotes of ``source`` and update the tags of the others.
+
+        ``quotes`` is partitioned, so it has no unique index to arbitrate an
+        ``INSERT ... ON CONFLICT``. Instead, one statement updates the
+        existing quotes whose tags changed and inserts the quotes whose key
+        is in no partition.
+
+        Args:
+            source: Rows with the ``UPSERT_COLUMNS`` columns and unique keys
+
+        Returns:
+            The numbers of inserted and updated quotes
+        """
+        source = source.cte("source")
+        updated = (
+            update(Quote)
+            .where(
+                Quote.author == source.c.author,
+                Quote.text_hash == source.c.text_hash,
+                Quote.tags.is_distinct_from(source.c.tags),
+            )
+            .values(tags=source.c.tags, updated_at=func.now())
+            .returning(Quote.id)
+            .cte("updated")
+        )
+        inserted = (
+            insert(Quote)
+            .from_select(
+                UPSERT_COLUMNS,
+                select(*(source.c[name] for name in UPSERT_COLUMNS)).where(
+                    ~exists().where(
+                        Quote.author == source.c.author,
+                        Quote.text_hash == source.c.text_hash,
+                    )
+                ),
+            )
+            .returning(Quote.id)
+            .cte("inserted")
+        )
+
+        counts = await self.session.execute(select(
+            select(func.count()).select_from(inserted).scalar_subquery(),
+            select(func.count()).select_from(updated).scalar_subquery(),
+        ))
+        return tuple(counts.one())
+
+    async def _retry_conflicts(self, write: Callable[[], Awaitable[UpsertResult]]) -> UpsertResult:
+        """Run and commit a bulk write, again while it loses races to insert a quote.
+
+        ``_merge`` does not see the quotes inserted by concurrent
+        transactions that have not committed yet; inserting one of them
+        again fails the uniqueness check of ``quotes``. The next attempt
+        sees the quote and updates it instead, but may lose a race for
+        another one, so up to ``CONFLICT_ATTEMPTS`` attempts are made.
+
+        Raises:
+            IntegrityError: If the last attempt lost a race as well
+        """
+        for attempt in range(1, CONFLICT_ATTEMPTS + 1):
+            try:
+                result = await write()
+                break
+            except IntegrityError:
+                await self.session.rollback()
+                if attempt == CONFLICT_ATTEMPTS:
+                    raise
+
+        await self.session.commit()
+
+        return result
+
+
+def _unique_quote_rows(rows: Sequence[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Build the column values of quotes, keeping the last row of each key.
+
+    A single statement may not affect the same row twice, so duplicate keys
+    within a batch are collapsed before it is written.
+    """
+    keyed_rows = {}
+    for row in rows:
+        row = _quote_row(row)
+        keyed_rows[(row["author"], row["text_hash"])] = row
+    return list(keyed_rows.values())
+
+
+def _quote_row(row: dict[str, Any]) -> dict[str, Any]:
+    """Build the column values of a quote, hashing its text if needed."""
+    return {
+        "text": row["text"],
+        "text_hash": row.get("text_hash") or hash_text(row["text"]),
+        "author": row["author"],
+        "tags": row["tags"],
+    }
@@ -0,0 +1,62 @@
+"""Check or rebuild the quote statistics.
+
+    python -m db.stats check
+    python -m db.stats rebuild
+
+``check`` exits with status 1 if the statistics differ from what the
+``quotes`` table says. ``rebuild`` recomputes them from scratch, holding off
+writes to ``quotes`` while it runs. Both scan the whole table. Uses the
+database configured by the ``DATABASE_*`` environment variables.
+"""
+
+import argparse
+import asyncio
+import sys
+
+from db.database import sessionmanager
+from db.repositories import QuoteStatsRepository
+
+
+async def check() -> int:
+    """Print the statistics that differ from ``quotes``.
+
+    Returns:
+        The exit status, 1 if any statistic differs
+    """
+    async with sessionmanager.session() as session:
+        mismatches = await QuoteStatsRepository(session).check()
+    await sessionmanager.close()
+
+    for mismatch in mismatches:
+        print(
+            f"{mismatch.table} {mismatch.key}: "
+            f"stored {mismatch.stored}, counted {mismatch.actual}")
+    print(f"{len(mismatches)} statistics differ" if mismatches else "Statistics agree")
+    return 1 if mismatches else 0
+
+
+async def rebuild() -> int:
+    """Recompute the statistics from ``quotes``.
+
+    Returns:
+        The exit status
+    """
+    async with sessionmanager.session() as session:
+        total = await QuoteStatsRepository(session).rebuild()
+    await sessionmanager.close()
+
+    print(f"Statistics rebuilt for {total} quotes")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["check", "rebuild"])
+    args = parser.parse_args()
+
+    commands = {"check": check, "rebuild": rebuild}
+    sys.exit(asyncio.run(commands[args.command]()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import OperationalError
+
+from scraper.testing import QuotesSite
+
+
+@pytest.fixture
+def quotes_site():
+    """A running stand-in quotes site with default dimensions."""
+    with QuotesSite() as site:
+        yield site
+
+
+@pytest.fixture
+def sync_session_factory():
+    """Blocking sessions on the configured, migrated database.
+
+    Tests using it are skipped when PostgreSQL is not reachable.
+    """
+    from scraper.dependencies import get_sync_session_factory
+
+    factory = get_sync_session_factory()
+    try:
+        with factory() as session:
+            session.execute(text("SELECT 1"))
+            inspector = inspect(session.connection())
+            migrated = all(
+                inspector.has_table(table)
+                for table in ("frontier_requests", "crawl_checkpoints")
+            )
+    except OperationalError:
+        pytest.skip("PostgreSQL is not available")
+    if not migrated:
+        pytest.skip("Database migrations are not applied")
+    return factory
+
+
+@pytest.fixture
+def synthetic_quotes(sync_session_factory):
+    """The ``sync_session_factory``, with synthetic quotes removed before and after.
+
+    Synthetic quotes are the ones whose text or author starts with
+    "Synthetic", as written by the stand-in site and the tests. Signatures
+    left without a quote are removed with them.
+    """
+    statements = [
+        text(
+            "DELETE FROM quotes WHERE text LIKE '“Synthetic%' "
+            "OR text LIKE '\"Synthetic%' OR author LIKE 'Synthetic%'"),
+        text(
+            "DELETE FROM quote_signatures WHERE NOT EXISTS "
+            "(SELECT FROM quotes WHERE quotes.id = quote_signatures.quote_id)"),
+    ]
+
+    def cleanup():
+        with sync_session_factory() as session:
+            for statement in statements:
+                session.execute(statement)
+            session.commit()
+
+    cleanup()
+    yield sync_session_factory
+    cleanup()
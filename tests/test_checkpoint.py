@@ -0,0 +1,83 @@
+import pickle
+import time
+import uuid
+from collections import Counter
+
+import pytest
+
+from db.repositories import CheckpointsRepository
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl, start_crawl
+
+
+@pytest.fixture
+def checkpoint_id(sync_session_factory):
+    """A fresh checkpoint ID, its checkpoint deleted afterwards."""
+    checkpoint_id = f"test-{uuid.uuid4().hex}"
+    yield checkpoint_id
+    with sync_session_factory() as session:
+        CheckpointsRepository(session).delete(f"{checkpoint_id}:quotes")
+
+
+def checkpoint_settings(checkpoint_id: str) -> dict:
+    return {
+        "CHECKPOINT_ID": checkpoint_id,
+        "CHECKPOINT_INTERVAL": 0.1,
+        "SCHEDULER": "scraper.checkpoint.CheckpointScheduler",
+        "SPIDER_MIDDLEWARES": {"scraper.middlewares.CheckpointMiddleware": 20},
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 1,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+class TestCheckpoint:
+    """Crawls interrupted and resumed from their checkpoint."""
+
+    def test_resumed_crawl_fetches_only_the_remaining_pages(
+        self, sync_session_factory, checkpoint_id
+    ):
+        settings = checkpoint_settings(checkpoint_id)
+        key = f"{checkpoint_id}:quotes"
+        with QuotesSite(pages=30, quotes_per_page=2, latency=0.05) as site:
+            process, _ = start_crawl(QuotesSpider, settings, start_urls=[site.page_url(1)])
+            deadline = time.monotonic() + 60
+            while len(site.requests) < 10 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            with sync_session_factory() as session:
+                assert CheckpointsRepository(session).get(key) is not None
+            # No chance to save anything on the way out
+            process.kill()
+            process.join()
+            killed = Counter(site.requests)
+            site.requests.clear()
+
+            stats = run_crawl(QuotesSpider, settings, start_urls=[site.page_url(1)])
+            resumed = Counter(site.requests)
+
+        assert stats["checkpoint/resumed"] == 1
+        assert stats["checkpoint/start_skipped"] == 1
+        assert 10 <= sum(killed.values()) < 30
+        assert all(killed[f"/page/{n}/"] or resumed[f"/page/{n}/"] for n in range(1, 31))
+        # Only the page in progress and the ones fetched since the last
+        # checkpoint are fetched again.
+        assert "/page/1/" not in resumed
+        assert len(set(killed) & set(resumed)) <= 3
+        assert all(count == 1 for count in resumed.values())
+
+        # A finished crawl leaves no checkpoint behind
+        with sync_session_factory() as session:
+            assert CheckpointsRepository(session).get(key) is None
+
+    def test_unreadable_checkpoint_is_ignored(self, sync_session_factory, checkpoint_id):
+        settings = checkpoint_settings(checkpoint_id)
+        with sync_session_factory() as session:
+            # Saved before checkpoints were stored as JSON
+            CheckpointsRepository(session).save(
+                f"{checkpoint_id}:quotes", pickle.dumps({"start": 1}))
+        with QuotesSite(pages=3, quotes_per_page=2) as site:
+            stats = run_crawl(QuotesSpider, settings, start_urls=[site.page_url(1)])
+            requests = set(site.requests)
+
+        assert "checkpoint/resumed" not in stats
+        assert requests == {f"/page/{n}/" for n in range(1, 4)}
@@ -0,0 +1,18 @@
+from benchmarks.crawl import run
+
+
+class TestCrawlBenchmark:
+    """The crawl benchmark runs QuotesSpider end to end without a network."""
+
+    def test_stand_in_crawl_reports_throughput(self):
+        result = run(pages=5, quotes_per_page=4, write_latency=0.0, timeout=60)
+
+        assert result["pages"] >= 5
+        assert result["items"] >= 20
+        # Every distinct quote reached the stand-in database once.
+        assert result["db_rows"] == 20
+        assert result["db_rows_failed"] == 0
+        assert result["pages_per_sec"] > 0
+        assert result["items_per_sec"] > 0
+        assert result["db_rows_per_sec"] > 0
+        assert result["peak_rss_mb"] > 0
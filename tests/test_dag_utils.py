@@ -0,0 +1,65 @@
+import json
+import shlex
+
+from datetime import datetime
+
+from dags.scraper_dag.utils.crawl_utils import is_full_crawl, merge_crawl_stats, shard_commands
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+
+class TestCrawlUtils:
+    """Sharding the crawl and merging the shards' stats."""
+
+    def test_shard_commands_pass_the_partition(self):
+        commands = shard_commands(3)
+
+        assert len(commands) == 3
+        crawl = shlex.split(shlex.split(commands[1])[2])
+        assert crawl[:5] == ["python", "-m", "scrapy", "crawl", "quotes"]
+        assert "shard=1" in crawl and "shards=3" in crawl
+        assert "INCREMENTAL_CRAWL_ENABLED=False" in crawl
+        assert "QUOTES_NEAR_DUPLICATES_SIGN=False" in crawl
+
+    def test_full_crawl_once_per_interval(self):
+        days = [datetime(2025, 1, day) for day in range(1, 29)]
+
+        assert sum(is_full_crawl(day, 7) for day in days) == 4
+        assert all(is_full_crawl(day, 1) for day in days)
+
+    def test_merge_sums_counters_and_keeps_process_maxima(self):
+        merged = merge_crawl_stats([
+            {"item_scraped_count": 10, "memusage/max": 100, "finish_reason": "finished",
+             "stages/db/items": 10, "stages/db/p95_ms": 12.5,
+             "start_time": "2025-01-01T02:00:01+00:00",
+             "finish_time": "2025-01-01T02:05:00+00:00"},
+            {"item_scraped_count": 5, "memusage/max": 300, "finish_reason": "shutdown",
+             "stages/db/items": 5, "stages/db/p95_ms": 40.0,
+             "start_time": "2025-01-01T02:00:00+00:00",
+             "finish_time": "2025-01-01T02:04:00+00:00"},
+        ])
+
+        assert merged["item_scraped_count"] == 15
+        assert merged["memusage/max"] == 300
+        assert merged["stages/db/items"] == 15
+        assert merged["stages/db/p95_ms"] == 40.0
+        assert merged["start_time"] == "2025-01-01T02:00:00+00:00"
+        assert merged["finish_time"] == "2025-01-01T02:05:00+00:00"
+        assert merged["finish_reason"] == "shutdown"
+        assert merged["finish_reasons"] == {"finished": 1, "shutdown": 1}
+        assert merged["shards"] == 2
+
+    def test_merges_stats_exported_by_shards(self, tmp_path):
+        settings = {"ROBOTSTXT_OBEY": False, "LOG_LEVEL": "WARNING",
+                    "EXTENSIONS": {"scraper.extensions.StatsExport": 500}}
+        with QuotesSite(pages=6, quotes_per_page=2) as site:
+            for shard in range(2):
+                run_crawl(
+                    QuotesSpider,
+                    {**settings, "STATS_EXPORT_PATH": str(tmp_path / f"{shard}.json")},
+                    shard=shard, shards=2, start_urls=[site.page_url(1)])
+
+        merged = merge_crawl_stats(
+            [json.loads((tmp_path / f"{shard}.json").read_text()) for shard in range(2)])
+        assert merged["item_scraped_count"] == 12
+        assert merged["finish_reason"] == "finished"
@@ -0,0 +1,60 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from db.database import DatabaseSessionManager
+
+
+class TestDatabaseSessionManager:
+    """Pool configuration and metrics of the shared session manager."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, sync_session_factory):
+        self.manager = DatabaseSessionManager(pool_size=1, max_overflow=0, pool_timeout=0.5)
+        yield
+        self.manager.sync_engine.dispose()
+
+    def test_counts_checkouts_and_connections_in_use(self):
+        with self.manager.sync_session() as session:
+            session.execute(text("SELECT 1"))
+            assert self.manager.pool_metrics()["sync"]["in_use"] == 1
+        with self.manager.sync_session() as session:
+            session.execute(text("SELECT 1"))
+
+        metrics = self.manager.pool_metrics()["sync"]
+        assert metrics["checkouts"] == 2
+        assert metrics["max_in_use"] == 1
+        assert metrics["in_use"] == 0
+        assert metrics["idle"] == 1
+        assert "async" not in self.manager.pool_metrics()
+
+    def test_measures_waits_for_a_busy_pool(self):
+        held = threading.Event()
+
+        def hold_connection():
+            with self.manager.sync_session() as session:
+                session.execute(text("SELECT 1"))
+                held.set()
+                time.sleep(0.2)
+
+        thread = threading.Thread(target=hold_connection)
+        thread.start()
+        held.wait()
+        with self.manager.sync_session() as session:
+            session.execute(text("SELECT 1"))
+        thread.join()
+
+        with self.manager.sync_session() as session:
+            session.execute(text("SELECT 1"))
+            with pytest.raises(PoolTimeoutError):
+                with self.manager.sync_engine.connect():
+                    pass
+
+        metrics = self.manager.pool_metrics()["sync"]
+        assert metrics["checkouts"] == 3
+        assert metrics["timeouts"] == 1
+        assert metrics["max_wait_seconds"] >= 0.4
+        assert metrics["wait_seconds"] >= 0.5 + 0.1
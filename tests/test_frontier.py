@@ -0,0 +1,153 @@
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from scrapy import Request
+
+from db.repositories import FrontierRepository
+from scraper.serialization import decode_request, dumps, encode_request, loads
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+
+@pytest.fixture
+def crawl_id(sync_session_factory):
+    """A fresh frontier crawl, deleted afterwards."""
+    crawl_id = f"test-{uuid.uuid4().hex}"
+    yield crawl_id
+    with sync_session_factory() as session:
+        FrontierRepository(session).delete_crawl(crawl_id)
+
+
+def rows(*fingerprints: str) -> list[dict]:
+    return [{"fingerprint": fp, "priority": 0, "request": fp.encode()} for fp in fingerprints]
+
+
+class TestFrontierRepository:
+    """Queue, dupefilter and lease semantics of the frontier table."""
+
+    def test_add_many_filters_known_fingerprints(self, sync_session_factory, crawl_id):
+        with sync_session_factory() as session:
+            repository = FrontierRepository(session)
+
+            assert repository.add_many(crawl_id, rows("a", "b")) == {"a", "b"}
+            assert repository.add_many(crawl_id, rows("b", "c")) == {"c"}
+            # Done requests still count as seen
+            repository.claim(crawl_id, "worker", 10, 60)
+            repository.mark_done(crawl_id, ["a", "b", "c"])
+            assert repository.add_many(crawl_id, rows("a")) == set()
+
+    def test_workers_claim_disjoint_batches_in_queue_order(
+        self, sync_session_factory, crawl_id
+    ):
+        with sync_session_factory() as first, sync_session_factory() as second:
+            FrontierRepository(first).add_many(crawl_id, rows("a", "b", "c", "d", "e"))
+
+            claimed_first = FrontierRepository(first).claim(crawl_id, "w1", 2, 60)
+            claimed_second = FrontierRepository(second).claim(crawl_id, "w2", 10, 60)
+
+        assert [fp for fp, _ in claimed_first] == ["a", "b"]
+        assert [fp for fp, _ in claimed_second] == ["c", "d", "e"]
+        assert claimed_first[0][1] == b"a"
+
+    def test_expired_leases_are_recovered(self, sync_session_factory, crawl_id):
+        with sync_session_factory() as session:
+            repository = FrontierRepository(session)
+            repository.add_many(crawl_id, rows("a", "b"))
+
+            # A worker claims everything and dies without renewing its lease
+            repository.claim(crawl_id, "dead", 10, lease_seconds=0)
+            assert repository.claim(crawl_id, "alive", 10, 60) == []
+
+            assert repository.release_expired(crawl_id) == 2
+            assert [fp for fp, _ in repository.claim(crawl_id, "alive", 10, 60)] == ["a", "b"]
+            assert repository.counts(crawl_id) == {"claimed": 2}
+
+    def test_release_and_finish_only_touch_the_workers_claims(
+        self, sync_session_factory, crawl_id
+    ):
+        with sync_session_factory() as session:
+            repository = FrontierRepository(session)
+            repository.add_many(crawl_id, rows("a", "b", "c"))
+            repository.claim(crawl_id, "w1", 1, 60)
+            repository.claim(crawl_id, "w2", 1, 60)
+
+            assert repository.release(crawl_id, "w1") == 1
+            assert repository.finish_claimed(crawl_id, "w2") == 1
+            assert repository.counts(crawl_id) == {"pending": 2, "done": 1}
+            assert repository.has_unfinished(crawl_id)
+
+
+class TestRequestSerialization:
+    """Requests stored in the frontier as JSON."""
+
+    def test_round_trip(self):
+        spider = QuotesSpider()
+        request = Request(
+            "https://quotes.toscrape.com/page/2/", callback=spider.parse, priority=3,
+            body=b"\xff\x00", headers={"If-None-Match": '"abc"'},
+            meta={"page": 2, "token": b"\x01"}, cb_kwargs={"shard": 1})
+
+        payload = dumps(encode_request(request, spider))
+        restored = decode_request(loads(payload), spider)
+
+        assert payload.startswith(b"{")
+        assert restored.url == request.url
+        assert restored.callback == spider.parse
+        assert restored.priority == 3
+        assert restored.body == b"\xff\x00"
+        assert restored.headers["If-None-Match"] == b'"abc"'
+        assert restored.meta == {"page": 2, "token": b"\x01"}
+        assert restored.cb_kwargs == {"shard": 1}
+
+    def test_rejects_values_json_cannot_hold(self):
+        spider = QuotesSpider()
+        request = Request("https://quotes.toscrape.com/", meta={"spider": spider})
+
+        with pytest.raises(TypeError):
+            dumps(encode_request(request, spider))
+
+
+def frontier_settings(crawl_id: str) -> dict:
+    return {
+        "FRONTIER_CRAWL_ID": crawl_id,
+        "FRONTIER_BATCH_SIZE": 2,
+        "FRONTIER_FLUSH_INTERVAL": 0.1,
+        "SCHEDULER": "scraper.frontier.FrontierScheduler",
+        "SPIDER_MIDDLEWARES": {"scraper.middlewares.FrontierMiddleware": 10},
+        "PAGINATION_PREFETCH_ENABLED": True,
+        "PAGINATION_PREFETCH_WINDOW": 4,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 4,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+class TestFrontierScheduler:
+    """Workers sharing one crawl through the frontier."""
+
+    def test_two_workers_split_one_crawl(self, sync_session_factory, crawl_id):
+        with QuotesSite(pages=30, quotes_per_page=2, latency=0.1) as site:
+            with ThreadPoolExecutor(2) as pool:
+                workers = [
+                    pool.submit(
+                        run_crawl, QuotesSpider, frontier_settings(crawl_id),
+                        start_urls=[site.page_url(1)])
+                    for _ in range(2)
+                ]
+                stats = [worker.result() for worker in workers]
+            requests = Counter(site.requests)
+
+        # Each worker starts from the start URL; every other page is
+        # downloaded by exactly one of them.
+        assert requests["/page/1/"] == 2
+        assert all(requests[f"/page/{n}/"] == 1 for n in range(2, 31))
+
+        # Both workers took part
+        assert all(s.get("frontier/claimed", 0) > 0 for s in stats)
+        assert sum(s["item_scraped_count"] for s in stats) == 31 * 2
+
+        with sync_session_factory() as session:
+            counts = FrontierRepository(session).counts(crawl_id)
+        assert set(counts) == {"done"}
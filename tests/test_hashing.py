@@ -0,0 +1,16 @@
+from db.hashing import hash_text, normalize_text
+
+
+class TestHashText:
+    """Tests for the quote content hash."""
+
+    def test_whitespace_and_unicode_form_are_normalized(self):
+        composed = "“Café  society,\n  darling.”"
+        decomposed = "  “Café society, darling.” "
+
+        assert normalize_text(composed) == "“Café society, darling.”"
+        assert hash_text(composed) == hash_text(decomposed)
+
+    def test_distinct_texts_hash_differently(self):
+        assert hash_text("“A quote.”") != hash_text("“A quote!”")
+        assert len(hash_text("“A quote.”")) == 64
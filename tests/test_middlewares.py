@@ -0,0 +1,216 @@
+import pytest
+import scrapy
+from scrapy import Request
+from scrapy.http import HtmlResponse, Response
+from scrapy.utils.test import get_crawler
+
+from scraper.middlewares import ConditionalRequestMiddleware
+from scraper.page_store import PageStore
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+URL = "https://quotes.toscrape.com/page/1/"
+
+
+class TestConditionalRequestMiddleware:
+    """Tests for conditional revalidation of crawled pages."""
+
+    def setup_method(self):
+        self.crawler = get_crawler(settings_dict={"CONDITIONAL_REQUESTS_ENABLED": True})
+        self.store = PageStore()
+        self.middleware = ConditionalRequestMiddleware(self.store, self.crawler.stats)
+
+    def test_unknown_page_is_requested_unconditionally(self):
+        request = Request(URL)
+
+        self.middleware.process_request(request, spider=None)
+
+        assert "If-None-Match" not in request.headers
+        assert "revalidated" not in request.meta
+
+    def test_validators_are_recorded_and_sent(self):
+        first = Request(URL)
+        self.middleware.process_response(first, HtmlResponse(
+            URL, body=b"<html></html>", request=first,
+            headers={"ETag": '"abc"', "Last-Modified": "Mon, 01 Sep 2025 00:00:00 GMT"},
+        ), spider=None)
+
+        second = Request(URL)
+        self.middleware.process_request(second, spider=None)
+
+        assert second.headers["If-None-Match"] == b'"abc"'
+        assert second.headers["If-Modified-Since"] == b"Mon, 01 Sep 2025 00:00:00 GMT"
+        assert 304 in second.meta["handle_httpstatus_list"]
+
+    def test_downloaded_size_is_recorded(self):
+        compressed = Request(URL)
+        self.middleware.process_response(compressed, HtmlResponse(
+            URL, body=b"<html>" + b" " * 1000 + b"</html>", request=compressed,
+            # Decompressed by HttpCompressionMiddleware before
+            headers={"ETag": '"abc"', "Content-Length": "120"},
+        ), spider=None)
+        assert self.store.get(URL).content_length == 120
+
+        chunked = Request(URL)
+        self.middleware.process_response(chunked, HtmlResponse(
+            URL, body=b"<html></html>", request=chunked, headers={"ETag": '"def"'},
+        ), spider=None)
+        assert self.store.get(URL).content_length == 13
+
+    def test_not_modified_marks_page_unchanged(self):
+        self.store.update(URL, etag='"abc"', content_length=1000)
+        request = Request(URL)
+        self.middleware.process_request(request, spider=None)
+
+        response = self.middleware.process_response(
+            request, Response(URL, status=304, request=request), spider=None)
+        self.middleware.spider_closed(spider=None)
+
+        assert response.meta["page_unchanged"]
+        stats = self.crawler.stats
+        assert stats.get_value("conditional/not_modified") == 1
+        assert stats.get_value("conditional/bytes_saved") == 1000
+        assert stats.get_value("conditional/hit_rate") == 1.0
+
+
+class PagesSpider(scrapy.Spider):
+    """Requests every page of the stand-in site at once."""
+
+    name = "pages"
+
+    def __init__(self, pages: int, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.start_urls = [f"{base_url}/page/{n}/" for n in range(1, pages + 1)]
+
+    def parse(self, response):
+        return None
+
+
+def adaptive_settings(**overrides) -> dict:
+    settings = {
+        "DOWNLOADER_MIDDLEWARES": {
+            "scraper.middlewares.AdaptiveConcurrencyMiddleware": 585,
+        },
+        "ADAPTIVE_CONCURRENCY_ENABLED": True,
+        "ADAPTIVE_CONCURRENCY_MIN": 1,
+        "ADAPTIVE_CONCURRENCY_MAX": 8,
+        "ADAPTIVE_DELAY_MIN": 0.0,
+        "ADAPTIVE_CONCURRENCY_WINDOW": 5,
+        "ADAPTIVE_CONCURRENCY_TARGET_LATENCY": 0.2,
+        "CONCURRENT_REQUESTS": 16,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+    settings.update(overrides)
+    return settings
+
+
+class TestAdaptiveConcurrencyMiddleware:
+    """Crawls of the stand-in site under different server behaviour."""
+
+    def test_ramps_up_on_a_fast_server(self):
+        with QuotesSite(pages=60, quotes_per_page=1) as site:
+            stats = run_crawl(
+                PagesSpider,
+                # Any local response is fast, even on a loaded machine
+                adaptive_settings(
+                    CONCURRENT_REQUESTS_PER_DOMAIN=1, DOWNLOAD_DELAY=0.2,
+                    ADAPTIVE_CONCURRENCY_TARGET_LATENCY=1.0),
+                pages=site.pages, base_url=site.url,
+            )
+
+        assert stats.get("adaptive/increase", 0) > 0
+        assert "adaptive/backoff" not in stats
+        assert stats["adaptive/concurrency/127.0.0.1"] > 1
+        assert stats["adaptive/delay/127.0.0.1"] < 0.2
+
+    def test_backs_off_when_rate_limited(self):
+        with QuotesSite(pages=60, quotes_per_page=1, latency=0.05, max_concurrent=2) as site:
+            stats = run_crawl(
+                PagesSpider,
+                adaptive_settings(CONCURRENT_REQUESTS_PER_DOMAIN=8, DOWNLOAD_DELAY=0),
+                pages=site.pages, base_url=site.url,
+            )
+
+        assert stats.get("adaptive/backoff", 0) > 0
+        assert stats["adaptive/concurrency/127.0.0.1"] < 8
+        assert stats["adaptive/delay/127.0.0.1"] > 0
+
+    def test_lowers_concurrency_on_a_slow_server(self):
+        with QuotesSite(pages=30, quotes_per_page=1, latency=0.4) as site:
+            stats = run_crawl(
+                PagesSpider,
+                adaptive_settings(CONCURRENT_REQUESTS_PER_DOMAIN=4, DOWNLOAD_DELAY=0),
+                pages=site.pages, base_url=site.url,
+            )
+
+        assert stats.get("adaptive/decrease", 0) > 0
+        assert stats["adaptive/concurrency/127.0.0.1"] < 4
+
+
+class NewQuotesSite(QuotesSite):
+    """Stand-in site after ``new_quotes`` quotes were added in front."""
+
+    new_quotes = 0
+
+    def quote(self, page: int, index: int) -> dict:
+        quote = super().quote(page, index)
+        number = (page - 1) * self.quotes_per_page + index - self.new_quotes
+        if number < 0:
+            quote["text"] = f"“Synthetic new quote number {-number}.”"
+        else:
+            quote = super().quote(1, number)
+        return quote
+
+
+def incremental_settings(**overrides) -> dict:
+    settings = {
+        "ITEM_PIPELINES": {
+            "scraper.pipelines.QuotesValidationPipeline": 100,
+            "scraper.pipelines.QuotesDatabasePipeline": 200,
+        },
+        "QUOTES_DB_BUFFER_ENABLED": True,
+        "SPIDER_MIDDLEWARES": {"scraper.middlewares.IncrementalCrawlMiddleware": 100},
+        "INCREMENTAL_STOP_AFTER_PAGES": 2,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+    settings.update(overrides)
+    return settings
+
+
+@pytest.mark.usefixtures("synthetic_quotes")
+class TestIncrementalCrawlMiddleware:
+    """Incremental crawls of the stand-in site against stored quotes."""
+
+    def test_stops_after_consecutive_known_pages(self):
+        with NewQuotesSite(pages=10, quotes_per_page=3) as site:
+            run_crawl(QuotesSpider, incremental_settings(), start_urls=[site.page_url(1)])
+
+            # A page's worth of new quotes pushed everything one page back
+            site.new_quotes = 3
+            site.requests.clear()
+            stats = run_crawl(
+                QuotesSpider, incremental_settings(INCREMENTAL_CRAWL_ENABLED=True),
+                start_urls=[site.page_url(1)])
+            requests = set(site.requests)
+
+        assert stats["incremental/pages_known"] == 2
+        assert stats["incremental/stopped_at_page"] == 3
+        assert requests == {"/page/1/", "/page/2/", "/page/3/"}
+        assert stats["quotes/db/inserted"] == 3
+
+    def test_page_with_changed_tags_is_not_known(self):
+        with NewQuotesSite(pages=6, quotes_per_page=3) as site:
+            run_crawl(QuotesSpider, incremental_settings(), start_urls=[site.page_url(1)])
+
+            site.tags_per_quote = 4
+            site.requests.clear()
+            stats = run_crawl(
+                QuotesSpider, incremental_settings(INCREMENTAL_CRAWL_ENABLED=True),
+                start_urls=[site.page_url(1)])
+            requests = set(site.requests)
+
+        assert "incremental/pages_known" not in stats
+        assert requests == {f"/page/{n}/" for n in range(1, 7)}
+        assert stats["quotes/db/updated"] == 18
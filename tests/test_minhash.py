@@ -0,0 +1,85 @@
+import numpy as np
+
+from benchmarks.near_duplicates import accuracy, load_groups
+from db.minhash import (
+    THRESHOLD,
+    LSHIndex,
+    MinHasher,
+    from_bytes,
+    normalize_for_similarity,
+    similarity,
+    to_bytes,
+)
+
+
+class TestMinHash:
+    """MinHash signatures and the LSH index of near-duplicate quotes."""
+
+    def test_normalization_ignores_quotes_case_and_punctuation(self):
+        assert normalize_for_similarity("“It’s  a\ttest — really!”") == "it s a test really"
+        assert normalize_for_similarity('"IT\'S A TEST, REALLY."') == "it s a test really"
+        assert normalize_for_similarity("ﬁne") == "fine"
+
+    def test_signatures_estimate_similarity(self):
+        hasher = MinHasher()
+        original = hasher.signature("“The world as we have created it is a process of our thinking.”")
+        straight = hasher.signature('"The world as we have created it is a process of our thinking"')
+        edited = hasher.signature("“The world as we created it is a process of our thinking.”")
+        unrelated = hasher.signature("“A day without sunshine is like, you know, night.”")
+
+        assert similarity(original, straight) == 1.0
+        assert 0.7 <= similarity(original, edited) < 1.0
+        assert similarity(original, unrelated) < 0.3
+        # Batches sign every text on its own
+        batch = hasher.signatures(["", "ab", "The world as we have created it"])
+        assert np.array_equal(batch[2], hasher.signature("The world as we have created it"))
+        assert np.array_equal(from_bytes(to_bytes(batch)), batch)
+
+    def test_labeled_fixture_precision_and_recall(self):
+        result = accuracy(THRESHOLD)
+
+        assert result["precision"] >= 0.95
+        assert result["recall"] >= 0.9
+        for kind in ("straight_quotes", "whitespace", "punctuation"):
+            assert result["recall_by_variant"][kind] == 1.0
+
+    def test_clusters_group_variants(self):
+        # Without the edited variants, every group is one cluster
+        groups = [
+            [text for kind, text in group if kind not in ("edit", "combined")]
+            for group in load_groups()
+        ]
+        texts = [text for group in groups for text in group]
+        labels = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+        index = LSHIndex()
+        index.add(MinHasher().signatures(texts))
+        index.freeze()
+
+        clusters = index.clusters()
+
+        for group in range(len(groups)):
+            members = np.flatnonzero(labels == group)
+            assert len(set(clusters[members].tolist())) == 1
+            assert clusters[members[0]] == members[0]
+            assert not np.isin(clusters[labels != group], clusters[members]).any()
+
+    def test_query_finds_entries_inserted_after_freeze(self):
+        hasher = MinHasher()
+        index = LSHIndex(hasher)
+        index.add(hasher.signatures(["“So many books, so little time.”"]), np.array([7], dtype=np.uint64))
+        index.freeze()
+        index.insert(hasher.signature("“A room without books is like a body without a soul.”"), 8)
+
+        assert index.query(hasher.signature('"So many books, so little time"')) == [(7, 1.0)]
+        assert [entry_id for entry_id, _ in index.query(
+            hasher.signature("A room without books is like a body without soul"))] == [8]
+        assert index.query(hasher.signature("Be yourself; everyone else is already taken.")) == []
+
+    def test_respects_memory_cap(self):
+        hasher = MinHasher()
+        index = LSHIndex(hasher, max_bytes=10 * LSHIndex(hasher).entry_bytes)
+        signatures = hasher.signatures([f"Quote number {number}" for number in range(11)])
+
+        assert index.add(signatures[:10])
+        assert not index.add(signatures[10:])
+        assert len(index) == 10
@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import text
+
+from benchmarks.near_duplicates import load_groups
+from db.hashing import hash_text
+from db.near_duplicates import cluster_quotes, sign_quotes
+from scraper.testing import QuotesSite, run_crawl
+from tests.test_pipelines import SiteSpider
+
+AUTHOR = "Synthetic Near Duplicates"
+
+
+class TestNearDuplicates:
+    """Signing, clustering and checking quotes against stored signatures."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    def insert(self, quotes: list[tuple[str, str]]):
+        with self.session_factory() as session:
+            for quote, author in quotes:
+                session.execute(text(
+                    """
+                    INSERT INTO quotes (text, text_hash, author, tags)
+                    VALUES (:text, :text_hash, :author, '{}')
+                    """
+                ), {"text": quote, "text_hash": hash_text(quote), "author": author})
+            session.commit()
+
+    def test_clusters_stored_variants(self):
+        groups = []
+        for group in load_groups()[:10]:
+            # Variants differing only in whitespace are the same quote
+            by_hash = {hash_text(quote): quote for _, quote in group}
+            groups.append(list(by_hash.values()))
+        self.insert([(quote, AUTHOR) for group in groups for quote in group])
+
+        with self.session_factory() as session:
+            summary = cluster_quotes(session)
+            clusters = dict(session.execute(text(
+                """
+                SELECT quotes.text, quote_signatures.cluster_id
+                FROM quotes JOIN quote_signatures ON quote_signatures.quote_id = quotes.id
+                WHERE quotes.author = :author
+                """
+            ), {"author": AUTHOR}).all())
+
+        assert summary["signed"] >= sum(len(group) for group in groups)
+        assert summary["clustered"] >= sum(len(group) for group in groups)
+        for group in groups:
+            original_cluster = clusters[group[0]]
+            assert original_cluster is not None
+            # A small edit may fall below the threshold; the rest may not
+            assert sum(clusters[quote] == original_cluster for quote in group) >= len(group) - 2
+        assert len({clusters[group[0]] for group in groups}) == len(groups)
+
+        # Running again signs nothing new
+        with self.session_factory() as session:
+            assert cluster_quotes(session)["signed"] == 0
+
+    def crawl(self, site: QuotesSite, drop: bool, sign: bool = True) -> dict:
+        settings = {
+            "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+            "ITEM_PIPELINES": {"scraper.pipelines.QuotesNearDuplicatesPipeline": 150},
+            "QUOTES_NEAR_DUPLICATES_ENABLED": True,
+            "QUOTES_NEAR_DUPLICATES_DROP": drop,
+            "QUOTES_NEAR_DUPLICATES_SIGN": sign,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+        return run_crawl(SiteSpider, settings, start_urls=[site.page_url(1)])
+
+    def test_pipeline_finds_near_duplicates_of_stored_quotes(self):
+        with QuotesSite(pages=1, quotes_per_page=1) as site:
+            quote = site.quote(1, 0)
+            # Stored with straight quotes; the site serves curly ones
+            self.insert([(quote["text"].strip("“”").join('""'), quote["author"])])
+            counted = self.crawl(site, drop=False)
+            dropped = self.crawl(site, drop=True)
+
+        assert counted["quotes/near_duplicates/found"] == 1
+        assert counted["quotes/near_duplicates/index_size"] >= 1
+        assert counted["item_scraped_count"] == 1
+        assert dropped["quotes/near_duplicates/found"] == 1
+        assert dropped.get("item_scraped_count", 0) == 0
+
+    def test_pipeline_only_loads_signatures_when_not_signing(self):
+        with QuotesSite(pages=1, quotes_per_page=1) as site:
+            quote = site.quote(1, 0)
+            self.insert([(quote["text"].strip("“”").join('""'), quote["author"])])
+            unsigned = self.crawl(site, drop=False, sign=False)
+            with self.session_factory() as session:
+                sign_quotes(session)
+            signed = self.crawl(site, drop=False, sign=False)
+
+        assert "quotes/near_duplicates/found" not in unsigned
+        assert signed["quotes/near_duplicates/found"] == 1
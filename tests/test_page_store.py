@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import text
+
+from scraper.pipelines import QuotesDatabasePipeline
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+
+class FailingDatabasePipeline(QuotesDatabasePipeline):
+    """Database pipeline whose every write fails."""
+
+    async def _save_quote(self, text: str, author: str, tags: list[str]):
+        raise RuntimeError("database is unavailable")
+
+
+def page_settings(**overrides) -> dict:
+    settings = {
+        "PAGE_FINGERPRINT_ENABLED": True,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+    settings.update(overrides)
+    return settings
+
+
+class TestPageStore:
+    """Page state saved by one crawl and loaded by the next."""
+
+    @pytest.fixture(autouse=True)
+    def crawled_pages(self, sync_session_factory):
+        delete = text("DELETE FROM crawled_pages WHERE url LIKE 'http://127.0.0.1:%'")
+        with sync_session_factory() as session:
+            session.execute(delete)
+            session.commit()
+        yield
+        with sync_session_factory() as session:
+            session.execute(delete)
+            session.commit()
+
+    def crawl(self, site: QuotesSite, **overrides) -> dict:
+        return run_crawl(
+            QuotesSpider, page_settings(**overrides), start_urls=[site.page_url(1)])
+
+    def test_fingerprints_skip_unchanged_pages_next_crawl(self):
+        with QuotesSite(pages=4, quotes_per_page=2) as site:
+            first = self.crawl(site)
+            second = self.crawl(site)
+
+        assert first["fingerprint/pages_parsed"] == 4
+        assert first["item_scraped_count"] == 8
+        # Page 1 is requested twice, from the start URL and page 2
+        assert second["fingerprint/pages_skipped"] == second["response_received_count"]
+        assert "fingerprint/pages_parsed" not in second
+        assert "item_scraped_count" not in second
+
+    def test_not_modified_pages_follow_recorded_links(self):
+        settings = {
+            "PAGE_FINGERPRINT_ENABLED": False,
+            "CONDITIONAL_REQUESTS_ENABLED": True,
+            "DOWNLOADER_MIDDLEWARES": {"scraper.middlewares.ConditionalRequestMiddleware": 580},
+        }
+        with QuotesSite(pages=4, quotes_per_page=2, etags=True) as site:
+            self.crawl(site, **settings)
+            site.requests.clear()
+            stats = self.crawl(site, **settings)
+            requests = set(site.requests)
+
+        assert stats["conditional/not_modified"] == stats["response_received_count"]
+        assert "item_scraped_count" not in stats
+        assert requests == {f"/page/{n}/" for n in range(1, 5)}
+
+    def test_state_is_not_saved_when_writes_fail(self):
+        with QuotesSite(pages=2, quotes_per_page=2) as site:
+            failed = self.crawl(site, ITEM_PIPELINES={
+                "tests.test_page_store.FailingDatabasePipeline": 200})
+            retried = self.crawl(site)
+
+        assert failed["quotes/db/failed"] == 4
+        assert retried["fingerprint/pages_parsed"] == 2
+        assert retried["item_scraped_count"] == 4
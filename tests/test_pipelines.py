@@ -0,0 +1,190 @@
+import asyncio
+
+import pytest
+import scrapy
+from scrapy.http import Response
+from sqlalchemy import text
+
+from scraper.pipelines import QuotesDatabasePipeline
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+WRITE_LATENCY = 0.05
+MAX_CONCURRENT_WRITES = 2
+
+
+class SiteSpider(scrapy.Spider):
+    """Minimal spider walking the stand-in site."""
+
+    name = "site"
+
+    def parse(self, response: Response):
+        for quote in response.css("div.quote"):
+            yield {
+                "text": quote.css("span.text::text").get(),
+                "author": quote.css("small.author::text").get(),
+                "tags": quote.css("div.tags a.tag::text").getall(),
+            }
+
+        yield from response.follow_all(css="ul.pager li.next a", callback=self.parse)
+
+
+class SlowDatabasePipeline(QuotesDatabasePipeline):
+    """QuotesDatabasePipeline whose writes stand in for a slow Postgres."""
+
+    writes_in_flight = 0
+
+    async def _save_quote(self, text: str, author: str, tags: list[str]):
+        self.writes_in_flight += 1
+        self.stats.max_value("test/max_writes_in_flight", self.writes_in_flight)
+        responses_before = self.stats.get_value("downloader/response_count", 0)
+
+        await asyncio.sleep(WRITE_LATENCY)
+
+        if self.stats.get_value("downloader/response_count", 0) > responses_before:
+            self.stats.inc_value("test/writes_overlapping_downloads")
+        self.writes_in_flight -= 1
+
+
+class TestQuotesDatabasePipeline:
+    """End-to-end tests for the coroutine database pipeline."""
+
+    def test_downloads_progress_while_writes_are_pending(self, quotes_site):
+        settings = {
+            "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+            "ITEM_PIPELINES": {f"{__name__}.SlowDatabasePipeline": 200},
+            "QUOTES_DB_BUFFER_ENABLED": False,
+            "QUOTES_DB_MAX_CONCURRENT_WRITES": MAX_CONCURRENT_WRITES,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+
+        stats = run_crawl(
+            SiteSpider, settings, start_urls=[quotes_site.page_url(1)])
+
+        expected_items = quotes_site.pages * quotes_site.quotes_per_page
+        assert stats["item_scraped_count"] == expected_items
+        assert stats["downloader/response_count"] == quotes_site.pages
+
+        # Pages kept arriving while writes were awaiting the database.
+        assert stats.get("test/writes_overlapping_downloads", 0) > 0
+
+        # Writes overlapped with each other, up to the configured cap.
+        assert stats["test/max_writes_in_flight"] == MAX_CONCURRENT_WRITES
+
+        # A blocking pipeline would need every write plus every download
+        # back to back; the crawl must finish well inside that.
+        elapsed = (stats["finish_time"] - stats["start_time"]).total_seconds()
+        assert elapsed < expected_items * WRITE_LATENCY
+
+
+class TestCopyWriter:
+    """Writing quotes through the COPY staging table."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    def crawl(self, site: QuotesSite) -> dict:
+        settings = {
+            "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+            "ITEM_PIPELINES": {"scraper.pipelines.QuotesDatabasePipeline": 200},
+            "QUOTES_DB_WRITER": "copy",
+            "QUOTES_DB_BUFFER_SIZE": 20,
+            "QUOTES_SEEN_SET_ENABLED": False,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+        return run_crawl(SiteSpider, settings, start_urls=[site.page_url(1)])
+
+    def test_inserts_updates_and_skips_unchanged_quotes(self):
+        with QuotesSite(pages=5, quotes_per_page=10) as site:
+            first = self.crawl(site)
+            site.tags_per_quote = 4
+            second = self.crawl(site)
+            third = self.crawl(site)
+
+        assert first["quotes/db/inserted"] == 50
+        assert second["quotes/db/updated"] == 50
+        assert second["quotes/db/inserted"] == 0
+        assert third["quotes/db/unchanged"] == 50
+
+        with self.session_factory() as session:
+            assert session.scalar(text("SELECT count(*) FROM quotes_staging")) == 0
+
+
+class TestBufferedWrites:
+    """Quotes buffered and written with bulk upserts."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    def crawl(self, site: QuotesSite, buffer_size: int) -> dict:
+        settings = {
+            "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+            "ITEM_PIPELINES": {"scraper.pipelines.QuotesDatabasePipeline": 200},
+            "QUOTES_DB_BUFFER_ENABLED": True,
+            "QUOTES_DB_BUFFER_SIZE": buffer_size,
+            # Only a full buffer or the end of the crawl flushes
+            "QUOTES_DB_BUFFER_MAX_AGE": 600,
+            "QUOTES_SEEN_SET_ENABLED": False,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+        return run_crawl(SiteSpider, settings, start_urls=[site.page_url(1)])
+
+    def test_full_buffers_flush_and_the_rest_on_close(self):
+        with QuotesSite(pages=5, quotes_per_page=10) as site:
+            stats = self.crawl(site, buffer_size=20)
+
+        # Two full buffers, then the last 10 quotes when the spider closes
+        assert stats["quotes/db/flushes"] == 3
+        assert stats["quotes/db/inserted"] == 50
+
+    def test_buffer_below_the_threshold_flushes_on_close(self):
+        with QuotesSite(pages=2, quotes_per_page=10) as site:
+            stats = self.crawl(site, buffer_size=1000)
+
+        assert stats["quotes/db/flushes"] == 1
+        assert stats["quotes/db/inserted"] == 20
+        with self.session_factory() as session:
+            assert session.scalar(
+                text("SELECT count(*) FROM quotes WHERE text LIKE '“Synthetic%'")) == 20
+
+
+class TestCompactItems:
+    """CompactQuote items through the validation and database pipelines."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    @pytest.mark.parametrize("writer", ["orm", "copy"])
+    def test_tuple_tags_are_stored_and_recognized(self, writer):
+        settings = {
+            "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+            "ITEM_PIPELINES": {
+                "scraper.pipelines.QuotesValidationPipeline": 100,
+                "scraper.pipelines.QuotesDatabasePipeline": 200,
+            },
+            "QUOTES_COMPACT_ITEMS_ENABLED": True,
+            "QUOTES_DB_BUFFER_ENABLED": True,
+            "QUOTES_DB_WRITER": writer,
+            "QUOTES_SEEN_SET_ENABLED": True,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+        with QuotesSite(pages=2, quotes_per_page=10) as site:
+            first = run_crawl(QuotesSpider, settings, start_urls=[site.page_url(1)])
+            second = run_crawl(QuotesSpider, settings, start_urls=[site.page_url(1)])
+            expected = site.quote(2, 3)
+
+        assert first["quotes/db/inserted"] == 20
+        # Stored tags match the tuples of the second crawl
+        assert second["quotes/seen_set/unchanged"] == second["item_scraped_count"]
+        assert "quotes/db/flushes" not in second
+        with self.session_factory() as session:
+            tags = session.scalar(
+                text("SELECT tags FROM quotes WHERE text = :text"), {"text": expected["text"]})
+        assert tags == expected["tags"]
@@ -0,0 +1,85 @@
+import pstats
+
+import pytest
+
+from scraper.profiling import Profiler
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import run_crawl
+
+
+def profiling_settings(directory, **overrides) -> dict:
+    settings = {
+        "ITEM_PIPELINES": {"scraper.pipelines.QuotesValidationPipeline": 100},
+        "EXTENSIONS": {"scraper.extensions.Profiling": 300},
+        "PROFILING_ENABLED": True,
+        "PROFILING_DIR": str(directory),
+        "PROFILING_TOP_N": 5,
+        "CONDITIONAL_REQUESTS_ENABLED": False,
+        "PAGE_FINGERPRINT_ENABLED": False,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+    settings.update(overrides)
+    return settings
+
+
+def profiled_functions(path) -> set[str]:
+    return {function for _, _, function in pstats.Stats(str(path)).stats}
+
+
+class TestProfiler:
+    """CPU profiles and memory snapshots of crawls."""
+
+    def test_profiles_the_whole_crawl(self, quotes_site, tmp_path):
+        run_crawl(QuotesSpider, profiling_settings(tmp_path), start_urls=[quotes_site.page_url(1)])
+
+        [profile] = tmp_path.glob("quotes-*-cpu-crawl.prof")
+        functions = profiled_functions(profile)
+        assert "parse" in functions
+        assert "process_item" in functions
+        assert list(tmp_path.glob("quotes-*-memory-1.snapshot"))
+
+    def test_profiles_only_the_targets(self, quotes_site, tmp_path):
+        settings = profiling_settings(
+            tmp_path, PROFILING_TARGETS="parse,QuotesValidationPipeline", PROFILING_MEMORY=False)
+
+        run_crawl(QuotesSpider, settings, start_urls=[quotes_site.page_url(1)])
+
+        assert not list(tmp_path.glob("*-cpu-crawl.prof"))
+        assert not list(tmp_path.glob("*.snapshot"))
+        [parse] = tmp_path.glob("quotes-*-cpu-parse.prof")
+        [pipeline] = tmp_path.glob("quotes-*-cpu-QuotesValidationPipeline.prof")
+        assert "extract_quotes" in profiled_functions(parse)
+        assert "process_item" not in profiled_functions(parse)
+        assert "_validate" in profiled_functions(pipeline)
+        assert "parse" not in profiled_functions(pipeline)
+
+
+class TestProfilerWrap:
+    """Wrapping of targeted functions."""
+
+    @pytest.fixture
+    def profiler(self, tmp_path):
+        return Profiler(str(tmp_path), targets=["target"])
+
+    def test_untargeted_functions_are_not_wrapped(self, profiler):
+        def function():
+            pass
+
+        assert profiler.wrap("other", function) is function
+
+    def test_generators_are_profiled_while_they_run(self, profiler):
+        def inner():
+            return 1
+
+        def generator():
+            yield inner()
+            yield inner()
+
+        def consumer():
+            return sum(profiler.wrap("target", generator)())
+
+        assert consumer() == 2
+        functions = {function for _, _, function in pstats.Stats(profiler.profiles["target"]).stats}
+        assert "inner" in functions
+        assert "consumer" not in functions
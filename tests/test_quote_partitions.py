@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from db.database import DatabaseSessionManager
+from db.hashing import hash_text
+from db.repositories import QuotePartitionsRepository, QuoteStatsRepository, QuotesRepository
+
+AUTHOR = "Synthetic Author"
+
+# Months far enough in the past to hold no real quotes
+JANUARY = datetime(2001, 1, 15)
+FEBRUARY = datetime(2001, 2, 15)
+END = datetime(2002, 1, 1)
+
+
+def with_repository(repository, method: str, *args):
+    """Call a method of an async repository in a session of its own."""
+    async def call():
+        manager = DatabaseSessionManager()
+        try:
+            async with manager.session() as session:
+                return await getattr(repository(session), method)(*args)
+        finally:
+            await manager.close()
+
+    return asyncio.run(call())
+
+
+class TestQuotePartitions:
+    """Monthly partitions of quotes."""
+
+    @pytest.fixture(autouse=True)
+    def partitions(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+        with synthetic_quotes() as session:
+            repository = QuotePartitionsRepository(session)
+            repository.drop_before(END)
+            repository.create(JANUARY, FEBRUARY)
+            for month, created_at in (("january", JANUARY), ("february", FEBRUARY)):
+                session.execute(text(
+                    """
+                    INSERT INTO quotes (text, text_hash, author, tags, created_at, updated_at)
+                    VALUES (:text, :text_hash, :author, '{}', :created_at, :created_at)
+                    """
+                ), {
+                    "text": f"“Synthetic {month}",
+                    "text_hash": hash_text(f"“Synthetic {month}"),
+                    "author": AUTHOR,
+                    "created_at": created_at,
+                })
+            session.commit()
+        yield
+        with synthetic_quotes() as session:
+            QuotePartitionsRepository(session).drop_before(END)
+            session.commit()
+
+    def test_dedups_across_partitions(self):
+        duplicate = with_repository(
+            QuotesRepository, "find_duplicate", "“Synthetic january", AUTHOR)
+        assert duplicate.created_at == JANUARY
+
+        result = with_repository(QuotesRepository, "upsert_many", [
+            {"text": "“Synthetic january", "author": AUTHOR, "tags": ["changed"]},
+            {"text": "“Synthetic february", "author": AUTHOR, "tags": []},
+        ])
+        assert (result.inserted, result.updated, result.unchanged) == (0, 1, 1)
+
+        with pytest.raises(IntegrityError):
+            with_repository(QuotesRepository, "create", "“Synthetic february", AUTHOR, [])
+
+        with self.session_factory() as session:
+            rows = session.execute(text(
+                "SELECT tags, created_at FROM quotes WHERE author = :author ORDER BY created_at"
+            ), {"author": AUTHOR}).all()
+        assert rows == [(["changed"], JANUARY), ([], FEBRUARY)]
+
+    def test_retention_drops_whole_partitions(self):
+        with self.session_factory() as session:
+            repository = QuotePartitionsRepository(session)
+            dropped = repository.drop_before(datetime(2001, 2, 20))
+            names = [partition.name for partition in repository.partitions()]
+
+            assert [partition.name for partition in dropped] == ["quotes_p200101"]
+            assert "quotes_p200101" not in names
+            assert "quotes_p200102" in names
+            assert session.scalars(text(
+                "SELECT text FROM quotes WHERE author = :author"
+            ), {"author": AUTHOR}).all() == ["“Synthetic february"]
+
+        assert with_repository(QuoteStatsRepository, "check") == []
+
+        # The dropped quote is new again
+        result = with_repository(QuotesRepository, "upsert_many", [
+            {"text": "“Synthetic january", "author": AUTHOR, "tags": []},
+        ])
+        assert result.inserted == 1
+
+    def test_quotes_of_months_without_a_partition_move_into_a_new_one(self):
+        march = datetime(2001, 3, 15)
+        location = text("SELECT CAST(tableoid::regclass AS text) FROM quotes WHERE text = :text")
+        with self.session_factory() as session:
+            session.execute(text(
+                """
+                INSERT INTO quotes (text, text_hash, author, tags, created_at, updated_at)
+                VALUES (:text, :text_hash, :author, '{}', :created_at, :created_at)
+                """
+            ), {
+                "text": "“Synthetic march",
+                "text_hash": hash_text("“Synthetic march"),
+                "author": AUTHOR,
+                "created_at": march,
+            })
+            session.commit()
+            assert session.scalar(location, {"text": "“Synthetic march"}) == "quotes_default"
+
+            repository = QuotePartitionsRepository(session)
+            created = repository.create(march, march)
+
+            assert [partition.name for partition in created] == ["quotes_p200103"]
+            assert session.scalar(location, {"text": "“Synthetic march"}) == "quotes_p200103"
+            assert "quotes_default" not in [
+                partition.name for partition in repository.partitions()]
+
+        assert with_repository(QuoteStatsRepository, "check") == []
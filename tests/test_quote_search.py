@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+from db.database import DatabaseSessionManager
+from db.hashing import hash_text
+from db.repositories import QuotesRepository
+
+# Made-up words, so real quotes never match
+QUOTES = [
+    ("“Synthetic zorblax runs over the quillfen.”", "Synthetic Author"),
+    ("“Synthetic zorblax and zorblax again.”", "Synthetic Author"),
+    ("“Synthetic quillfen alone.”", "Synthetic Author"),
+    ("“Synthetic nothing to see.”", "Synthetic Zorblax"),
+    ("“Synthetic zorblax, quietly.”", "Synthetic Author"),
+]
+
+
+def search(*args, **kwargs):
+    """Run QuotesRepository.search in a session of its own."""
+    async def call():
+        manager = DatabaseSessionManager()
+        try:
+            async with manager.session() as session:
+                return await QuotesRepository(session).search(*args, **kwargs)
+        finally:
+            await manager.close()
+
+    return asyncio.run(call())
+
+
+class TestQuoteSearch:
+    """Full-text search over quotes."""
+
+    @pytest.fixture(autouse=True)
+    def quotes(self, synthetic_quotes):
+        with synthetic_quotes() as session:
+            for quote, author in QUOTES:
+                session.execute(text(
+                    """
+                    INSERT INTO quotes (text, text_hash, author, tags)
+                    VALUES (:text, :text_hash, :author, '{}')
+                    """
+                ), {"text": quote, "text_hash": hash_text(quote), "author": author})
+            session.commit()
+
+    def test_ranks_text_matches_first(self):
+        page = search("zorblax")
+
+        texts = [quote.text for quote in page.quotes]
+        assert texts[0] == "“Synthetic zorblax and zorblax again.”"
+        # Only the author matches
+        assert texts[-1] == "“Synthetic nothing to see.”"
+        assert len(texts) == 4
+        assert page.ranks == sorted(page.ranks, reverse=True)
+        assert page.cursor is None
+
+    def test_web_search_syntax(self):
+        # Stemmed: "run" matches "runs"
+        assert [quote.text for quote in search("run quillfen").quotes] == [
+            "“Synthetic zorblax runs over the quillfen.”"]
+        assert {quote.text for quote in search("quillfen -zorblax").quotes} == {
+            "“Synthetic quillfen alone.”"}
+        assert {quote.text for quote in search('"zorblax runs" or alone').quotes} == {
+            "“Synthetic zorblax runs over the quillfen.”", "“Synthetic quillfen alone.”"}
+
+    def test_keyset_pagination(self):
+        first_page = search("zorblax", limit=4)
+        pages, cursor = [], None
+        while True:
+            page = search("zorblax", limit=1, cursor=cursor)
+            pages.append(page)
+            cursor = page.cursor
+            if cursor is None:
+                break
+
+        assert len(pages) == 4
+        assert [page.quotes[0].id for page in pages] == [quote.id for quote in first_page.quotes]
@@ -0,0 +1,153 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import text
+
+from db.database import DatabaseSessionManager
+from db.repositories import QuoteStatsRepository
+
+AUTHOR = "Synthetic Author"
+
+
+def with_repository(method: str):
+    """Call a QuoteStatsRepository method in a session of its own."""
+    async def call():
+        manager = DatabaseSessionManager()
+        try:
+            async with manager.session() as session:
+                return await getattr(QuoteStatsRepository(session), method)()
+        finally:
+            await manager.close()
+
+    return asyncio.run(call())
+
+
+class TestQuoteStats:
+    """Statistics kept up to date by the triggers on quotes."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    def execute(self, statement: str):
+        with self.session_factory() as session:
+            session.execute(text(statement))
+            session.commit()
+
+    def stats(self) -> tuple:
+        with self.session_factory() as session:
+            total = session.scalar(text("SELECT sum(quotes) FROM quote_stats_totals"))
+            author = session.scalar(
+                text("""
+                    SELECT sum(quotes) FROM quote_author_stats
+                    WHERE author = :author HAVING sum(quotes) <> 0
+                """),
+                {"author": AUTHOR},
+            )
+            daily = dict(
+                (day, (inserted, updated)) for day, inserted, updated in session.execute(
+                    text("""
+                        SELECT day, sum(inserted), sum(updated) FROM quote_daily_stats
+                        GROUP BY day HAVING sum(inserted) <> 0 OR sum(updated) <> 0
+                    """))
+            )
+        return total, author, daily
+
+    def test_writes_keep_statistics_up_to_date(self):
+        total, author, daily = self.stats()
+        assert author is None
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        inserted_today = daily.get(today, (0, 0))[0]
+        updated_tomorrow = daily.get(tomorrow, (0, 0))[1]
+
+        self.execute(f"""
+            INSERT INTO quotes (text, text_hash, author, tags)
+            SELECT '“Synthetic ' || n, md5(n::text), '{AUTHOR}', '{{}}'
+            FROM generate_series(1, 3) n
+        """)
+        assert self.stats() == (
+            total + 3, 3, {**daily, today: (inserted_today + 3, daily.get(today, (0, 0))[1])})
+
+        # Updated on a later day, as the nightly crawl does
+        self.execute(f"""
+            UPDATE quotes SET tags = '{{changed}}', updated_at = now() + interval '1 day'
+            WHERE author = '{AUTHOR}' AND text = '“Synthetic 1'
+        """)
+        assert self.stats()[2][tomorrow] == (
+            daily.get(tomorrow, (0, 0))[0], updated_tomorrow + 1)
+
+        self.execute(f"DELETE FROM quotes WHERE author = '{AUTHOR}'")
+        assert self.stats() == (total, None, daily)
+        assert with_repository("check") == []
+
+    def test_rebuild_repairs_drifted_statistics(self):
+        self.execute(f"""
+            INSERT INTO quotes (text, text_hash, author, tags)
+            VALUES ('“Synthetic 1', md5('1'), '{AUTHOR}', '{{}}')
+        """)
+        # Earlier tests may have left rows of the author in several slots
+        self.execute(f"""
+            UPDATE quote_author_stats SET quotes = quotes + 4
+            WHERE author = '{AUTHOR}'
+                AND slot = (SELECT min(slot) FROM quote_author_stats WHERE author = '{AUTHOR}')
+        """)
+        self.execute("""
+            UPDATE quote_stats_totals SET quotes = quotes + 4
+            WHERE slot = (SELECT min(slot) FROM quote_stats_totals)
+        """)
+
+        mismatches = with_repository("check")
+        assert {(m.table, m.key, m.stored, m.actual) for m in mismatches} == {
+            ("quote_author_stats", AUTHOR, (5,), (1,)),
+            ("quote_stats_totals", "quotes", (self.stats()[0],), (self.stats()[0] - 4,)),
+        }
+
+        total = with_repository("rebuild")
+        assert self.stats()[:2] == (total, 1)
+        assert with_repository("check") == []
+
+    def test_slots_sum_to_the_statistics(self):
+        """Quotes added by one connection and removed by another."""
+        total, _, daily = self.stats()
+        # Both connections stay open, so they are different backends, which
+        # write different slots unless their process IDs collide
+        with self.session_factory() as inserting, self.session_factory() as deleting:
+            slots = [
+                session.scalar(text("SELECT quote_stats_slot()"))
+                for session in (inserting, deleting)
+            ]
+            inserting.execute(text(f"""
+                INSERT INTO quotes (text, text_hash, author, tags)
+                VALUES ('“Synthetic 1', md5('1'), '{AUTHOR}', '{{}}')
+            """))
+            inserting.commit()
+            deleting.execute(text(f"DELETE FROM quotes WHERE author = '{AUTHOR}'"))
+            deleting.commit()
+
+        assert all(slot in range(16) for slot in slots)
+
+        assert self.stats() == (total, None, daily)
+        assert with_repository("check") == []
+
+    def test_updates_count_on_the_day_of_the_last_update(self):
+        today = date.today()
+        tomorrow = today + timedelta(days=1)
+        daily = self.stats()[2]
+        self.execute(f"""
+            INSERT INTO quotes (text, text_hash, author, tags)
+            VALUES ('“Synthetic 1', md5('1'), '{AUTHOR}', '{{}}')
+        """)
+        for days in (1, 2):
+            self.execute(f"""
+                UPDATE quotes SET tags = '{{changed{days}}}',
+                    updated_at = now() + interval '{days} day'
+                WHERE author = '{AUTHOR}'
+            """)
+
+        # Moved to the day of the second update
+        stats = self.stats()[2]
+        assert stats.get(tomorrow, (0, 0))[1] == daily.get(tomorrow, (0, 0))[1]
+        day_after = today + timedelta(days=2)
+        assert stats[day_after][1] == daily.get(day_after, (0, 0))[1] + 1
@@ -0,0 +1,198 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+import db.repositories.quotes as quotes_repository
+from db.database import DatabaseSessionManager
+from db.repositories import QuotesRepository, UpsertResult
+
+AUTHOR = "Synthetic Repository"
+
+
+def with_repository(call):
+    """Run ``call(repository)`` in a session of its own."""
+    async def run():
+        manager = DatabaseSessionManager()
+        try:
+            async with manager.session() as session:
+                return await call(QuotesRepository(session))
+        finally:
+            await manager.close()
+
+    return asyncio.run(run())
+
+
+def quote_rows(count: int) -> list[dict]:
+    return [
+        {"text": f"“Synthetic repository quote {n}.”", "author": AUTHOR, "tags": [f"tag{n}"]}
+        for n in range(count)
+    ]
+
+
+async def collect(stream) -> list:
+    return [quote async for quote in stream if quote.author == AUTHOR]
+
+
+class TestQuotesRepository:
+    """Bulk, streaming and tag methods of the quotes repository."""
+
+    @pytest.fixture(autouse=True)
+    def database(self, synthetic_quotes):
+        self.session_factory = synthetic_quotes
+
+    @pytest.fixture
+    def small_chunks(self, monkeypatch):
+        """Split bulk statements every 2 rows."""
+        monkeypatch.setattr(quotes_repository, "CHUNK_SIZE", 2)
+
+    def test_create_many_keeps_input_order_across_chunks(self, small_chunks):
+        rows = quote_rows(5)
+
+        quotes = with_repository(lambda repository: repository.create_many(rows))
+
+        assert [quote.text for quote in quotes] == [row["text"] for row in rows]
+        assert [quote.tags for quote in quotes] == [row["tags"] for row in rows]
+        assert all(quote.text_hash for quote in quotes)
+
+    def test_get_and_delete_many_across_chunks(self, small_chunks):
+        quotes = with_repository(lambda repository: repository.create_many(quote_rows(5)))
+        ids = [quote.id for quote in quotes]
+        missing = uuid.uuid4()
+
+        found = with_repository(lambda repository: repository.get_many_by_ids([*ids, missing]))
+        deleted = with_repository(lambda repository: repository.delete_many([*ids[:3], missing]))
+        remaining = with_repository(lambda repository: repository.get_many_by_ids(ids))
+
+        assert {quote.id for quote in found} == set(ids)
+        assert deleted == 3
+        assert {quote.id for quote in remaining} == set(ids[3:])
+
+    def test_bulk_methods_accept_empty_input(self):
+        async def call(repository):
+            return (
+                await repository.create_many([]),
+                await repository.get_many_by_ids([]),
+                await repository.delete_many([]),
+            )
+
+        assert with_repository(call) == ([], [], 0)
+
+    def test_upsert_many_keeps_the_last_row_of_duplicate_keys(self):
+        rows = [
+            {"text": "“Synthetic repository quote 0.”", "author": AUTHOR, "tags": ["first"]},
+            {"text": "“Synthetic repository quote 1.”", "author": AUTHOR, "tags": ["other"]},
+            # Same quote: same author and normalized text
+            {"text": "“Synthetic  repository quote 0.”", "author": AUTHOR, "tags": ["last"]},
+        ]
+
+        result = with_repository(lambda repository: repository.upsert_many(rows))
+        again = with_repository(lambda repository: repository.upsert_many(rows))
+
+        assert (result.inserted, result.updated, result.unchanged) == (2, 0, 1)
+        assert (again.inserted, again.updated, again.unchanged) == (0, 0, 3)
+        with self.session_factory() as session:
+            tags = session.scalars(
+                text("SELECT tags FROM quotes WHERE author = :author"),
+                {"author": AUTHOR},
+            ).all()
+        assert sorted(tags) == [["last"], ["other"]]
+
+    def test_iter_all_streams_every_batch(self):
+        rows = quote_rows(5)
+        with_repository(lambda repository: repository.create_many(rows))
+
+        quotes = with_repository(lambda repository: collect(repository.iter_all(batch_size=2)))
+
+        assert sorted(quote.text for quote in quotes) == sorted(row["text"] for row in rows)
+
+    def test_iter_since_cuts_off_older_updates(self):
+        quotes = with_repository(lambda repository: repository.create_many(quote_rows(4)))
+        now = datetime.now()
+        with self.session_factory() as session:
+            for age, quote in zip((3, 2, 1, 0), quotes):
+                session.execute(
+                    text("UPDATE quotes SET updated_at = :updated_at WHERE id = :id"),
+                    {"updated_at": now - timedelta(days=age), "id": quote.id},
+                )
+            session.commit()
+
+        recent = with_repository(lambda repository: collect(
+            repository.iter_since(now - timedelta(days=1, minutes=1), batch_size=1)))
+
+        assert [quote.id for quote in recent] == [quotes[2].id, quotes[3].id]
+
+    def test_closing_a_stream_early_frees_the_session(self):
+        with_repository(lambda repository: repository.create_many(quote_rows(5)))
+
+        async def call(repository):
+            stream = repository.iter_since(datetime.now() - timedelta(hours=1), batch_size=2)
+            first = await anext(stream)
+            await stream.aclose()
+            return first, await repository.get_by_id(first.id)
+
+        first, fetched = with_repository(call)
+
+        assert fetched is not None and fetched.id == first.id
+
+    def test_bulk_writes_retry_lost_races_a_bounded_number_of_times(self):
+        def retry(failures: int):
+            attempts = []
+
+            async def call(repository):
+                async def write():
+                    attempts.append(None)
+                    if len(attempts) <= failures:
+                        raise IntegrityError("INSERT INTO quotes", {}, Exception("duplicate key"))
+                    return UpsertResult(inserted=1)
+
+                return await repository._retry_conflicts(write)
+
+            return with_repository(call), len(attempts)
+
+        attempts = quotes_repository.CONFLICT_ATTEMPTS
+        assert retry(attempts - 1) == (UpsertResult(inserted=1), attempts)
+        with pytest.raises(IntegrityError):
+            retry(attempts)
+
+    def create_tagged(self) -> list:
+        return with_repository(lambda repository: repository.create_many([
+            {"text": "“Synthetic tagged quote 1.”", "author": AUTHOR,
+             "tags": ["zorblax", "quillfen"]},
+            {"text": "“Synthetic tagged quote 2.”", "author": AUTHOR, "tags": ["zorblax"]},
+            {"text": "“Synthetic tagged quote 3.”", "author": AUTHOR, "tags": ["frindle"]},
+        ]))
+
+    def test_find_by_tags_any_or_all(self):
+        quotes = self.create_tagged()
+
+        def find(*args, **kwargs):
+            return with_repository(lambda repository: repository.find_by_tags(*args, **kwargs))
+
+        assert {quote.id for quote in find(["quillfen", "frindle"])} == {
+            quotes[0].id, quotes[2].id}
+        assert [quote.id for quote in find(["zorblax", "quillfen"], match="all")] == [
+            quotes[0].id]
+        assert len(find(["zorblax"], limit=1)) == 1
+        assert find([]) == []
+        # Every quote's tags contain the empty set; none is returned
+        assert find([], match="all") == []
+        with pytest.raises(ValueError):
+            find(["zorblax"], match="some")
+        with pytest.raises(ValueError):
+            find(["zorblax"], limit=0)
+
+    def test_tag_counts_of_given_tags(self):
+        self.create_tagged()
+
+        def counts(*args, **kwargs):
+            return with_repository(lambda repository: repository.tag_counts(*args, **kwargs))
+
+        assert counts(["quillfen", "zorblax", "unknown-tag", "frindle"]) == [
+            ("zorblax", 2), ("frindle", 1), ("quillfen", 1), ("unknown-tag", 0)]
+        assert counts(["quillfen", "zorblax"], limit=1) == [("zorblax", 2)]
+        assert counts([]) == []
+        assert ("zorblax", 2) in counts()
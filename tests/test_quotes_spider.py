@@ -1,6 +1,19 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+import pytest
 import requests
-from scrapy.http import HtmlResponse
-from tutorial.spiders.quotes_spider import QuotesSpider
+from scrapy import Request
+from scrapy.http import HtmlResponse, Response
+from scrapy.utils.test import get_crawler
+from scraper.items import CompactQuote, Quote
+from scraper.page_store import PageStore
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.testing import QuotesSite, run_crawl
+
+FIXTURES = Path(__file__).parent / "fixtures"
 
 
 class TestQuotesSpider:
@@ -76,3 +89,227 @@ class TestQuotesSpider:
         for item in results:
             all_tags.extend(item['tags'])
         assert 'inspirational' in all_tags or 'life' in all_tags, "Expected to find common tags"
+
+
+def extract(html: bytes, fast: bool) -> list[dict]:
+    """Extract the quotes of a page with either extraction path."""
+    spider = QuotesSpider()
+    spider.fast_extraction = fast
+    response = HtmlResponse(
+        url="https://quotes.toscrape.com/page/1/", body=html, encoding="utf-8")
+    return [dict(item) for item in spider.extract_quotes(response)]
+
+
+class TestFastExtraction:
+    """The fast extraction path must yield exactly what the ItemLoader path does."""
+
+    @pytest.mark.parametrize(
+        "fixture", ["quotes_page_1.html", "quotes_edge_cases.html"])
+    def test_parity_on_saved_pages(self, fixture):
+        html = (FIXTURES / fixture).read_bytes()
+
+        expected = extract(html, fast=False)
+
+        assert expected
+        assert extract(html, fast=True) == expected
+
+    def test_parity_on_synthetic_page(self):
+        site = QuotesSite(quotes_per_page=50, tags_per_quote=4)
+
+        quotes = extract(site.render_page(3), fast=True)
+
+        assert quotes == extract(site.render_page(3), fast=False)
+        assert quotes == [site.quote(3, index) for index in range(50)]
+
+    def test_fields_match_item_loader_semantics(self):
+        html = (FIXTURES / "quotes_page_1.html").read_bytes()
+
+        first = extract(html, fast=True)[0]
+
+        assert first == {
+            "text": "“The world as we have created it is a process of our thinking. "
+                    "It cannot be changed without changing our thinking.”",
+            "author": "Albert Einstein",
+            "tags": ["change", "deep-thoughts", "thinking", "world"],
+        }
+        assert all(type(value) is str for value in first["tags"])
+
+    @pytest.mark.parametrize(
+        "fixture", ["quotes_page_1.html", "quotes_edge_cases.html"])
+    def test_compact_items_hold_the_same_fields(self, fixture):
+        html = (FIXTURES / fixture).read_bytes()
+        spider = QuotesSpider()
+        spider.compact_items = True
+        response = HtmlResponse(
+            url="https://quotes.toscrape.com/page/1/", body=html, encoding="utf-8")
+
+        items = list(spider.extract_quotes(response))
+
+        assert all(type(item) is CompactQuote for item in items)
+        assert all(item.tags is None or type(item.tags) is tuple for item in items)
+        compact = [
+            {field: list(value) if field == "tags" else value
+             for field, value in asdict(item).items() if value is not None}
+            for item in items
+        ]
+        assert compact == extract(html, fast=False)
+
+
+class TestPageState:
+    """Pages skipped thanks to what was recorded about them last time."""
+
+    URL = "https://quotes.toscrape.com/page/1/"
+
+    def test_not_modified_page_follows_recorded_links(self):
+        spider = QuotesSpider()
+        spider.page_store = PageStore()
+        spider.page_store.update(self.URL, links=["https://quotes.toscrape.com/page/2/"])
+        request = Request(self.URL, meta={"page_unchanged": True})
+
+        results = list(spider.parse(Response(self.URL, status=304, request=request)))
+
+        assert [type(result) for result in results] == [Request]
+        assert results[0].url == "https://quotes.toscrape.com/page/2/"
+
+    def test_fingerprint_ignores_whitespace_only(self):
+        html = (FIXTURES / "quotes_page_1.html").read_text(encoding="utf-8")
+
+        def fingerprint(page: str) -> str:
+            response = HtmlResponse(url=self.URL, body=page, encoding="utf-8")
+            return QuotesSpider.quotes_fingerprint(response.css("div.quote"))
+
+        assert fingerprint(html) == fingerprint(html.replace("\n", "\n    "))
+        assert fingerprint(html) != fingerprint(html.replace("Albert Einstein", "A. Einstein"))
+
+    def test_page_with_same_fingerprint_is_not_parsed(self):
+        crawler = get_crawler(QuotesSpider, settings_dict={"PAGE_FINGERPRINT_ENABLED": True})
+        spider = QuotesSpider.from_crawler(crawler)
+        site = QuotesSite(pages=2, quotes_per_page=3)
+
+        def parse() -> tuple[list, Response]:
+            response = HtmlResponse(
+                url=self.URL, body=site.render_page(1), encoding="utf-8",
+                request=Request(self.URL))
+            return list(spider.parse(response)), response
+
+        first, _ = parse()
+        second, response = parse()
+
+        assert [type(result) for result in first] == [Quote] * 3 + [Request]
+        assert [type(result) for result in second] == [Request]
+        assert response.meta["page_unchanged"]
+        assert spider.page_store.get(self.URL).fingerprint is not None
+        assert crawler.stats.get_value("fingerprint/pages_parsed") == 1
+        assert crawler.stats.get_value("fingerprint/pages_skipped") == 1
+
+
+def prefetch_settings(**overrides) -> dict:
+    settings = {
+        "PAGINATION_PREFETCH_ENABLED": True,
+        "PAGINATION_PREFETCH_WINDOW": 5,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 8,
+        "ROBOTSTXT_OBEY": False,
+        "LOG_LEVEL": "WARNING",
+    }
+    settings.update(overrides)
+    return settings
+
+
+class TestPaginationPrefetch:
+    """Crawls of the stand-in site with predicted pagination."""
+
+    def test_fetches_every_page_once_and_stops_past_the_end(self):
+        with QuotesSite(pages=20, quotes_per_page=2, latency=0.2) as site:
+            stats = run_crawl(
+                QuotesSpider, prefetch_settings(), start_urls=[site.page_url(1)])
+            requests = list(site.requests)
+
+        pages = [f"/page/{n}/" for n in range(1, 21)]
+        assert sorted(path for path in requests if path in pages) == sorted(pages)
+        assert stats["item_scraped_count"] == 40
+        assert stats["prefetch/last_page"] == 20
+
+        # Pager links to prefetched pages were not requested again, and no
+        # more than one window was requested past the end.
+        assert stats["prefetch/pager_deduped"] > 0
+        assert len(requests) - len(pages) <= 5
+
+        # Pages were fetched concurrently rather than one round trip each.
+        elapsed = (stats["finish_time"] - stats["start_time"]).total_seconds()
+        assert elapsed < 20 * 0.2 / 2
+
+    def test_window_stops_growing_at_a_missing_page(self):
+        with QuotesSite(pages=3, quotes_per_page=2) as site:
+            stats = run_crawl(
+                QuotesSpider, prefetch_settings(), start_urls=[site.page_url(1)])
+            requests = list(site.requests)
+
+        # Page 1 prefetched pages 2-6; 4-6 answered 404, so nothing past
+        # them was ever requested.
+        assert sorted(requests) == sorted(f"/page/{n}/" for n in range(1, 7))
+        assert stats["prefetch/last_page"] == 3
+        assert stats["prefetch/past_end"] == 3
+        assert stats["item_scraped_count"] == 6
+
+    def test_window_does_not_grow_from_an_empty_page(self):
+        with QuotesSite(pages=4, quotes_per_page=0) as site:
+            stats = run_crawl(
+                QuotesSpider, prefetch_settings(), start_urls=[site.page_url(1)])
+            requests = list(site.requests)
+
+        assert stats["prefetch/last_page"] == 0
+        assert stats.get("prefetch/requests", 0) == 0
+        # Pager links are still followed.
+        assert sorted(requests) == sorted(f"/page/{n}/" for n in range(1, 5))
+
+
+class TestSharding:
+    """Partitioning the site between spiders started with ``shard``/``shards``."""
+
+    def test_shards_own_disjoint_pages(self):
+        spiders = [QuotesSpider(shard=shard, shards="3") for shard in range(3)]
+        urls = [f"https://quotes.toscrape.com/page/{n}/" for n in range(1, 31)]
+        urls += [f"https://quotes.toscrape.com/tag/tag{n}/" for n in range(30)]
+
+        for url in urls:
+            assert sum(spider.owns(url) for spider in spiders) == 1
+
+    def test_each_shard_starts_at_its_first_page(self):
+        start_urls = [
+            "https://quotes.toscrape.com/page/1/",
+            "https://quotes.toscrape.com/page/2/",
+        ]
+
+        assert [
+            QuotesSpider(shard=shard, shards=3, start_urls=start_urls).shard_start_urls()
+            for shard in range(3)
+        ] == [
+            ["https://quotes.toscrape.com/page/3/"],
+            ["https://quotes.toscrape.com/page/1/"],
+            ["https://quotes.toscrape.com/page/2/"],
+        ]
+
+    def test_rejects_shard_out_of_range(self):
+        with pytest.raises(ValueError):
+            QuotesSpider(shard=3, shards=3)
+
+    @pytest.mark.parametrize("prefetch", [False, True])
+    def test_shards_crawl_every_page_once(self, prefetch):
+        settings = prefetch_settings(PAGINATION_PREFETCH_ENABLED=prefetch)
+        with QuotesSite(pages=20, quotes_per_page=2) as site:
+            with ThreadPoolExecutor(3) as pool:
+                shards = [
+                    pool.submit(
+                        run_crawl, QuotesSpider, settings, shard=shard, shards=3,
+                        start_urls=[site.page_url(1), site.page_url(2)])
+                    for shard in range(3)
+                ]
+                stats = [shard.result() for shard in shards]
+            requests = Counter(site.requests)
+
+        assert all(requests[f"/page/{n}/"] == 1 for n in range(1, 21))
+        # Each shard requests at most one of its pages, or one window of
+        # them, past the end
+        assert sum(requests.values()) <= 20 + 3 * (5 if prefetch else 1)
+        # Pages 1, 4, ... 19 go to shard 1, 2, 5, ... 20 to shard 2
+        assert [s["item_scraped_count"] for s in stats] == [12, 14, 14]
@@ -0,0 +1,24 @@
+from scraper.seen_set import QuoteSeenSet
+
+
+class TestQuoteSeenSet:
+    """Tests for the in-memory quote seen-set."""
+
+    def test_matches_only_identical_tags(self):
+        seen_set = QuoteSeenSet()
+        for number in range(1000):
+            seen_set.add(f"Author {number}", f"{number:064x}", ["life", "love"])
+        seen_set.freeze()
+
+        assert seen_set.contains("Author 7", f"{7:064x}", ["life", "love"])
+        assert not seen_set.contains("Author 7", f"{7:064x}", ["life"])
+        assert not seen_set.contains("Author 8", f"{7:064x}", ["life", "love"])
+        assert seen_set.nbytes == 1000 * QuoteSeenSet.ENTRY_BYTES
+
+    def test_respects_memory_cap(self):
+        seen_set = QuoteSeenSet(max_bytes=10 * QuoteSeenSet.ENTRY_BYTES)
+
+        added = [seen_set.add("Author", f"{n:064x}", ["tag"]) for n in range(11)]
+
+        assert added == [True] * 10 + [False]
+        assert len(seen_set) == 10
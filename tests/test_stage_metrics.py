@@ -0,0 +1,75 @@
+import json
+import urllib.request
+
+from scraper.spiders.quotes_spider import QuotesSpider
+from scraper.stage_metrics import LatencyHistogram, MetricsServer, StageMetrics
+from scraper.testing import run_crawl
+
+
+class TestLatencyHistogram:
+    """Percentiles of bucketed latencies."""
+
+    def test_percentiles_are_within_the_bucket_width(self):
+        histogram = LatencyHistogram()
+        for millis in range(1, 1001):
+            histogram.add(millis / 1000)
+
+        for pct, exact in ((50, 0.5), (95, 0.95), (99, 0.99)):
+            assert exact <= histogram.percentile(pct) <= exact * LatencyHistogram.GROWTH
+        assert histogram.percentile(100) == histogram.max == 1.0
+        assert histogram.count == 1000
+
+    def test_empty_histogram(self):
+        assert LatencyHistogram().percentile(99) == 0.0
+
+
+class TestStageMetrics:
+    """Recording, exporting and serving the metrics of crawl stages."""
+
+    def test_serves_prometheus_text(self):
+        metrics = StageMetrics()
+        metrics.record("db", 0.02, items=50)
+        metrics.record("db", 0.04, items=50)
+        server = MetricsServer(metrics, "127.0.0.1", 0)
+        server.start()
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+                body = response.read().decode()
+        finally:
+            server.stop()
+
+        assert 'scraper_stage_items_total{stage="db"} 100' in body
+        assert 'scraper_stage_latency_seconds_count{stage="db"} 2' in body
+        assert 'scraper_stage_latency_seconds{stage="download",quantile="0.99"} 0.0' in body
+
+    def test_crawl_records_every_stage(self, quotes_site, tmp_path):
+        summary_path = tmp_path / "stages.json"
+        settings = {
+            "ITEM_PIPELINES": {"scraper.pipelines.QuotesValidationPipeline": 100},
+            "SPIDER_MIDDLEWARES": {"scraper.middlewares.StageMetricsSpiderMiddleware": 950},
+            "DOWNLOADER_MIDDLEWARES": {
+                "scraper.middlewares.StageMetricsDownloaderMiddleware": 950,
+            },
+            "EXTENSIONS": {"scraper.extensions.StageMetricsExport": 450},
+            "STAGE_METRICS_ENABLED": True,
+            "STAGE_METRICS_SUMMARY_PATH": str(summary_path),
+            "CONDITIONAL_REQUESTS_ENABLED": False,
+            "PAGE_FINGERPRINT_ENABLED": False,
+            "ROBOTSTXT_OBEY": False,
+            "LOG_LEVEL": "WARNING",
+        }
+
+        stats = run_crawl(QuotesSpider, settings, start_urls=[quotes_site.page_url(1)])
+
+        # Page 1 is parsed twice, reached again through page 2's pager
+        items = stats["item_scraped_count"]
+        assert items >= quotes_site.pages * quotes_site.quotes_per_page
+        assert stats["stages/download/items"] == stats["response_received_count"]
+        assert stats["stages/parse/items"] == items
+        assert stats["stages/validation/items"] == items
+        assert stats["stages/parse/items_per_sec"] > 0
+        assert 0 < stats["stages/download/p50_ms"] <= stats["stages/download/p99_ms"]
+
+        summary = json.loads(summary_path.read_text())
+        assert summary["stages"]["parse"]["items"] == items
+        assert summary["stages"]["db"]["count"] == 0